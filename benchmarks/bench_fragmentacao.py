@@ -0,0 +1,50 @@
+"""
+Benchmark da fragmentação de arquivos grandes: vazão do fragmentador e quanto é gravado
+de novo depois de uma edição no lugar e de uma inserção no meio do arquivo.
+
+Uso:
+    python benchmarks/bench_fragmentacao.py [--mb 256] [--tamanho-medio 262144] [--edicao 1024]
+"""
+import io
+import os
+import sys
+import time
+import hashlib
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util.Fragmentacao import fragmentar, TAMANHO_MEDIO_PADRAO
+
+def fragmentos(dados: bytes, tamanho_medio: int) -> dict:
+    return {hashlib.sha256(f).digest(): len(f) for f in fragmentar(io.BytesIO(dados), tamanho_medio)}
+
+def novos(antes: dict, depois: dict) -> tuple:
+    ids = [i for i in depois if i not in antes]
+    return len(ids), sum(depois[i] for i in ids)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mb', type=int, default=256)
+    parser.add_argument('--tamanho-medio', type=int, default=TAMANHO_MEDIO_PADRAO)
+    parser.add_argument('--edicao', type=int, default=1024, help='Bytes alterados/inseridos')
+    args = parser.parse_args()
+
+    dados = os.urandom(args.mb * 1024 * 1024)
+    inicio = time.perf_counter()
+    base = fragmentos(dados, args.tamanho_medio)
+    tempo = time.perf_counter() - inicio
+    print(f"Fragmentação: {args.mb / tempo:.1f} MB/s, {len(base)} fragmentos, "
+          f"média {len(dados) // len(base)} bytes")
+
+    meio = len(dados) // 2
+    editado = dados[:meio] + os.urandom(args.edicao) + dados[meio + args.edicao:]
+    quantidade, tamanho = novos(base, fragmentos(editado, args.tamanho_medio))
+    print(f"Edição de {args.edicao} bytes no lugar: {quantidade} fragmentos novos, {tamanho / 1024:.1f} KB")
+
+    inserido = dados[:meio] + os.urandom(args.edicao) + dados[meio:]
+    quantidade, tamanho = novos(base, fragmentos(inserido, args.tamanho_medio))
+    print(f"Inserção de {args.edicao} bytes: {quantidade} fragmentos novos, {tamanho / 1024:.1f} KB")
+
+if __name__ == '__main__':
+    main()
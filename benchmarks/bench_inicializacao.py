@@ -0,0 +1,149 @@
+"""
+Orçamento de inicialização do `rastro status` numa árvore limpa, o comando chamado a cada
+prompt do shell. Confere três coisas e termina com código 1 se alguma falhar:
+
+- o tempo mediano do comando, descontado o do interpretador vazio, cabe no orçamento
+- nenhum módulo pesado que o status não usa é carregado (sqlite3, tarfile, difflib,
+  pool de processos, socket, ctypes)
+- o registro global (~/.rastro/rastro_global.db) não é aberto nem alterado
+
+Uso:
+    python benchmarks/bench_inicializacao.py [--arquivos 200] [--repeticoes 15] [--orcamento-ms 60]
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+import time
+
+RAIZ_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RASTRO = os.path.join(RAIZ_REPO, 'rastro.py')
+
+# Módulos que o status numa árvore limpa não usa. bz2 e lzma ficam de fora: o shutil os importa.
+MODULOS_PROIBIDOS = ['sqlite3', 'tarfile', 'difflib', 'multiprocessing', 'concurrent.futures.process',
+                     'socket', 'selectors', 'ctypes', 'cProfile']
+
+# Roda o rastro.py no processo filho e grava os módulos carregados ao final
+_LISTAR_MODULOS = """
+import sys, json, runpy
+saida = sys.argv[1]
+sys.argv = sys.argv[2:]
+try:
+    runpy.run_path(sys.argv[0], run_name='__main__')
+finally:
+    with open(saida, 'w') as f:
+        json.dump(sorted(sys.modules), f)
+"""
+
+def preparar_projeto(base: str, arquivos: int) -> tuple:
+    """
+    Projeto com um snapshot salvo e árvore limpa, e ambiente com HOME isolado.
+    """
+    projeto = os.path.join(base, 'projeto')
+    for i in range(arquivos):
+        pasta = os.path.join(projeto, f"pasta{i % 10}")
+        os.makedirs(pasta, exist_ok=True)
+        with open(os.path.join(pasta, f"arquivo{i}.txt"), 'w') as f:
+            f.write(f"conteúdo {i}\n" * 20)
+    casa = os.path.join(base, 'home')
+    os.makedirs(casa)
+    ambiente = dict(os.environ, HOME=casa, USERPROFILE=casa)
+    # Com bytecode em cache, como numa instalação normal
+    ambiente.pop('PYTHONDONTWRITEBYTECODE', None)
+    for comando in (['init', '--name', 'bench'], ['save', '-m', 'base'], ['status']):
+        processo = subprocess.run([sys.executable, RASTRO] + comando, cwd=projeto, env=ambiente,
+                                  capture_output=True, text=True)
+        if processo.returncode != 0:
+            raise RuntimeError(f"rastro {comando[0]} falhou:\n{processo.stdout}{processo.stderr}")
+    return projeto, ambiente
+
+def medir(comando: list, projeto: str, ambiente: dict, repeticoes: int) -> float:
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        subprocess.run(comando, cwd=projeto, env=ambiente, stdout=subprocess.DEVNULL, check=True)
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos) * 1000
+
+def modulos_carregados(projeto: str, ambiente: dict) -> list:
+    descritor, saida = tempfile.mkstemp(suffix='.json')
+    os.close(descritor)
+    try:
+        subprocess.run([sys.executable, '-c', _LISTAR_MODULOS, saida, RASTRO, 'status'],
+                       cwd=projeto, env=ambiente, stdout=subprocess.DEVNULL, check=True)
+        with open(saida) as f:
+            return json.load(f)
+    finally:
+        os.remove(saida)
+
+def maiores_importacoes(projeto: str, ambiente: dict, quantidade: int = 15) -> list:
+    """
+    (microssegundos acumulados, módulo) das importações mais caras, via -X importtime.
+    """
+    processo = subprocess.run([sys.executable, '-X', 'importtime', RASTRO, 'status'], cwd=projeto,
+                              env=ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    importacoes = []
+    for linha in processo.stderr.splitlines():
+        partes = linha.split('|')
+        if len(partes) == 3 and partes[1].strip().isdigit():
+            importacoes.append((int(partes[1]), partes[2].rstrip()))
+    return sorted(importacoes, reverse=True)[:quantidade]
+
+def estado_registro_global(ambiente: dict) -> dict:
+    pasta = os.path.join(ambiente['HOME'], '.rastro')
+    estado = {}
+    for nome in ('rastro_global.db', 'rastro_global.db-wal', 'rastro_global.db-shm'):
+        caminho = os.path.join(pasta, nome)
+        if os.path.exists(caminho):
+            st = os.stat(caminho)
+            estado[nome] = (st.st_size, st.st_mtime_ns)
+    return estado
+
+def main():
+    parser = argparse.ArgumentParser(description="Orçamento de inicialização do rastro status")
+    parser.add_argument('--arquivos', type=int, default=200, help='Arquivos do projeto de teste')
+    parser.add_argument('--repeticoes', type=int, default=15, help='Execuções medidas (vale a mediana)')
+    parser.add_argument('--orcamento-ms', type=float, default=60.0,
+                        help='Tempo máximo do status além do interpretador vazio (padrão: 60 ms)')
+    args = parser.parse_args()
+
+    base = tempfile.mkdtemp(prefix='rastro_inicio_')
+    falhas = []
+    try:
+        projeto, ambiente = preparar_projeto(base, args.arquivos)
+        registro_antes = estado_registro_global(ambiente)
+
+        vazio = medir([sys.executable, '-c', 'pass'], projeto, ambiente, args.repeticoes)
+        status = medir([sys.executable, RASTRO, 'status'], projeto, ambiente, args.repeticoes)
+        excedente = status - vazio
+        print(f"Interpretador vazio: {vazio:.1f} ms")
+        print(f"rastro status:       {status:.1f} ms ({excedente:.1f} ms do rastro, orçamento {args.orcamento_ms:.0f} ms)")
+        if excedente > args.orcamento_ms:
+            falhas.append(f"status levou {excedente:.1f} ms além do interpretador (orçamento: {args.orcamento_ms:.0f} ms)")
+            print("\nImportações mais caras (acumulado):")
+            for microssegundos, modulo in maiores_importacoes(projeto, ambiente):
+                print(f"  {microssegundos / 1000:>7.1f} ms  {modulo.strip()}")
+
+        carregados = set(modulos_carregados(projeto, ambiente))
+        for modulo in MODULOS_PROIBIDOS:
+            if modulo in carregados:
+                falhas.append(f"status importou {modulo}")
+
+        if estado_registro_global(ambiente) != registro_antes:
+            falhas.append("status alterou o registro global")
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+    if falhas:
+        print("\nFALHOU:")
+        for falha in falhas:
+            print(f"  - {falha}")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,343 @@
+"""
+Suíte de benchmarks de ponta a ponta: gera projetos sintéticos de vários formatos e mede
+save, status, restore e remover chamando o GerenciadorRastro como o rastro.py faz.
+
+Cada fase roda num processo novo, para o pico de RSS e os contadores de E/S serem só dela.
+Os projetos são gerados a partir de uma semente fixa: duas execuções com os mesmos
+parâmetros medem exatamente o mesmo trabalho.
+
+Uso:
+    python benchmarks/bench_rastro.py [--formatos pequenos,grandes,profundo,gitignore] [--escala 1.0]
+                                      [--repeticoes 1] [--saida resultados.json]
+                                      [--comparar base.json] [--limite 0.2]
+
+Com --comparar, termina com código 1 se alguma fase ficou mais lenta (ou usou mais memória)
+que a base além do limite relativo.
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import contextlib
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:
+    resource = None # Windows: sem RSS nem tempos de CPU
+
+RAIZ_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ_REPO)
+
+VERSAO_RESULTADOS = 1
+SEMENTE_PADRAO = 20240501
+
+# Fases na ordem em que rodam; 'mutar' altera a árvore entre os dois saves e não é medida
+FASES = ['init', 'save_inicial', 'status_limpo', 'mutar', 'status_alterado', 'save_incremental',
+         'restore_antigo', 'restore_recente', 'remover']
+# Métricas comparadas com a base e diferença absoluta mínima para contar como regressão
+# (abaixo disso é ruído de medição)
+METRICAS_COMPARADAS = {'tempo_s': 0.05, 'rss_pico_mb': 5.0}
+
+# --- Geração dos projetos ---------------------------------------------------------------
+
+def _texto(rnd: random.Random, tamanho: int) -> bytes:
+    palavras = [b'rastro', b'snapshot', b'objeto', b'arquivo', b'def', b'return', b'import', b'\n']
+    partes = []
+    total = 0
+    while total < tamanho:
+        palavra = rnd.choice(palavras)
+        partes.append(palavra + b' ')
+        total += len(palavra) + 1
+    return b''.join(partes)[:tamanho]
+
+def _escrever(caminho: str, dados: bytes):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho, 'wb') as f:
+        f.write(dados)
+
+def gerar_pequenos(raiz: str, rnd: random.Random, escala: float):
+    """Muitos arquivos pequenos de texto em algumas centenas de pastas."""
+    for i in range(int(20000 * escala)):
+        _escrever(os.path.join(raiz, f"pkg{i % 200:03d}", f"mod{i:06d}.py"), _texto(rnd, rnd.randint(100, 2000)))
+
+def gerar_grandes(raiz: str, rnd: random.Random, escala: float):
+    """Poucos arquivos grandes, metade aleatória e metade compressível."""
+    mb = max(1, int(64 * escala))
+    for i in range(3):
+        with open(os.path.join(raiz, f"dados{i}.bin"), 'wb') as f:
+            for _ in range(mb):
+                f.write(rnd.randbytes(512 * 1024))
+                f.write(_texto(rnd, 4096) * 128)
+
+def gerar_profundo(raiz: str, rnd: random.Random, escala: float):
+    """Árvore estreita e funda: muitas pastas com poucos arquivos cada."""
+    for ramo in range(max(1, int(40 * escala))):
+        pasta = raiz
+        for nivel in range(30):
+            pasta = os.path.join(pasta, f"r{ramo}n{nivel}")
+            for k in range(2):
+                _escrever(os.path.join(pasta, f"f{k}.txt"), _texto(rnd, rnd.randint(50, 500)))
+
+def gerar_gitignore(raiz: str, rnd: random.Random, escala: float):
+    """.gitignore grandes na raiz e em cada pasta; cerca de metade dos arquivos é ignorada."""
+    pastas = 100
+    regras = [f"*.tmp{i}\nbuild{i}/\n/gerado{i}.log\n!manter{i}.tmp{i}\n" for i in range(2000)]
+    _escrever(os.path.join(raiz, '.gitignore'), ''.join(regras).encode())
+    for p in range(pastas):
+        locais = [f"cache{p}_{i}/\n*.o{i}\n" for i in range(50)]
+        _escrever(os.path.join(raiz, f"src{p:03d}", '.gitignore'), ''.join(locais).encode())
+    for i in range(int(10000 * escala)):
+        pasta = os.path.join(raiz, f"src{i % pastas:03d}")
+        if i % 2:
+            nome = rnd.choice([f"x{i}.tmp{i % 2000}", f"build{i % 2000}/a.c", f"cache{i % pastas}_{i % 50}/b.bin"])
+        else:
+            nome = f"codigo{i}.c"
+        _escrever(os.path.join(pasta, nome), _texto(rnd, rnd.randint(100, 1500)))
+
+FORMATOS = {
+    'pequenos': gerar_pequenos,
+    'grandes': gerar_grandes,
+    'profundo': gerar_profundo,
+    'gitignore': gerar_gitignore,
+}
+
+def mutar(raiz: str, rnd: random.Random):
+    """
+    Altera ~1% dos arquivos, cria e apaga ~0.5%. Arquivos grandes são editados no meio.
+    """
+    arquivos = []
+    for pasta, subpastas, nomes in os.walk(raiz):
+        subpastas[:] = sorted(d for d in subpastas if d != '.rastro')
+        arquivos += [os.path.join(pasta, n) for n in sorted(nomes) if n != '.gitignore']
+    quantidade = max(1, len(arquivos) // 100)
+    for caminho in rnd.sample(arquivos, quantidade):
+        with open(caminho, 'r+b') as f:
+            f.seek(os.path.getsize(caminho) // 2)
+            f.write(rnd.randbytes(64))
+    for caminho in rnd.sample(arquivos, max(1, quantidade // 2)):
+        if os.path.exists(caminho):
+            os.remove(caminho)
+    for i in range(max(1, quantidade // 2)):
+        _escrever(os.path.join(raiz, 'novos', f"novo{i}.txt"), _texto(rnd, 500))
+
+# --- Execução de uma fase (processo filho) ----------------------------------------------
+
+def _contadores_io() -> dict:
+    # Linux: bytes e chamadas de read/write do processo (e das threads dele)
+    try:
+        with open('/proc/self/io') as f:
+            return {chave: int(valor) for chave, valor in (linha.split(':') for linha in f)}
+    except OSError:
+        return {}
+
+def _uso():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+
+def _tamanho_pasta(pasta: str) -> int:
+    total = 0
+    for raiz, _, arquivos in os.walk(pasta):
+        for nome in arquivos:
+            try:
+                total += os.path.getsize(os.path.join(raiz, nome))
+            except OSError:
+                pass
+    return total
+
+def executar_fase(fase: str, projeto: str) -> dict:
+    from core.GerenciadorRastro import GerenciadorRastro
+
+    if fase == 'init':
+        acao = lambda: GerenciadorRastro(caminho_inicial=projeto, comando_atual='init').inicializar('bench', 'benchmark')
+    else:
+        gerenciador = GerenciadorRastro(caminho_inicial=projeto, comando_atual=fase)
+        acoes = {
+            'save_inicial': lambda: gerenciador.criar_snapshot('inicial'),
+            'status_limpo': gerenciador.exibir_status,
+            'status_alterado': gerenciador.exibir_status,
+            'save_incremental': lambda: gerenciador.criar_snapshot('incremental'),
+            'restore_antigo': lambda: gerenciador.restaurar_snapshot(str(gerenciador.catalogo.mais_antigos(1)[0].id_rastro)),
+            'restore_recente': lambda: gerenciador.restaurar_snapshot('last'),
+            'remover': lambda: gerenciador.remover_snapshots('1'),
+        }
+        acao = acoes[fase]
+
+    rastro = os.path.join(projeto, '.rastro')
+    tamanho_antes = _tamanho_pasta(rastro)
+    io_antes, uso_antes = _contadores_io(), _uso()
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        acao()
+    tempo = time.perf_counter() - inicio
+    io_depois, uso_depois = _contadores_io(), _uso()
+
+    medidas = {'tempo_s': round(tempo, 4), 'crescimento_rastro': _tamanho_pasta(rastro) - tamanho_antes}
+    if io_antes:
+        medidas.update({
+            'bytes_escritos': io_depois['wchar'] - io_antes['wchar'],
+            'bytes_lidos': io_depois['rchar'] - io_antes['rchar'],
+            'chamadas_leitura': io_depois['syscr'] - io_antes['syscr'],
+            'chamadas_escrita': io_depois['syscw'] - io_antes['syscw'],
+        })
+    if uso_antes:
+        (proprio_a, filhos_a), (proprio_d, filhos_d) = uso_antes, uso_depois
+        usuario = (proprio_d.ru_utime - proprio_a.ru_utime) + (filhos_d.ru_utime - filhos_a.ru_utime)
+        sistema = (proprio_d.ru_stime - proprio_a.ru_stime) + (filhos_d.ru_stime - filhos_a.ru_stime)
+        # ru_maxrss vem em KB no Linux e em bytes no macOS
+        divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+        medidas.update({
+            'cpu_usuario_s': round(usuario, 4),
+            'cpu_sistema_s': round(sistema, 4),
+            # Fração do tempo de CPU gasta no kernel: alta nas fases dominadas por syscalls
+            'fracao_sistema': round(sistema / (usuario + sistema), 3) if usuario + sistema else 0.0,
+            'trocas_contexto': (proprio_d.ru_nvcsw - proprio_a.ru_nvcsw) + (proprio_d.ru_nivcsw - proprio_a.ru_nivcsw),
+            'rss_pico_mb': round(max(proprio_d.ru_maxrss, filhos_d.ru_maxrss) / divisor, 1),
+        })
+    return medidas
+
+def _rodar_filho(fase: str, projeto: str, ambiente: dict) -> dict:
+    processo = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--fase', fase, '--projeto', projeto],
+        env=ambiente, capture_output=True, text=True)
+    if processo.returncode != 0:
+        raise RuntimeError(f"Fase {fase} falhou:\n{processo.stderr}")
+    return json.loads(processo.stdout.strip().splitlines()[-1])
+
+# --- Execução da suíte --------------------------------------------------------------------
+
+def rodar_formato(formato: str, base: str, escala: float, semente: int) -> dict:
+    projeto = os.path.join(base, formato)
+    if os.path.exists(projeto):
+        shutil.rmtree(projeto)
+    os.makedirs(projeto)
+    rnd = random.Random(f"{semente}-{formato}")
+    FORMATOS[formato](projeto, rnd, escala)
+
+    # Registro global isolado: o benchmark não mexe no ~/.rastro de quem o roda
+    casa = os.path.join(base, 'home')
+    os.makedirs(casa, exist_ok=True)
+    ambiente = dict(os.environ, HOME=casa, USERPROFILE=casa)
+
+    arquivos = sum(len(nomes) for _, _, nomes in os.walk(projeto))
+    resultado = {'arquivos': arquivos, 'bytes': _tamanho_pasta(projeto), 'fases': {}}
+    for fase in FASES:
+        if fase == 'mutar':
+            mutar(projeto, rnd)
+            continue
+        resultado['fases'][fase] = _rodar_filho(fase, projeto, ambiente)
+    shutil.rmtree(projeto, ignore_errors=True)
+    return resultado
+
+def _mediana(execucoes: list) -> dict:
+    """
+    Resultado de várias repetições de um formato: mediana de cada métrica de cada fase.
+    """
+    combinado = {'arquivos': execucoes[0]['arquivos'], 'bytes': execucoes[0]['bytes'], 'fases': {}}
+    for fase, medidas in execucoes[0]['fases'].items():
+        combinado['fases'][fase] = {
+            metrica: statistics.median(e['fases'][fase][metrica] for e in execucoes) for metrica in medidas}
+    return combinado
+
+def comparar(base: dict, atual: dict, limite: float) -> list:
+    """
+    Regressões de atual em relação a base: (formato, fase, métrica, valor base, valor atual).
+    """
+    if base.get('escala') != atual.get('escala'):
+        print(f"Aviso: escalas diferentes (base {base.get('escala')}, atual {atual.get('escala')}).")
+    regressoes = []
+    for formato, resultado in atual['resultados'].items():
+        fases_base = base['resultados'].get(formato, {}).get('fases', {})
+        for fase, medidas in resultado['fases'].items():
+            for metrica, minimo in METRICAS_COMPARADAS.items():
+                antes = fases_base.get(fase, {}).get(metrica)
+                depois = medidas.get(metrica)
+                if antes is None or depois is None:
+                    continue
+                if depois > antes * (1 + limite) and depois - antes > minimo:
+                    regressoes.append((formato, fase, metrica, antes, depois))
+    return regressoes
+
+def exibir(resultados: dict):
+    print(f"{'Formato':<10} {'Fase':<17} {'Tempo (s)':>10} {'RSS (MB)':>9} {'Escrito (MB)':>13} {'Syscalls':>9} {'%Sist':>6}")
+    for formato, resultado in resultados.items():
+        for fase, m in resultado['fases'].items():
+            escrito = m.get('bytes_escritos')
+            chamadas = m.get('chamadas_leitura', 0) + m.get('chamadas_escrita', 0)
+            print(f"{formato:<10} {fase:<17} {m['tempo_s']:>10.3f} {m.get('rss_pico_mb', 0):>9.1f} "
+                  f"{(escrito or 0) / (1024 * 1024):>13.1f} {chamadas:>9} {m.get('fracao_sistema', 0) * 100:>5.0f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de ponta a ponta do Rastro")
+    parser.add_argument('--formatos', default=','.join(FORMATOS), help='Formatos de projeto, separados por vírgula')
+    parser.add_argument('--escala', type=float, default=1.0, help='Multiplica a quantidade/tamanho dos arquivos')
+    parser.add_argument('--repeticoes', type=int, default=1, help='Repetições por formato (vale a mediana)')
+    parser.add_argument('--semente', type=int, default=SEMENTE_PADRAO)
+    parser.add_argument('--dir', help='Diretório de trabalho (padrão: temporário)')
+    parser.add_argument('--saida', help='Grava os resultados neste arquivo JSON')
+    parser.add_argument('--comparar', metavar='BASE', help='JSON de uma execução anterior para comparar')
+    parser.add_argument('--limite', type=float, default=0.2, help='Piora relativa tolerada (padrão: 0.2 = 20%%)')
+    parser.add_argument('--fase', help=argparse.SUPPRESS)
+    parser.add_argument('--projeto', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.fase:
+        print(json.dumps(executar_fase(args.fase, args.projeto)))
+        return
+
+    formatos = [f for f in args.formatos.split(',') if f]
+    desconhecidos = [f for f in formatos if f not in FORMATOS]
+    if desconhecidos:
+        parser.error(f"Formatos desconhecidos: {', '.join(desconhecidos)}")
+
+    base = args.dir or tempfile.mkdtemp(prefix='rastro_bench_')
+    try:
+        resultados = {}
+        for formato in formatos:
+            print(f"Rodando '{formato}' (escala {args.escala}, {args.repeticoes} repetição(ões))...", file=sys.stderr)
+            execucoes = [rodar_formato(formato, base, args.escala, args.semente) for _ in range(args.repeticoes)]
+            resultados[formato] = _mediana(execucoes)
+    finally:
+        if not args.dir:
+            shutil.rmtree(base, ignore_errors=True)
+
+    relatorio = {
+        'versao': VERSAO_RESULTADOS,
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'escala': args.escala,
+        'semente': args.semente,
+        'repeticoes': args.repeticoes,
+        'resultados': resultados,
+    }
+    exibir(resultados)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(relatorio, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados gravados em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            referencia = json.load(f)
+        regressoes = comparar(referencia, relatorio, args.limite)
+        if not regressoes:
+            print(f"\nSem regressões acima de {args.limite:.0%} em relação a {args.comparar}.")
+            return
+        print(f"\nRegressões acima de {args.limite:.0%} em relação a {args.comparar}:")
+        for formato, fase, metrica, antes, depois in regressoes:
+            print(f"  {formato}/{fase} {metrica}: {antes} -> {depois} (+{(depois / antes - 1) * 100:.0f}%)")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
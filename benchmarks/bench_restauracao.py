@@ -0,0 +1,98 @@
+"""
+Benchmark da restauração: tar.extractall (caminho antigo) contra o EscritorRestauracao.
+
+Uso:
+    python benchmarks/bench_restauracao.py [--arquivos 5000] [--tamanho 4096] [--grandes 2] [--mb-grande 64] [--memoria]
+"""
+import os
+import sys
+import time
+import shutil
+import tarfile
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.ArmazemObjetos import ArmazemObjetos
+from core.EscritorRestauracao import EscritorRestauracao
+
+def gerar_arvore(raiz: str, arquivos: int, tamanho: int, grandes: int, mb_grande: int):
+    for i in range(arquivos):
+        pasta = os.path.join(raiz, f"d{i % 50:02d}", f"s{i % 7}")
+        os.makedirs(pasta, exist_ok=True)
+        with open(os.path.join(pasta, f"f{i:06d}.txt"), 'wb') as f:
+            f.write((f"linha {i} " * (tamanho // 10 + 1)).encode()[:tamanho])
+    for i in range(grandes):
+        with open(os.path.join(raiz, f"grande{i}.bin"), 'wb') as f:
+            for _ in range(mb_grande):
+                f.write(os.urandom(1024 * 1024))
+
+def medir(nome: str, funcao, destino: str, memoria: bool):
+    if os.path.exists(destino):
+        shutil.rmtree(destino)
+    os.makedirs(destino)
+    # tracemalloc deixa tudo bem mais lento: os tempos só valem com memoria=False
+    if memoria:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    funcao(destino)
+    duracao = time.perf_counter() - inicio
+    linha = f"{nome:<32} {duracao:8.3f} s"
+    if memoria:
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        linha += f"   pico de memória Python: {pico / (1024 * 1024):7.1f} MB"
+    print(linha)
+    return duracao
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de restauração do Rastro")
+    parser.add_argument('--arquivos', type=int, default=5000)
+    parser.add_argument('--tamanho', type=int, default=4096, help='Bytes por arquivo pequeno')
+    parser.add_argument('--grandes', type=int, default=2, help='Quantidade de arquivos grandes')
+    parser.add_argument('--mb-grande', type=int, default=64, help='MB por arquivo grande')
+    parser.add_argument('--dir', help='Diretório de trabalho (padrão: temporário)')
+    parser.add_argument('--memoria', action='store_true', help='Mede o pico de memória (tracemalloc; distorce os tempos)')
+    args = parser.parse_args()
+
+    base = args.dir or tempfile.mkdtemp(prefix='rastro_bench_')
+    origem = os.path.join(base, 'origem')
+    rastro = os.path.join(base, 'rastro')
+    try:
+        print(f"Gerando {args.arquivos} arquivos de {args.tamanho} B e {args.grandes} de {args.mb_grande} MB em {base}...")
+        gerar_arvore(origem, args.arquivos, args.tamanho, args.grandes, args.mb_grande)
+
+        caminho_tar = os.path.join(base, 'snapshot.tar.gz')
+        with tarfile.open(caminho_tar, mode='w:gz', compresslevel=1) as tar:
+            tar.add(origem, arcname='.')
+
+        armazem = ArmazemObjetos(rastro)
+        itens = {}
+        for root, _, files in os.walk(origem):
+            for file in files:
+                caminho = os.path.join(root, file)
+                stats = os.stat(caminho)
+                id_objeto, _, _ = armazem.armazenar_arquivo(caminho)
+                rel_path = os.path.relpath(caminho, origem).replace(os.path.sep, '/')
+                itens[rel_path] = {'objeto': id_objeto, 'size': stats.st_size,
+                                   'mod_time': stats.st_mtime, 'modo': stats.st_mode & 0o777}
+
+        def extractall(destino):
+            with tarfile.open(caminho_tar, 'r:gz') as tar:
+                tar.extractall(destino)
+
+        print()
+        t_antigo = medir("tar.extractall", extractall, os.path.join(base, 'a'), args.memoria)
+        t_tar = medir("EscritorRestauracao (tar.gz)",
+                      lambda d: EscritorRestauracao(d).extrair_tar(caminho_tar), os.path.join(base, 'b'), args.memoria)
+        t_obj = medir("EscritorRestauracao (objetos)",
+                      lambda d: EscritorRestauracao(d, armazem).extrair_objetos(itens), os.path.join(base, 'c'), args.memoria)
+        print(f"\nGanho sobre extractall: tar.gz {t_antigo / t_tar:.2f}x, objetos {t_antigo / t_obj:.2f}x")
+    finally:
+        if not args.dir:
+            shutil.rmtree(base, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,330 @@
+import io
+import os
+import shutil
+import hashlib
+import logging
+import threading
+from typing import Iterator, Tuple, Optional, List
+from .PacotesObjetos import Pacote, DIRETORIO_PACOTES, EXTENSAO_INDICE
+try:
+    from util.Compressao import abrir_escrita, abrir_leitura, abrir_leitura_stream, vale_comprimir, CODEC_PADRAO, NIVEIS_PADRAO, TAMANHO_AMOSTRA
+    from util.Utilitarios import calcular_hash_arquivo
+    from util.Fragmentacao import fragmentar, TAMANHO_MEDIO_PADRAO
+except ImportError:
+    from rastro_app.util.Compressao import abrir_escrita, abrir_leitura, abrir_leitura_stream, vale_comprimir, CODEC_PADRAO, NIVEIS_PADRAO, TAMANHO_AMOSTRA
+    from rastro_app.util.Utilitarios import calcular_hash_arquivo
+    from rastro_app.util.Fragmentacao import fragmentar, TAMANHO_MEDIO_PADRAO
+
+DIRETORIO_OBJETOS = 'objects'
+TAMANHO_BLOCO = 1024 * 1024
+# Objeto de um arquivo grande guardado em fragmentos: este cabeçalho (mesmo tamanho do
+# RASTRO-STORE) seguido de uma linha "<id do fragmento> <tamanho>" por fragmento, em ordem
+CABECALHO_FRAGMENTOS = b'RASTRO-CHUNK\x00'
+
+class ArmazemObjetos:
+    """
+    Armazém de objetos endereçado por conteúdo (.rastro/objects).
+    Cada objeto é o conteúdo de um arquivo comprimido, nomeado pelo SHA-256
+    do conteúdo original. Arquivos idênticos são armazenados uma única vez.
+    Cada objeto leva o próprio codec (ver util.Compressao); os métodos são
+    seguros para uso concorrente por várias threads.
+
+    Arquivos grandes podem ser guardados em fragmentos definidos pelo conteúdo (ver
+    util.Fragmentacao): cada fragmento é um objeto comum e o objeto do arquivo, ainda
+    nomeado pelo SHA-256 do conteúdo inteiro, só lista os fragmentos.
+
+    Os objetos ficam soltos (um arquivo cada) até um rastro repack juntá-los em
+    pacotes (.rastro/packs, ver core.PacotesObjetos); a leitura procura nos dois.
+    """
+    def __init__(self, caminho_rastro: str):
+        self.caminho_objetos = os.path.join(caminho_rastro, DIRETORIO_OBJETOS)
+        self.caminho_pacotes = os.path.join(caminho_rastro, DIRETORIO_PACOTES)
+        self._pacotes: Optional[List[Pacote]] = None
+        self._trava_pacotes = threading.Lock()
+
+    def __getstate__(self):
+        # Enviado a processos do rastro grep: os índices mapeados são reabertos lá
+        estado = self.__dict__.copy()
+        estado['_pacotes'] = None
+        del estado['_trava_pacotes']
+        return estado
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self._trava_pacotes = threading.Lock()
+
+    def caminho_objeto(self, id_objeto: str) -> str:
+        return os.path.join(self.caminho_objetos, id_objeto[:2], id_objeto[2:])
+
+    def pacotes(self) -> List[Pacote]:
+        """
+        Pacotes existentes, abertos na primeira chamada. Índices ilegíveis são ignorados.
+        """
+        with self._trava_pacotes:
+            if self._pacotes is None:
+                pacotes = []
+                nomes = os.listdir(self.caminho_pacotes) if os.path.isdir(self.caminho_pacotes) else []
+                for nome in sorted(nomes):
+                    if not nome.startswith('pack-') or not nome.endswith(EXTENSAO_INDICE):
+                        continue
+                    try:
+                        pacotes.append(Pacote(os.path.join(self.caminho_pacotes, nome)))
+                    except (OSError, ValueError) as e:
+                        logging.warning(f"Pacote ignorado {nome}: {e}")
+                self._pacotes = pacotes
+            return self._pacotes
+
+    def fechar_pacotes(self):
+        """
+        Fecha os índices abertos; a próxima leitura lista a pasta de pacotes de novo.
+        """
+        with self._trava_pacotes:
+            for pacote in self._pacotes or []:
+                pacote.fechar()
+            self._pacotes = None
+
+    def _localizar_em_pacote(self, id_objeto: str) -> Optional[Tuple[Pacote, int, int]]:
+        for pacote in self.pacotes():
+            local = pacote.localizar(id_objeto)
+            if local is not None:
+                return (pacote,) + local
+        return None
+
+    def existe(self, id_objeto: str) -> bool:
+        return os.path.exists(self.caminho_objeto(id_objeto)) or self._localizar_em_pacote(id_objeto) is not None
+
+    def abrir_bruto(self, id_objeto: str):
+        """
+        Abre os bytes guardados do objeto (comprimidos), soltos ou dentro de um pacote.
+        """
+        try:
+            return open(self.caminho_objeto(id_objeto), 'rb')
+        except FileNotFoundError:
+            local = self._localizar_em_pacote(id_objeto)
+            if local is None:
+                raise
+            pacote, posicao, tamanho = local
+            return pacote.abrir_bruto(posicao, tamanho)
+
+    def _abrir_conteudo(self, id_objeto: str):
+        try:
+            return abrir_leitura(self.caminho_objeto(id_objeto))
+        except FileNotFoundError:
+            return abrir_leitura_stream(self.abrir_bruto(id_objeto))
+
+    @staticmethod
+    def calcular_hash(caminho_arquivo: str) -> str:
+        return calcular_hash_arquivo(caminho_arquivo)
+
+    def armazenar_arquivo(self, caminho_arquivo: str, codec: str = CODEC_PADRAO, nivel: int = NIVEIS_PADRAO[CODEC_PADRAO],
+                          limiar_fragmentos: Optional[int] = None,
+                          tamanho_fragmento: int = TAMANHO_MEDIO_PADRAO,
+                          hash_conhecido: Optional[str] = None) -> Tuple[str, int, Optional[str]]:
+        """
+        Armazena o arquivo no armazém se o conteúdo ainda não existir.
+        Retorna (id_objeto, bytes_escritos, codec_usado). bytes_escritos é 0 e codec_usado é None
+        se o objeto já existia. Arquivos que não comprimem bem são guardados com o codec 'store'.
+        Arquivos com limiar_fragmentos bytes ou mais são guardados em fragmentos.
+
+        Conteúdo já armazenado não é comprimido de novo: o arquivo é primeiro só lido para o
+        hash (nem isso, se hash_conhecido, do cache de hashes, já estiver no armazém), e só
+        conteúdo novo é relido e comprimido. O id gravado é sempre o SHA-256 dos bytes que
+        foram para o objeto, mesmo que o arquivo mude entre as leituras.
+        """
+        if hash_conhecido is not None and self.existe(hash_conhecido):
+            return hash_conhecido, 0, None
+
+        with open(caminho_arquivo, 'rb') as origem:
+            antes = os.fstat(origem.fileno())
+            if limiar_fragmentos is not None and antes.st_size >= limiar_fragmentos:
+                # Só os fragmentos que ainda não existem são comprimidos, numa única leitura
+                if codec != 'store' and not vale_comprimir(caminho_arquivo, origem.read(TAMANHO_AMOSTRA)):
+                    codec, nivel = 'store', 0
+                origem.seek(0)
+                return self._armazenar_fragmentado(origem, codec, nivel, tamanho_fragmento)
+
+            hash_conteudo = hashlib.sha256()
+            inicio = dados = origem.read(TAMANHO_AMOSTRA)
+            while dados:
+                hash_conteudo.update(dados)
+                dados = origem.read(TAMANHO_BLOCO)
+            depois = os.fstat(origem.fileno())
+            # Com o stat igual antes e depois da leitura, o hash é de um conteúdo estável
+            estavel = (antes.st_size, antes.st_mtime_ns) == (depois.st_size, depois.st_mtime_ns)
+            id_objeto = hash_conteudo.hexdigest()
+            if estavel and self.existe(id_objeto):
+                return id_objeto, 0, None
+
+            if codec != 'store' and not vale_comprimir(caminho_arquivo, inicio):
+                codec, nivel = 'store', 0
+            origem.seek(0)
+            id_objeto, escritos = self._gravar_conteudo(origem, codec, nivel)
+        return id_objeto, escritos, codec if escritos else None
+
+    def _gravar_conteudo(self, origem, codec: str, nivel: int) -> Tuple[str, int]:
+        """
+        Grava o conteúdo de origem num temporário e o renomeia para o SHA-256 dos bytes
+        gravados: o id corresponde ao conteúdo guardado mesmo que o arquivo mude durante a
+        leitura. Retorna (id_objeto, bytes gravados), com 0 se o objeto já existia.
+        """
+        os.makedirs(self.caminho_objetos, exist_ok=True)
+        temporario = os.path.join(self.caminho_objetos, f".tmp{os.getpid()}-{threading.get_ident()}")
+        hash_conteudo = hashlib.sha256()
+        try:
+            with abrir_escrita(temporario, codec, nivel) as saida:
+                while True:
+                    dados = origem.read(TAMANHO_BLOCO)
+                    if not dados:
+                        break
+                    hash_conteudo.update(dados)
+                    saida.write(dados)
+            id_objeto = hash_conteudo.hexdigest()
+            if self.existe(id_objeto):
+                return id_objeto, 0
+            destino = self.caminho_objeto(id_objeto)
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            os.replace(temporario, destino)
+        finally:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+        return id_objeto, os.path.getsize(destino)
+
+    def _gravar(self, id_objeto: str, escrever, codec: str, nivel: int) -> int:
+        """
+        Grava o objeto, se ainda não existir, com escrever(saida). Retorna os bytes gravados.
+        """
+        destino = self.caminho_objeto(id_objeto)
+        if self.existe(id_objeto):
+            return 0
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        # Escreve em arquivo temporário e renomeia para não deixar objetos parciais
+        temporario = f"{destino}.tmp{os.getpid()}-{threading.get_ident()}"
+        try:
+            if codec is None:
+                with open(temporario, 'wb') as saida:
+                    escrever(saida)
+            else:
+                with abrir_escrita(temporario, codec, nivel) as saida:
+                    escrever(saida)
+            os.replace(temporario, destino)
+        finally:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+        return os.path.getsize(destino)
+
+    def _armazenar_fragmentado(self, origem, codec: str, nivel: int,
+                               tamanho_fragmento: int) -> Tuple[str, int, Optional[str]]:
+        """
+        Só os fragmentos que ainda não existem são comprimidos e gravados: uma edição
+        pequena num arquivo grande custa poucos fragmentos novos.
+        """
+        hash_total = hashlib.sha256()
+        fragmentos = []
+        escritos = 0
+        for dados in fragmentar(origem, tamanho_fragmento):
+            hash_total.update(dados)
+            id_fragmento = hashlib.sha256(dados).hexdigest()
+            fragmentos.append(f"{id_fragmento} {len(dados)}\n")
+            escritos += self._gravar(id_fragmento, lambda saida: saida.write(dados), codec, nivel)
+
+        # O id vem do conteúdo efetivamente fragmentado, mesmo que o arquivo tenha mudado durante a leitura
+        id_objeto = hash_total.hexdigest()
+        lista = CABECALHO_FRAGMENTOS + ''.join(fragmentos).encode('ascii')
+        if self._gravar(id_objeto, lambda saida: saida.write(lista), None, 0) == 0:
+            # Outra thread gravou o mesmo conteúdo; os fragmentos novos são os mesmos
+            return id_objeto, 0, None
+        return id_objeto, escritos + self.tamanho_objeto(id_objeto), codec
+
+    def fragmentos(self, id_objeto: str) -> List[str]:
+        """
+        Ids dos fragmentos de um objeto fragmentado; lista vazia para um objeto comum.
+        """
+        with self.abrir_bruto(id_objeto) as f:
+            if f.read(len(CABECALHO_FRAGMENTOS)) != CABECALHO_FRAGMENTOS:
+                return []
+            return [linha.split()[0].decode('ascii') for linha in f.read().splitlines() if linha.strip()]
+
+    def extrair_para(self, id_objeto: str, destino: str):
+        """
+        Descomprime o objeto no caminho de destino, criando diretórios se necessário.
+        """
+        pasta = os.path.dirname(destino)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        with self.abrir(id_objeto) as origem, open(destino, 'wb') as saida:
+            shutil.copyfileobj(origem, saida, TAMANHO_BLOCO)
+
+    def abrir(self, id_objeto: str):
+        """
+        Abre o objeto para leitura do conteúdo original (descomprimido em streaming).
+        """
+        fragmentos = self.fragmentos(id_objeto)
+        if fragmentos:
+            return io.BufferedReader(LeitorFragmentos(self, fragmentos), TAMANHO_BLOCO)
+        return self._abrir_conteudo(id_objeto)
+
+    def tamanho_objeto(self, id_objeto: str) -> int:
+        """
+        Bytes guardados do objeto (comprimido); 0 se ele não existir.
+        """
+        try:
+            return os.path.getsize(self.caminho_objeto(id_objeto))
+        except OSError:
+            local = self._localizar_em_pacote(id_objeto)
+            return local[2] if local else 0
+
+    def listar_objetos(self) -> Iterator[str]:
+        """
+        Ids dos objetos soltos (fora de pacotes).
+        """
+        if not os.path.isdir(self.caminho_objetos):
+            return
+        for prefixo in os.listdir(self.caminho_objetos):
+            pasta = os.path.join(self.caminho_objetos, prefixo)
+            if not os.path.isdir(pasta):
+                continue
+            for resto in os.listdir(pasta):
+                if '.tmp' in resto:
+                    continue
+                yield prefixo + resto
+
+    def remover(self, id_objeto: str) -> int:
+        """
+        Remove o objeto solto do armazém. Retorna os bytes liberados. Objetos em
+        pacotes só saem quando o pacote é reescrito (rastro gc).
+        """
+        caminho = self.caminho_objeto(id_objeto)
+        tamanho = os.path.getsize(caminho)
+        os.remove(caminho)
+        return tamanho
+
+class LeitorFragmentos(io.RawIOBase):
+    """
+    Conteúdo de um objeto fragmentado: abre e descomprime um fragmento de cada vez.
+    """
+    def __init__(self, armazem: ArmazemObjetos, fragmentos: List[str]):
+        self._armazem = armazem
+        self._pendentes = iter(fragmentos)
+        self._atual = None
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while True:
+            if self._atual is None:
+                proximo = next(self._pendentes, None)
+                if proximo is None:
+                    return 0
+                self._atual = self._armazem._abrir_conteudo(proximo)
+            lidos = self._atual.readinto(buffer)
+            if lidos:
+                return lidos
+            self._atual.close()
+            self._atual = None
+
+    def close(self):
+        if self._atual is not None:
+            self._atual.close()
+            self._atual = None
+        super().close()
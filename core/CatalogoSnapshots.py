@@ -0,0 +1,287 @@
+import os
+from typing import Optional, List, Iterator, Iterable, Tuple, TYPE_CHECKING
+from .Snapshot import Snapshot
+try:
+    from util.Instrumentacao import contador_consultas
+except ImportError:
+    from rastro_app.util.Instrumentacao import contador_consultas
+if TYPE_CHECKING:
+    import sqlite3
+
+ARQUIVO_CATALOGO = 'catalogo.db'
+VERSAO_ESQUEMA = 2
+# Espera por um lock de escrita de outro processo antes de desistir (segundos)
+TEMPO_ESPERA_BLOQUEIO = 10.0
+
+_COLUNAS = 'id_rastro, mensagem, timestamp, caminho_relativo, tamanho'
+
+class CatalogoSnapshots:
+    """
+    Catálogo dos snapshots do projeto em SQLite (.rastro/catalogo.db), em modo WAL.
+    Buscas por id, por posição e por data usam índice; nada é carregado inteiro na memória,
+    e cada alteração é uma transação atômica.
+
+    Guarda também o histórico de arquivos: uma linha (caminho, snapshot, objeto) para cada
+    snapshot em que o arquivo mudou em relação ao snapshot anterior (objeto NULL = removido).
+    """
+    def __init__(self, caminho_rastro: str):
+        self.caminho = os.path.join(caminho_rastro, ARQUIVO_CATALOGO)
+        self._conexao = None
+
+    @property
+    def conexao(self) -> 'sqlite3.Connection':
+        # Aberta (e o sqlite3 importado) só quando algum comando precisa do catálogo
+        if self._conexao is None:
+            import sqlite3
+            conexao = sqlite3.connect(self.caminho, timeout=TEMPO_ESPERA_BLOQUEIO)
+            conexao.set_trace_callback(contador_consultas('consultas_catalogo'))
+            conexao.execute('PRAGMA journal_mode=WAL')
+            conexao.execute('PRAGMA synchronous=NORMAL')
+            if conexao.execute('PRAGMA user_version').fetchone()[0] < VERSAO_ESQUEMA:
+                self._criar_esquema(conexao)
+            self._conexao = conexao
+        return self._conexao
+
+    @staticmethod
+    def _criar_esquema(conexao: 'sqlite3.Connection'):
+        with conexao:
+            conexao.execute('''
+                CREATE TABLE IF NOT EXISTS Snapshots (
+                    id_rastro INTEGER PRIMARY KEY,
+                    mensagem TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    caminho_relativo TEXT NOT NULL,
+                    tamanho INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            conexao.execute('''
+                CREATE INDEX IF NOT EXISTS idx_snapshots_timestamp
+                ON Snapshots (timestamp)
+            ''')
+            conexao.execute('''
+                CREATE TABLE IF NOT EXISTS Historico (
+                    caminho TEXT NOT NULL,
+                    id_rastro INTEGER NOT NULL,
+                    objeto TEXT,
+                    PRIMARY KEY (caminho, id_rastro)
+                ) WITHOUT ROWID
+            ''')
+            conexao.execute('''
+                CREATE INDEX IF NOT EXISTS idx_historico_snapshot
+                ON Historico (id_rastro)
+            ''')
+            # Arquivos do último snapshot registrado no histórico, base do próximo registro
+            conexao.execute('''
+                CREATE TABLE IF NOT EXISTS HistoricoEstado (
+                    caminho TEXT PRIMARY KEY,
+                    objeto TEXT NOT NULL
+                ) WITHOUT ROWID
+            ''')
+            conexao.execute('''
+                CREATE TABLE IF NOT EXISTS Propriedades (
+                    chave TEXT PRIMARY KEY,
+                    valor TEXT
+                )
+            ''')
+            conexao.execute(f'PRAGMA user_version = {VERSAO_ESQUEMA}')
+
+    def fechar(self):
+        if self._conexao is not None:
+            self._conexao.close()
+            self._conexao = None
+
+    def _consultar(self, sql: str, parametros=()) -> List[Snapshot]:
+        return [Snapshot(*linha) for linha in self.conexao.execute(sql, parametros)]
+
+    def _consultar_um(self, sql: str, parametros=()) -> Optional[Snapshot]:
+        linha = self.conexao.execute(sql, parametros).fetchone()
+        return Snapshot(*linha) if linha else None
+
+    def adicionar(self, snap: Snapshot, arquivos: Optional[dict] = None):
+        """
+        Registra o snapshot. arquivos (caminho -> objeto) é o conteúdo completo dele,
+        usado para registrar no histórico o que mudou em relação ao snapshot anterior.
+        """
+        with self.conexao:
+            sincronizado = self.historico_sincronizado()
+            self.conexao.execute(
+                f'INSERT INTO Snapshots ({_COLUNAS}) VALUES (?, ?, ?, ?, ?)',
+                (snap.id_rastro, snap.mensagem, snap.timestamp, snap.caminho_relativo, snap.tamanho)
+            )
+            # Histórico incompleto (projeto anterior a ele) só volta a ser mantido após reconstrução
+            if sincronizado and arquivos is not None:
+                self._registrar_historico(snap.id_rastro, arquivos)
+
+    def remover(self, ids: List[int]):
+        with self.conexao:
+            sincronizado = self.historico_sincronizado()
+            self.conexao.executemany('DELETE FROM Snapshots WHERE id_rastro = ?', [(i,) for i in ids])
+            self._remover_do_historico(ids)
+            if sincronizado:
+                self._recalcular_estado_historico()
+
+    def importar(self, registros: List[dict]) -> int:
+        """
+        Migra a lista 'snapshots' de um config.json antigo. Idempotente: ids já presentes são mantidos.
+        """
+        snaps = [Snapshot.de_json(d) for d in registros]
+        with self.conexao:
+            antes = self.quantidade()
+            self.conexao.executemany(
+                f'INSERT OR IGNORE INTO Snapshots ({_COLUNAS}) VALUES (?, ?, ?, ?, ?)',
+                [(s.id_rastro, s.mensagem, s.timestamp, s.caminho_relativo, s.tamanho) for s in snaps]
+            )
+            return self.quantidade() - antes
+
+    def obter(self, id_rastro: int) -> Optional[Snapshot]:
+        return self._consultar_um(f'SELECT {_COLUNAS} FROM Snapshots WHERE id_rastro = ?', (id_rastro,))
+
+    def ultimo(self) -> Optional[Snapshot]:
+        return self.por_posicao(1)
+
+    def por_posicao(self, posicao: int) -> Optional[Snapshot]:
+        """
+        Snapshot pela posição a partir do mais recente (1 = último, 2 = penúltimo...).
+        """
+        if posicao < 1:
+            return None
+        return self._consultar_um(
+            f'SELECT {_COLUNAS} FROM Snapshots ORDER BY id_rastro DESC LIMIT 1 OFFSET ?', (posicao - 1,)
+        )
+
+    def mais_antigos(self, quantidade: int) -> List[Snapshot]:
+        return self._consultar(f'SELECT {_COLUNAS} FROM Snapshots ORDER BY id_rastro LIMIT ?', (quantidade,))
+
+    def listar(self, limite: Optional[int] = None, desde: Optional[str] = None) -> List[Snapshot]:
+        """
+        Snapshots em ordem crescente de id. Com limite, só os mais recentes;
+        com desde (data ISO), só os criados a partir dela.
+        """
+        sql = f'SELECT {_COLUNAS} FROM Snapshots'
+        parametros = []
+        if desde:
+            sql += ' WHERE timestamp >= ?'
+            parametros.append(desde)
+        sql += ' ORDER BY id_rastro DESC'
+        if limite is not None:
+            sql += ' LIMIT ?'
+            parametros.append(limite)
+        return list(reversed(self._consultar(sql, parametros)))
+
+    def __iter__(self) -> Iterator[Snapshot]:
+        for linha in self.conexao.execute(f'SELECT {_COLUNAS} FROM Snapshots ORDER BY id_rastro'):
+            yield Snapshot(*linha)
+
+    def quantidade(self, desde: Optional[str] = None) -> int:
+        if desde:
+            return self.conexao.execute('SELECT COUNT(*) FROM Snapshots WHERE timestamp >= ?', (desde,)).fetchone()[0]
+        return self.conexao.execute('SELECT COUNT(*) FROM Snapshots').fetchone()[0]
+
+    def tamanho_total(self) -> int:
+        return self.conexao.execute('SELECT COALESCE(SUM(tamanho), 0) FROM Snapshots').fetchone()[0]
+
+    def maior_id(self) -> int:
+        return self.conexao.execute('SELECT COALESCE(MAX(id_rastro), 0) FROM Snapshots').fetchone()[0]
+
+    def _historico_ate(self) -> Optional[int]:
+        linha = self.conexao.execute("SELECT valor FROM Propriedades WHERE chave = 'historico_ate'").fetchone()
+        return int(linha[0]) if linha and linha[0] is not None else None
+
+    def _definir_historico_ate(self, id_rastro: Optional[int]):
+        self.conexao.execute(
+            "INSERT OR REPLACE INTO Propriedades (chave, valor) VALUES ('historico_ate', ?)",
+            (None if id_rastro is None else str(id_rastro),)
+        )
+
+    def historico_sincronizado(self) -> bool:
+        """
+        O histórico cobre todos os snapshots? Catálogos migrados de versões anteriores
+        precisam de uma reconstrução (rastro log --rebuild).
+        """
+        ultimo = self.ultimo()
+        return self._historico_ate() == (ultimo.id_rastro if ultimo else None)
+
+    def _registrar_historico(self, id_rastro: int, arquivos: dict):
+        anteriores = dict(self.conexao.execute('SELECT caminho, objeto FROM HistoricoEstado'))
+        alterados = [(caminho, objeto) for caminho, objeto in arquivos.items() if anteriores.get(caminho) != objeto]
+        removidos = [caminho for caminho in anteriores if caminho not in arquivos]
+
+        self.conexao.executemany(
+            'INSERT INTO Historico (caminho, id_rastro, objeto) VALUES (?, ?, ?)',
+            [(caminho, id_rastro, objeto) for caminho, objeto in alterados]
+            + [(caminho, id_rastro, None) for caminho in removidos]
+        )
+        self.conexao.executemany('INSERT OR REPLACE INTO HistoricoEstado (caminho, objeto) VALUES (?, ?)', alterados)
+        self.conexao.executemany('DELETE FROM HistoricoEstado WHERE caminho = ?', [(c,) for c in removidos])
+        self._definir_historico_ate(id_rastro)
+
+    def _remover_do_historico(self, ids: List[int]):
+        """
+        As mudanças de um snapshot removido passam para o snapshot seguinte, a menos que ele
+        tenha a sua própria; linhas que deixam de representar mudança são apagadas.
+        """
+        afetados = set()
+        # Do mais recente para o mais antigo: a mudança mais nova prevalece no snapshot seguinte
+        for id_rastro in sorted(ids, reverse=True):
+            seguinte = self.conexao.execute(
+                'SELECT MIN(id_rastro) FROM Snapshots WHERE id_rastro > ?', (id_rastro,)
+            ).fetchone()[0]
+            if seguinte is not None:
+                self.conexao.execute(
+                    'INSERT OR IGNORE INTO Historico (caminho, id_rastro, objeto) '
+                    'SELECT caminho, ?, objeto FROM Historico WHERE id_rastro = ?', (seguinte, id_rastro)
+                )
+                afetados.add(seguinte)
+            self.conexao.execute('DELETE FROM Historico WHERE id_rastro = ?', (id_rastro,))
+
+        for id_rastro in afetados:
+            self.conexao.execute('''
+                DELETE FROM Historico WHERE id_rastro = ? AND objeto IS (
+                    SELECT h.objeto FROM Historico h
+                    WHERE h.caminho = Historico.caminho AND h.id_rastro < Historico.id_rastro
+                    ORDER BY h.id_rastro DESC LIMIT 1
+                )
+            ''', (id_rastro,))
+
+    def _recalcular_estado_historico(self):
+        ultimo = self.ultimo()
+        if self._historico_ate() == (ultimo.id_rastro if ultimo else None):
+            return
+        # O último snapshot foi removido: o estado passa a ser o do novo último
+        self.conexao.execute('DELETE FROM HistoricoEstado')
+        self.conexao.execute('''
+            INSERT INTO HistoricoEstado (caminho, objeto)
+            SELECT caminho, objeto FROM (
+                SELECT caminho, objeto, MAX(id_rastro) FROM Historico GROUP BY caminho
+            ) WHERE objeto IS NOT NULL
+        ''')
+        self._definir_historico_ate(ultimo.id_rastro if ultimo else None)
+
+    def reconstruir_historico(self, estados: Iterable[Tuple[int, dict]]) -> int:
+        """
+        Refaz o histórico a partir do conteúdo completo (caminho -> objeto) de cada snapshot,
+        em ordem crescente de id. Retorna a quantidade de mudanças registradas.
+        """
+        with self.conexao:
+            self.conexao.execute('DELETE FROM Historico')
+            self.conexao.execute('DELETE FROM HistoricoEstado')
+            self._definir_historico_ate(None)
+            for id_rastro, arquivos in estados:
+                self._registrar_historico(id_rastro, arquivos)
+            ultimo = self.ultimo()
+            self._definir_historico_ate(ultimo.id_rastro if ultimo else None)
+            return self.conexao.execute('SELECT COUNT(*) FROM Historico').fetchone()[0]
+
+    def historico(self, caminho: str) -> List[Tuple[Snapshot, Optional[str]]]:
+        """
+        Snapshots em que o arquivo mudou, em ordem crescente, com o objeto gravado (None = removido).
+        """
+        colunas = ', '.join(f's.{c}' for c in _COLUNAS.split(', '))
+        return [
+            (Snapshot(*linha[:-1]), linha[-1])
+            for linha in self.conexao.execute(
+                f'SELECT {colunas}, h.objeto FROM Historico h '
+                f'JOIN Snapshots s ON s.id_rastro = h.id_rastro '
+                f'WHERE h.caminho = ? ORDER BY h.id_rastro', (caminho,)
+            )
+        ]
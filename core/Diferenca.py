@@ -0,0 +1,44 @@
+from dataclasses import dataclass, field
+
+@dataclass
+class Diferenca:
+    """
+    Resultado do rastro diff: caminhos adicionados, removidos e modificados
+    do lado antigo para o novo, em ordem de caminho.
+    """
+    adicionados: list = field(default_factory=list)
+    removidos: list = field(default_factory=list)
+    modificados: list = field(default_factory=list)
+    inalterados: int = 0
+
+    @property
+    def vazia(self) -> bool:
+        return not self.adicionados and not self.removidos and not self.modificados
+
+def comparar_manifestos(antigos: dict, novos: dict) -> Diferenca:
+    """
+    Merge das duas listas de arquivos (caminho -> entrada do manifesto) ordenadas por caminho.
+    O conteúdo é comparado pelo hash do objeto: nada é descomprimido.
+    """
+    diferenca = Diferenca()
+    caminhos_antigos = sorted(antigos)
+    caminhos_novos = sorted(novos)
+    i = j = 0
+    while i < len(caminhos_antigos) and j < len(caminhos_novos):
+        antigo, novo = caminhos_antigos[i], caminhos_novos[j]
+        if antigo < novo:
+            diferenca.removidos.append(antigo)
+            i += 1
+        elif novo < antigo:
+            diferenca.adicionados.append(novo)
+            j += 1
+        else:
+            if antigos[antigo]['objeto'] == novos[novo]['objeto']:
+                diferenca.inalterados += 1
+            else:
+                diferenca.modificados.append(antigo)
+            i += 1
+            j += 1
+    diferenca.removidos += caminhos_antigos[i:]
+    diferenca.adicionados += caminhos_novos[j:]
+    return diferenca
@@ -0,0 +1,109 @@
+import os
+import shutil
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from .ArmazemObjetos import ArmazemObjetos, TAMANHO_BLOCO
+try:
+    from util.Utilitarios import executar_em_paralelo
+except ImportError:
+    from rastro_app.util.Utilitarios import executar_em_paralelo
+
+# Threads de escrita na restauração. Em NVMe e sistemas de arquivos de rede a latência
+# por arquivo (open/write/chmod/utime) domina, então vale ter mais threads que núcleos.
+TRABALHADORES_PADRAO = min(32, (os.cpu_count() or 1) * 4)
+
+# Membros de .tar.gz até este tamanho são lidos para a memória e escritos por uma thread;
+# maiores são escritos em streaming pela thread leitora. Memória máxima ~ janela * limite.
+LIMITE_MEMBRO_EM_MEMORIA = TAMANHO_BLOCO
+
+class EscritorRestauracao:
+    """
+    Motor de restauração: descomprime em streaming e distribui a escrita dos arquivos,
+    a criação de pastas e o ajuste de permissões/mtime entre várias threads.
+    O uso de memória é limitado pela janela de tarefas pendentes, não pelo tamanho dos arquivos.
+    """
+    def __init__(self, caminho_raiz: str, armazem: ArmazemObjetos = None, trabalhadores: int = TRABALHADORES_PADRAO):
+        self.caminho_raiz = caminho_raiz
+        self.armazem = armazem
+        self.trabalhadores = trabalhadores
+        self.janela = trabalhadores * 4
+
+    def _destino(self, rel_path: str) -> str:
+        return os.path.join(self.caminho_raiz, *rel_path.split('/'))
+
+    def _criar_pastas(self, destinos):
+        # Criadas antes, em ordem, para as threads não disputarem o mesmo makedirs
+        for pasta in sorted({os.path.dirname(d) for d in destinos}):
+            os.makedirs(pasta, exist_ok=True)
+
+    def extrair_objetos(self, itens: dict) -> dict:
+        """
+        Extrai do armazém os arquivos de itens (caminho_relativo -> dados do manifesto).
+        Retorna caminho_relativo -> os.stat_result de cada arquivo escrito.
+        """
+        destinos = {rel_path: self._destino(rel_path) for rel_path in itens}
+        self._criar_pastas(destinos.values())
+
+        def escrever(rel_path):
+            dados = itens[rel_path]
+            destino = destinos[rel_path]
+            if os.path.isdir(destino) and not os.path.islink(destino):
+                # Uma pasta (só com arquivos ignorados) ocupa o lugar do arquivo
+                shutil.rmtree(destino)
+            self.armazem.extrair_para(dados['objeto'], destino)
+            os.chmod(destino, dados.get('modo', 0o644))
+            os.utime(destino, (dados['mod_time'], dados['mod_time']))
+            return rel_path, os.stat(destino)
+
+        with ThreadPoolExecutor(max_workers=self.trabalhadores) as executor:
+            return dict(executar_em_paralelo(executor, escrever, sorted(itens), self.janela))
+
+    def extrair_tar(self, caminho_tar: str) -> int:
+        """
+        Extrai um snapshot .tar.gz (formato antigo). O stream é lido por uma única thread,
+        mas a escrita de cada arquivo vai para o pool. Retorna a quantidade de arquivos escritos.
+        """
+        import tarfile
+        raiz = os.path.realpath(self.caminho_raiz)
+        pastas = []
+
+        def escrever(tarefa):
+            destino, conteudo, modo, mtime = tarefa
+            if conteudo is not None:
+                with open(destino, 'wb') as f:
+                    f.write(conteudo)
+            os.chmod(destino, modo)
+            os.utime(destino, (mtime, mtime))
+            return 1
+
+        def tarefas(tar):
+            for membro in tar:
+                destino = os.path.realpath(os.path.join(raiz, membro.name))
+                if destino != raiz and not destino.startswith(raiz + os.sep):
+                    logging.warning(f"Membro fora do projeto ignorado: {membro.name}")
+                    continue
+
+                if membro.isdir():
+                    os.makedirs(destino, exist_ok=True)
+                    pastas.append((destino, membro.mtime))
+                elif membro.isfile():
+                    os.makedirs(os.path.dirname(destino), exist_ok=True)
+                    origem = tar.extractfile(membro)
+                    if membro.size <= LIMITE_MEMBRO_EM_MEMORIA:
+                        yield destino, origem.read(), membro.mode & 0o777, membro.mtime
+                    else:
+                        # Arquivo grande: escrito aqui mesmo em blocos, sem carregar na memória
+                        with open(destino, 'wb') as f:
+                            shutil.copyfileobj(origem, f, TAMANHO_BLOCO)
+                        yield destino, None, membro.mode & 0o777, membro.mtime
+                else:
+                    # Links e outros tipos especiais: extração padrão do tarfile
+                    tar.extract(membro, self.caminho_raiz)
+
+        with tarfile.open(caminho_tar, 'r:*') as tar, ThreadPoolExecutor(max_workers=self.trabalhadores) as executor:
+            escritos = sum(executar_em_paralelo(executor, escrever, tarefas(tar), self.janela))
+
+        # mtime das pastas por último, depois que todos os arquivos foram escritos nelas
+        for destino, mtime in reversed(pastas):
+            os.utime(destino, (mtime, mtime))
+        return escritos
@@ -1,40 +1,96 @@
 import os
+import sys
 import json
 import logging
-import tarfile
 import shutil
 import hashlib
+import re
+import time
+import functools
 from datetime import datetime
 from typing import Optional, List
+from concurrent.futures import ThreadPoolExecutor
+# tarfile, sqlite3, difflib e o pool de processos são importados nas funções que os usam:
+# o rastro status, chamado a cada prompt do shell, não paga pela carga desses módulos
 from .Snapshot import Snapshot
+from .CatalogoSnapshots import CatalogoSnapshots
+from .Manifesto import Manifesto
+from .ArmazemObjetos import ArmazemObjetos, TAMANHO_BLOCO, CABECALHO_FRAGMENTOS
+from .PacotesObjetos import Pacote, EscritorPacote, conferir_pacote, TAMANHO_MAXIMO_PACOTE
+from .PlanoRestauracao import PlanoRestauracao
+from .Diferenca import Diferenca, comparar_manifestos
+from .EscritorRestauracao import EscritorRestauracao
+from .Resultados import (EstadoTrabalho, ResultadoSnapshot, ResultadoRestauracao, ResultadoRemocao,
+                         ALTERADO_ABORTAR, ALTERADO_DESCARTAR, ALTERADO_SALVAR, POLITICAS_ALTERADO)
 try:
     from global_db.GerenciadorGlobal import GerenciadorGlobal
     from util.StaleChecker import StaleChecker
-    from util.RegrasIgnorar import carregar_regras
-    from util.Utilitarios import eh_diretorio_critico
+    from util.CacheHashes import CacheHashes
+    from util.Observador import iniciar_observador, parar_observador, consultar_observador, observador_suportado
+    from util.Varredura import ListagemArvore, EntradaArquivo, varrer_arvore
+    from util.Utilitarios import eh_diretorio_critico, formatar_tamanho, formatar_ids, executar_em_paralelo, calcular_hashes_tar
+    from util.Compressao import validar_codec, CodecInvalido, CODEC_PADRAO, NIVEIS_PADRAO, abrir_leitura_stream
+    from util.Fragmentacao import validar_fragmentacao, FragmentacaoInvalida, LIMIAR_MINIMO, TAMANHO_MEDIO_PADRAO
+    from util.Busca import (compilar_padrao, caminho_aceito, buscar_em_objeto, buscar_em_tar, buscar_no_stream,
+                            linhas_em_tar, LIMITE_LINHAS_LOTE)
+    from util.Instrumentacao import fase, contar
 except ImportError:
     # Fallback se estiver rodando como pacote completo sem path hack
     from rastro_app.global_db.GerenciadorGlobal import GerenciadorGlobal
     from rastro_app.util.StaleChecker import StaleChecker
-    from rastro_app.util.RegrasIgnorar import carregar_regras
-    from rastro_app.util.Utilitarios import eh_diretorio_critico
+    from rastro_app.util.CacheHashes import CacheHashes
+    from rastro_app.util.Observador import iniciar_observador, parar_observador, consultar_observador, observador_suportado
+    from rastro_app.util.Varredura import ListagemArvore, EntradaArquivo, varrer_arvore
+    from rastro_app.util.Utilitarios import eh_diretorio_critico, formatar_tamanho, formatar_ids, executar_em_paralelo, calcular_hashes_tar
+    from rastro_app.util.Compressao import validar_codec, CodecInvalido, CODEC_PADRAO, NIVEIS_PADRAO, abrir_leitura_stream
+    from rastro_app.util.Fragmentacao import validar_fragmentacao, FragmentacaoInvalida, LIMIAR_MINIMO, TAMANHO_MEDIO_PADRAO
+    from rastro_app.util.Busca import (compilar_padrao, caminho_aceito, buscar_em_objeto, buscar_em_tar, buscar_no_stream,
+                                       linhas_em_tar, LIMITE_LINHAS_LOTE)
+    from rastro_app.util.Instrumentacao import fase, contar
+
+# A cada N snapshots incrementais encadeados, o próximo é gravado completo
+INTERVALO_SNAPSHOT_COMPLETO = 10
+
+# Bytes iniciais examinados para decidir se um arquivo é binário no diff
+AMOSTRA_BINARIO = 8000
+
+# Threads de hash/compressão no save
+TRABALHADORES_PADRAO = os.cpu_count() or 1
 
 class ProjetoNaoInicializado(Exception):
     pass
 
+class SnapshotNaoEncontrado(LookupError):
+    pass
+
+class AlteracoesNaoSalvas(Exception):
+    """
+    A restauração foi cancelada para não perder alterações não salvas (estado: EstadoTrabalho).
+    """
+    def __init__(self, estado):
+        super().__init__("Há alterações não salvas no diretório de trabalho.")
+        self.estado = estado
+
+class DiretorioProtegido(Exception):
+    pass
+
 class GerenciadorRastro:
-    def __init__(self, caminho_inicial: Optional[str] = None, comando_atual: str = ""):
+    def __init__(self, caminho_inicial: Optional[str] = None, comando_atual: str = "",
+                 verificar_conteudo: bool = False, verificar_registro: bool = True):
+        # O diretório do processo nunca é alterado: vários projetos podem ser usados no mesmo processo
         if caminho_inicial:
             if not os.path.exists(caminho_inicial):
                  raise FileNotFoundError(f"Caminho inicial não existe: {caminho_inicial}")
-            os.chdir(caminho_inicial)
+            inicio = os.path.abspath(caminho_inicial)
+        else:
+            inicio = os.getcwd()
         
-        self.caminho_raiz = self._encontrar_raiz_projeto()
-        self.gerenciador_global = GerenciadorGlobal()
+        self.caminho_raiz = self._encontrar_raiz_projeto(inicio)
+        self._gerenciador_global = None
         
         if not self.caminho_raiz:
             if comando_atual == 'init':
-                self.caminho_raiz = os.getcwd() # Init usa o diretório atual se não achar nada acima
+                self.caminho_raiz = inicio # Init usa o diretório inicial se não achar nada acima
             else:
                 raise ProjetoNaoInicializado()
         else:
@@ -44,14 +100,27 @@ class GerenciadorRastro:
 
         self.caminho_rastro = os.path.join(self.caminho_raiz, '.rastro')
         self.caminho_config = os.path.join(self.caminho_rastro, 'config.json')
+        self.armazem = ArmazemObjetos(self.caminho_rastro)
+        self.catalogo = CatalogoSnapshots(self.caminho_rastro)
         self.config = {}
+        # --verify: confere por hash os arquivos cujo stat mudou mas o tamanho não
+        self.verificar_conteudo = verificar_conteudo
 
         if os.path.exists(self.caminho_config):
             self._carregar_config()
-            self._verificar_registro_global()
+            # Comandos somente leitura não conferem o registro global: ele é atualizado
+            # no próximo comando que grava no projeto
+            if verificar_registro:
+                self._verificar_registro_global()
+
+    @property
+    def gerenciador_global(self) -> GerenciadorGlobal:
+        if self._gerenciador_global is None:
+            self._gerenciador_global = GerenciadorGlobal()
+        return self._gerenciador_global
 
-    def _encontrar_raiz_projeto(self) -> Optional[str]:
-        atual = os.getcwd()
+    def _encontrar_raiz_projeto(self, inicio: str) -> Optional[str]:
+        atual = inicio
         while True:
             if os.path.isdir(os.path.join(atual, '.rastro')):
                 return atual
@@ -61,27 +130,51 @@ class GerenciadorRastro:
             atual = pai
 
     def _carregar_config(self):
-        with open(self.caminho_config, 'r', encoding='utf-8') as f:
+        with fase('config_json'), open(self.caminho_config, 'r', encoding='utf-8') as f:
             self.config = json.load(f)
+        if "snapshots" in self.config:
+            self._migrar_snapshots_config()
+
+    def _migrar_snapshots_config(self):
+        """
+        Projetos antigos guardavam a lista de snapshots no config.json: passa para o catálogo SQLite.
+        """
+        importados = self.catalogo.importar(self.config["snapshots"])
+        del self.config["snapshots"]
+        self._salvar_config()
+        logging.info(f"{importados} snapshots migrados do config.json para {os.path.basename(self.catalogo.caminho)}.")
 
     def _salvar_config(self):
-        with open(self.caminho_config, 'w', encoding='utf-8') as f:
+        with fase('config_json'), open(self.caminho_config, 'w', encoding='utf-8') as f:
             json.dump(self.config, f, indent=2)
 
+    def _criar_stale_checker(self) -> StaleChecker:
+        verificar = self.verificar_conteudo or self.config.get("rastro", {}).get("verificar_conteudo", False)
+        return StaleChecker(self.caminho_raiz, verificar_conteudo=verificar)
+
     def _verificar_registro_global(self):
+        # Só os comandos que gravam chegam aqui: uma leitura na conexão do processo confere
+        # se o projeto está no registro com este caminho, e a escrita só acontece quando não
+        # está (primeira vez, pasta movida ou DB global apagado/recriado)
         nome = self.config['projeto']['nome']
         data_init = self.config['projeto']['data_inicializacao']
         id_unico = hashlib.sha256(f"{nome}::{data_init}".encode()).hexdigest()[:16]
         
-        projeto = self.gerenciador_global.obter_projeto_por_id(id_unico)
-        
-        if projeto:
-            caminho_registrado = projeto[2]
-            if caminho_registrado != self.caminho_raiz:
-                self.gerenciador_global.atualizar_caminho(id_unico, self.caminho_raiz)
-                logging.info(f"Caminho do projeto atualizado no registro global: {self.caminho_raiz}")
-        else:
-            self.gerenciador_global.registrar_projeto(nome, self.caminho_raiz, data_init)
+        import sqlite3
+        try:
+            with fase('registro_global'):
+                projeto = self.gerenciador_global.obter_projeto_por_id(id_unico)
+
+                if projeto:
+                    caminho_registrado = projeto[2]
+                    if caminho_registrado != self.caminho_raiz:
+                        self.gerenciador_global.atualizar_caminho(id_unico, self.caminho_raiz)
+                        logging.info(f"Caminho do projeto atualizado no registro global: {self.caminho_raiz}")
+                else:
+                    self.gerenciador_global.registrar_projeto(nome, self.caminho_raiz, data_init)
+        except sqlite3.Error as e:
+            # O registro global é auxiliar: o comando segue e a conferência fica para a próxima vez
+            logging.warning(f"Registro global indisponível: {e}")
 
     def inicializar(self, nome: Optional[str], mensagem: Optional[str], descricao: Optional[str] = None):
         if os.path.exists(self.caminho_config):
@@ -89,6 +182,18 @@ class GerenciadorRastro:
             print("Rastro já inicializado.")
             return
 
+        self.criar_projeto(nome, mensagem, descricao)
+        logging.info("Projeto Rastro inicializado com sucesso.")
+        print(f"Rastro inicializado em: {self.caminho_raiz}")
+
+    def criar_projeto(self, nome: Optional[str] = None, mensagem: Optional[str] = None,
+                      descricao: Optional[str] = None):
+        """
+        Cria o .rastro e registra o projeto no registro global. FileExistsError se já existir.
+        """
+        if os.path.exists(self.caminho_config):
+            raise FileExistsError(f"Rastro já inicializado em {self.caminho_raiz}")
+
         os.makedirs(os.path.join(self.caminho_rastro, 'snapshots'), exist_ok=True)
         
         nome_projeto = nome or os.path.basename(self.caminho_raiz)
@@ -104,76 +209,677 @@ class GerenciadorRastro:
             "rastro": {
                 "versao": "1.0",
                 "proximo_id": 1,
-                "ultimo_restaurado_id": 0
+                "ultimo_restaurado_id": 0,
+                "intervalo_completo": INTERVALO_SNAPSHOT_COMPLETO
             },
-            "snapshots": []
+            "compressao": {
+                "codec": CODEC_PADRAO,
+                "nivel": NIVEIS_PADRAO[CODEC_PADRAO]
+            }
         }
         
         self._salvar_config()
         self.gerenciador_global.registrar_projeto(nome_projeto, self.caminho_raiz, data_init)
-        logging.info("Projeto Rastro inicializado com sucesso.")
-        print(f"Rastro inicializado em: {self.caminho_raiz}")
 
-    def criar_snapshot(self, mensagem: Optional[str] = None):
-        stalle_checker = StaleChecker(self.caminho_raiz)
+    def criar_snapshot(self, mensagem: Optional[str] = None, completo: bool = False,
+                       codec: Optional[str] = None, nivel: Optional[int] = None):
+        try:
+            resultado = self.salvar_snapshot(mensagem, completo, codec, nivel)
+        except CodecInvalido as e:
+            print(f"Erro: {e}")
+            return
+        except FragmentacaoInvalida as e:
+            print(f"Erro na seção 'fragmentacao' do config.json: {e}")
+            return
+
+        self._exibir_snapshot_criado(resultado)
+
+    def _exibir_snapshot_criado(self, resultado: ResultadoSnapshot):
+        if not resultado.criado:
+            print("Nada para salvar. Diretório limpo.")
+            return
+        snap = resultado.snapshot
+        print(f"Snapshot #{snap.id_rastro} ({resultado.tipo}) criado com sucesso ({formatar_tamanho(snap.tamanho)}). "
+              f"{resultado.arquivos} arquivos arquivados, {resultado.objetos_novos} objetos novos.")
+        if resultado.objetos_novos:
+            print(f"  Gravados: {formatar_tamanho(resultado.bytes_comprimidos)} comprimidos ({resultado.codec}), "
+                  f"{formatar_tamanho(resultado.bytes_sem_compressao)} sem compressão.")
+
+    def salvar_snapshot(self, mensagem: Optional[str] = None, completo: bool = False,
+                        codec: Optional[str] = None, nivel: Optional[int] = None) -> ResultadoSnapshot:
+        """
+        Cria um snapshot do diretório de trabalho. CodecInvalido ou FragmentacaoInvalida se a
+        compressão pedida ou a do config.json for inválida.
+        """
+        # Codec: argumento da linha de comando > config.json do projeto > padrão
+        compressao = self.config.get("compressao", {})
+        codec, nivel = validar_codec(
+            codec or compressao.get("codec", CODEC_PADRAO),
+            nivel if nivel is not None else (None if codec else compressao.get("nivel"))
+        )
+        fragmentacao = self.config.get("fragmentacao", {})
+        limiar, tamanho_fragmento = validar_fragmentacao(fragmentacao.get("limiar"), fragmentacao.get("tamanho_medio"))
+
+        stalle_checker = self._criar_stale_checker()
         mods, adds, rems = stalle_checker.obter_delta_modificacao()
         
         # Se for o primeiro snapshot (proximo_id == 1), ignoramos o check de nada modificado
-        # pois o state.json ainda não existe ou é base.
+        # pois o index.bin ainda não existe ou é base.
         # Mas o stale checker retorna tudo como 'adicionado' se não tiver state.
         if not mods and not adds and not rems and self.config["rastro"]["proximo_id"] > 1:
             logging.info("Nada para salvar, diretório de trabalho limpo.")
-            print("Nada para salvar. Diretório limpo.")
-            return
+            return ResultadoSnapshot()
 
         msg = mensagem or "Snapshot sem mensagem"
-        id_snap = self.config["rastro"]["proximo_id"]
-        filename = f"rastro_{id_snap:04d}.tar.gz"
+        # O catálogo é a fonte de verdade: protege contra um config.json que não chegou a ser salvo
+        id_snap = max(self.config["rastro"]["proximo_id"], self.catalogo.maior_id() + 1)
+        filename = f"rastro_{id_snap:04d}.json"
         caminho_relativo_snap = f"snapshots/{filename}"
         caminho_absoluto_snap = os.path.join(self.caminho_rastro, caminho_relativo_snap)
         
-        regras = carregar_regras(self.caminho_raiz)
+        base_manifesto = self._obter_manifesto_base(stalle_checker.base_id)
+        if base_manifesto is None:
+            # Sem base utilizável (primeiro save, base legada ou index.bin ausente): varre tudo
+            manifesto = Manifesto(id_rastro=id_snap)
+            a_arquivar = stalle_checker.obter_listagem().caminhos()
+            tipo = "completo"
+        else:
+            # Só os arquivos modificados e novos são lidos e comprimidos
+            a_arquivar = mods + adds
+            intervalo = self.config["rastro"].get("intervalo_completo", INTERVALO_SNAPSHOT_COMPLETO)
+            if completo or base_manifesto.profundidade + 1 >= intervalo:
+                # Snapshot completo: achata a cadeia da base, reaproveitando os objetos já armazenados
+                arquivos = self._resolver_arquivos(base_manifesto.id_rastro)
+                for rel_path in rems:
+                    arquivos.pop(rel_path, None)
+                manifesto = Manifesto(id_rastro=id_snap, arquivos=arquivos)
+                tipo = "completo"
+            else:
+                manifesto = Manifesto(
+                    id_rastro=id_snap,
+                    base_id=base_manifesto.id_rastro,
+                    removidos=sorted(rems),
+                    profundidade=base_manifesto.profundidade + 1
+                )
+                tipo = f"incremental sobre #{base_manifesto.id_rastro}"
         
-        files_count = 0
-        with tarfile.open(caminho_absoluto_snap, mode='w:gz', compresslevel=1) as tar:
-            for root, dirs, files in os.walk(self.caminho_raiz):
-                # Filtrar diretórios
-                dirs[:] = [d for d in dirs if not regras.deve_ignorar(os.path.join(root, d), self.caminho_raiz)]
-                
-                for file in files:
-                    full_path = os.path.join(root, file)
-                    if regras.deve_ignorar(full_path, self.caminho_raiz):
-                        continue
-                        
-                    rel_path = os.path.relpath(full_path, self.caminho_raiz)
-                    try:
-                        tar.add(full_path, arcname=rel_path)
-                        files_count += 1
-                    except (PermissionError, OSError) as e:
-                        logging.warning(f"Arquivo ignorado por erro: {full_path} - {e}")
+        listagem = stalle_checker.obter_listagem()
+        with fase('arquivamento'):
+            estatisticas = self._arquivar_arquivos(a_arquivar, manifesto, codec, nivel, listagem,
+                                                   limiar, tamanho_fragmento, stalle_checker.cache_hashes)
+        for chave in ('arquivos', 'objetos_novos', 'bytes_lidos', 'bytes_comprimidos', 'bytes_sem_compressao'):
+            contar(f"arquivamento_{chave}", estatisticas[chave])
+        size_bytes = estatisticas['bytes_escritos']
 
-        size_bytes = os.path.getsize(caminho_absoluto_snap)
-        size_str = f"{size_bytes / 1024:.1f} KB" if size_bytes < 1024*1024 else f"{size_bytes / (1024*1024):.1f} MB"
+        with fase('manifesto'):
+            manifesto.salvar(caminho_absoluto_snap)
+        # Tamanho = custo real do snapshot em disco (objetos novos + manifesto)
+        size_bytes += os.path.getsize(caminho_absoluto_snap)
         
         snap = Snapshot(
             id_rastro=id_snap,
             mensagem=msg,
             timestamp=datetime.now().isoformat(),
             caminho_relativo=caminho_relativo_snap,
-            tamanho=size_str
+            tamanho=size_bytes
         )
         
-        self.config["snapshots"].append(snap.para_json())
-        self.config["rastro"]["proximo_id"] += 1
+        # O hash de cada arquivo vai para o histórico e para o índice (que confirma depois mudanças só de stat)
+        with fase('catalogo'):
+            hashes = {rel_path: dados['objeto'] for rel_path, dados in self._resolver_manifesto(manifesto).items()}
+            self.catalogo.adicionar(snap, hashes)
+        self.config["rastro"]["proximo_id"] = id_snap + 1
         self.config["rastro"]["ultimo_restaurado_id"] = id_snap
         
         self._salvar_config()
-        stalle_checker._salvar_state_json(base_id=id_snap)
+        stalle_checker.salvar_indice(base_id=id_snap, hashes=hashes)
         
-        print(f"Snapshot #{id_snap} criado com sucesso ({size_str}). {files_count} arquivos arquivados.")
+        return ResultadoSnapshot(
+            snapshot=snap,
+            tipo=tipo,
+            codec=codec,
+            arquivos=estatisticas['arquivos'],
+            objetos_novos=estatisticas['objetos_novos'],
+            bytes_lidos=estatisticas['bytes_lidos'],
+            bytes_comprimidos=estatisticas['bytes_comprimidos'],
+            bytes_sem_compressao=estatisticas['bytes_sem_compressao']
+        )
+
+    def _arquivar_arquivos(self, a_arquivar: List[str], manifesto: Manifesto, codec: str, nivel: int,
+                           listagem: ListagemArvore, limiar_fragmentos: Optional[int] = None,
+                           tamanho_fragmento: int = TAMANHO_MEDIO_PADRAO,
+                           cache_hashes: Optional[CacheHashes] = None) -> dict:
+        """
+        Hash e compressão dos arquivos em paralelo (zlib, lzma, bz2 e hashlib liberam o GIL).
+        Os metadados vêm da mesma listagem usada no delta e no index.bin.
+        Preenche o manifesto e retorna as estatísticas do arquivamento.
+        """
+        # Hashes já conhecidos pelo stat (rastro status --verify): conteúdo já armazenado não é relido.
+        # Consultados aqui, antes das threads, porque o cache é carregado no primeiro acesso
+        conhecidos = {}
+        if cache_hashes is not None:
+            for rel_path in a_arquivar:
+                stats = listagem[rel_path]
+                conhecidos[rel_path] = cache_hashes.obter(stats.inode, stats.size, stats.mtime_ns)
+
+        def arquivar(rel_path):
+            full_path = os.path.join(self.caminho_raiz, *rel_path.split('/'))
+            stats = listagem[rel_path]
+            try:
+                id_objeto, escritos, codec_usado = self.armazem.armazenar_arquivo(
+                    full_path, codec, nivel, limiar_fragmentos, tamanho_fragmento, conhecidos.get(rel_path))
+            except (PermissionError, OSError) as e:
+                logging.warning(f"Arquivo ignorado por erro: {full_path} - {e}")
+                return None
+            return rel_path, stats, id_objeto, escritos, codec_usado
+
+        estatisticas = {
+            'arquivos': 0,
+            'objetos_novos': 0,
+            'bytes_lidos': 0,
+            'bytes_escritos': 0,
+            'bytes_comprimidos': 0,
+            'bytes_sem_compressao': 0
+        }
+        trabalhadores = self.config.get("compressao", {}).get("trabalhadores") or TRABALHADORES_PADRAO
+        with ThreadPoolExecutor(max_workers=trabalhadores) as executor:
+            for resultado in executor.map(arquivar, a_arquivar):
+                if resultado is None:
+                    continue
+                rel_path, stats, id_objeto, escritos, codec_usado = resultado
+                manifesto.arquivos[rel_path] = {
+                    'objeto': id_objeto,
+                    'size': stats.size,
+                    'mod_time': stats.mod_time,
+                    'modo': stats.modo & 0o777
+                }
+                estatisticas['arquivos'] += 1
+                estatisticas['bytes_lidos'] += stats.size
+                if codec_usado is None:
+                    continue
+                estatisticas['objetos_novos'] += 1
+                estatisticas['bytes_escritos'] += escritos
+                if codec_usado == 'store':
+                    estatisticas['bytes_sem_compressao'] += escritos
+                else:
+                    estatisticas['bytes_comprimidos'] += escritos
+        return estatisticas
+
+    def _obter_snapshot_por_id(self, id_rastro: int) -> Optional[Snapshot]:
+        return self.catalogo.obter(id_rastro)
+
+    def _obter_snapshot_alvo(self, alvo: str) -> Optional[Snapshot]:
+        """
+        Como resolver_alvo, mas avisa e retorna None se não houver snapshot correspondente.
+        """
+        try:
+            return self.resolver_alvo(alvo)
+        except ValueError:
+            print("Alvo inválido.")
+        except SnapshotNaoEncontrado:
+            print(f"Snapshot alvo '{alvo}' não encontrado.")
+        return None
+
+    def resolver_alvo(self, alvo) -> Snapshot:
+        """
+        Interpreta o alvo dos comandos (ID, "last" ou posição a partir do mais recente).
+        ValueError se o alvo for inválido, SnapshotNaoEncontrado se não houver snapshot.
+        """
+        if str(alvo).lower() == 'last':
+            snap = self.catalogo.ultimo()
+        else:
+            # Se id específico (1, 2, 3...)
+            alvo_id = int(alvo)
+            # Se não achar por ID, talvez o usuário quis dizer "o 1º mais recente", "o 2º mais recente"
+            # A spec diz: "rastro restore 1 -> mais recente", "restore 2 -> penúltimo"
+            snap = self.catalogo.obter(alvo_id) or self.catalogo.por_posicao(alvo_id)
+
+        if not snap:
+            raise SnapshotNaoEncontrado(f"Snapshot alvo '{alvo}' não encontrado.")
+        return snap
+
+    def _carregar_manifesto(self, id_rastro: int) -> Manifesto:
+        snap = self._obter_snapshot_por_id(id_rastro)
+        if snap is None or snap.legado:
+            raise FileNotFoundError(f"Manifesto do snapshot #{id_rastro} não encontrado.")
+        return Manifesto.carregar(os.path.join(self.caminho_rastro, snap.caminho_relativo))
+
+    def _obter_manifesto_base(self, base_id: Optional[int]) -> Optional[Manifesto]:
+        """
+        Manifesto do snapshot sobre o qual o index.bin foi gerado, se puder servir de base incremental.
+        """
+        if base_id is None:
+            return None
+        try:
+            return self._carregar_manifesto(base_id)
+        except (OSError, ValueError) as e:
+            logging.debug(f"Snapshot base #{base_id} indisponível para save incremental: {e}")
+            return None
+
+    def _resolver_arquivos(self, id_rastro: int) -> dict:
+        """
+        Reconstrói a lista completa de arquivos de um snapshot seguindo a cadeia de bases incrementais.
+        """
+        return self._resolver_manifesto(self._carregar_manifesto(id_rastro))
+
+    def _resolver_manifesto(self, manifesto: Manifesto) -> dict:
+        cadeia = [manifesto]
+        while manifesto.base_id is not None:
+            manifesto = self._carregar_manifesto(manifesto.base_id)
+            cadeia.append(manifesto)
+
+        arquivos = {}
+        for manifesto in reversed(cadeia):
+            for rel_path in manifesto.removidos:
+                arquivos.pop(rel_path, None)
+            arquivos.update(manifesto.arquivos)
+        return arquivos
+
+    def _localizar_arquivo(self, id_rastro: int, rel_path: str) -> Optional[dict]:
+        """
+        Entrada do manifesto de um único arquivo, sem reconstruir a lista completa:
+        percorre a cadeia do snapshot para a base e para no primeiro manifesto que o menciona.
+        """
+        atual = id_rastro
+        while atual is not None:
+            manifesto = self._carregar_manifesto(atual)
+            if rel_path in manifesto.arquivos:
+                return manifesto.arquivos[rel_path]
+            if rel_path in manifesto.removidos:
+                return None
+            atual = manifesto.base_id
+        return None
+
+    def _caminho_no_projeto(self, caminho: str) -> str:
+        # Caminhos são relativos à pasta atual, como no shell; o manifesto usa a raiz e '/'
+        absoluto = os.path.abspath(caminho)
+        if absoluto == self.caminho_raiz or absoluto.startswith(self.caminho_raiz + os.sep):
+            return os.path.relpath(absoluto, self.caminho_raiz).replace(os.sep, '/')
+        return caminho.replace(os.sep, '/')
+
+    def exibir_arquivo(self, alvo: str, caminho: str):
+        """
+        rastro show <id> <caminho>: escreve na saída padrão o conteúdo de um arquivo do snapshot.
+        Só o objeto desse arquivo é descomprimido.
+        """
+        snap = self._obter_snapshot_alvo(alvo)
+        if not snap:
+            return
+        rel_path = self._caminho_no_projeto(caminho)
+        saida = sys.stdout.buffer
+
+        if snap.legado:
+            import tarfile
+            # .tar.gz não tem índice: lê o stream até encontrar o membro
+            with tarfile.open(os.path.join(self.caminho_rastro, snap.caminho_relativo), 'r:*') as tar:
+                for membro in tar:
+                    if membro.isfile() and membro.name == rel_path:
+                        shutil.copyfileobj(tar.extractfile(membro), saida, TAMANHO_BLOCO)
+                        saida.flush()
+                        return
+            print(f"Arquivo '{rel_path}' não existe no snapshot #{snap.id_rastro}.", file=sys.stderr)
+            return
+
+        dados = self._localizar_arquivo(snap.id_rastro, rel_path)
+        if dados is None:
+            print(f"Arquivo '{rel_path}' não existe no snapshot #{snap.id_rastro}.", file=sys.stderr)
+            return
+        with self.armazem.abrir(dados['objeto']) as origem:
+            shutil.copyfileobj(origem, saida, TAMANHO_BLOCO)
+        saida.flush()
+
+    def listar_arquivos(self, alvo: str, detalhado: bool = False):
+        """
+        rastro ls <id>: lista os arquivos do snapshot a partir dos manifestos, sem descomprimir nada.
+        """
+        snap = self._obter_snapshot_alvo(alvo)
+        if not snap:
+            return
+
+        if snap.legado:
+            import tarfile
+            with tarfile.open(os.path.join(self.caminho_rastro, snap.caminho_relativo), 'r:*') as tar:
+                arquivos = {m.name: {'size': m.size, 'mod_time': m.mtime} for m in tar if m.isfile()}
+        else:
+            arquivos = self._resolver_arquivos(snap.id_rastro)
+
+        for rel_path in sorted(arquivos):
+            if detalhado:
+                dados = arquivos[rel_path]
+                data_fmt = datetime.fromtimestamp(dados['mod_time']).strftime("%Y-%m-%d %H:%M:%S")
+                print(f"{formatar_tamanho(dados['size']):>10}  {data_fmt}  {rel_path}")
+            else:
+                print(rel_path)
+
+    def comparar_snapshots(self, alvo_antigo: str, alvo_novo: Optional[str] = None, patch: bool = False):
+        """
+        rastro diff <a> [<b>]: arquivos adicionados, removidos e modificados entre dois snapshots
+        ou, sem <b>, entre o snapshot e o diretório de trabalho. A comparação usa só os manifestos;
+        com patch, apenas os arquivos que diferem são descomprimidos.
+        """
+        snap_antigo = self._obter_snapshot_alvo(alvo_antigo)
+        if not snap_antigo:
+            return
+        snap_novo = None
+        if alvo_novo is not None:
+            snap_novo = self._obter_snapshot_alvo(alvo_novo)
+            if not snap_novo:
+                return
+        for snap in (snap_antigo, snap_novo):
+            if snap is not None and snap.legado:
+                print(f"Snapshot #{snap.id_rastro} está no formato antigo (.tar.gz), sem manifesto para comparar.")
+                return
+
+        antigos = self._resolver_arquivos(snap_antigo.id_rastro)
+        if snap_novo is not None:
+            novos = self._resolver_arquivos(snap_novo.id_rastro)
+            diferenca = comparar_manifestos(antigos, novos)
+            rotulo_novo = f"#{snap_novo.id_rastro}"
+        else:
+            novos = None
+            diferenca = self._comparar_com_trabalho(antigos)
+            rotulo_novo = "trabalho"
+        rotulo_antigo = f"#{snap_antigo.id_rastro}"
+
+        if diferenca.vazia:
+            print(f"Nenhuma diferença entre {rotulo_antigo} e {'o diretório de trabalho' if novos is None else rotulo_novo}.")
+            return
+
+        marcas = {}
+        marcas.update((rel_path, '+') for rel_path in diferenca.adicionados)
+        marcas.update((rel_path, '~') for rel_path in diferenca.modificados)
+        marcas.update((rel_path, '-') for rel_path in diferenca.removidos)
+        for rel_path in sorted(marcas):
+            print(f"  {marcas[rel_path]} {rel_path}")
+        print(f"Adicionados: {len(diferenca.adicionados)} | Modificados: {len(diferenca.modificados)} | "
+              f"Removidos: {len(diferenca.removidos)} | Inalterados: {diferenca.inalterados}")
+
+        if not patch:
+            return
+        print()
+        for rel_path in sorted(marcas):
+            conteudo_antigo = self._ler_objeto(antigos.get(rel_path))
+            if novos is not None:
+                conteudo_novo = self._ler_objeto(novos.get(rel_path))
+            elif marcas[rel_path] == '-':
+                conteudo_novo = None
+            else:
+                conteudo_novo = self._ler_do_trabalho(rel_path)
+            self._exibir_patch(rel_path, conteudo_antigo, conteudo_novo, rotulo_antigo, rotulo_novo)
+
+    def _comparar_com_trabalho(self, antigos: dict) -> Diferenca:
+        """
+        Merge do snapshot com a varredura do StaleChecker. Arquivos limpos são comparados pelo
+        manifesto do snapshot ativo; os demais só são lidos quando o tamanho coincide.
+        """
+        stale = self._criar_stale_checker()
+        mods, adds, _ = stale.obter_delta_modificacao()
+        listagem = stale.obter_listagem()
+        conhecidos = self._conteudo_conhecido(stale, mods, adds)
+
+        diferenca = Diferenca()
+        a_conferir = []
+        caminhos_antigos = sorted(antigos)
+        i = 0
+        for entrada in listagem:
+            while i < len(caminhos_antigos) and caminhos_antigos[i] < entrada.caminho:
+                diferenca.removidos.append(caminhos_antigos[i])
+                i += 1
+            if i == len(caminhos_antigos) or caminhos_antigos[i] != entrada.caminho:
+                diferenca.adicionados.append(entrada.caminho)
+                continue
+            i += 1
+            dados = antigos[entrada.caminho]
+            if entrada.size != dados['size']:
+                diferenca.modificados.append(entrada.caminho)
+            elif entrada.caminho in conhecidos:
+                if conhecidos[entrada.caminho] == dados['objeto']:
+                    diferenca.inalterados += 1
+                else:
+                    diferenca.modificados.append(entrada.caminho)
+            else:
+                a_conferir.append(entrada.caminho)
+        diferenca.removidos += caminhos_antigos[i:]
+
+        atuais = stale.calcular_hashes(a_conferir)
+        for rel_path in a_conferir:
+            if atuais.get(rel_path) == antigos[rel_path]['objeto']:
+                diferenca.inalterados += 1
+            else:
+                diferenca.modificados.append(rel_path)
+        diferenca.modificados.sort()
+        return diferenca
+
+    def _ler_objeto(self, dados: Optional[dict]) -> Optional[bytes]:
+        if dados is None:
+            return None
+        with self.armazem.abrir(dados['objeto']) as origem:
+            return origem.read()
+
+    def _ler_do_trabalho(self, rel_path: str) -> Optional[bytes]:
+        try:
+            with open(os.path.join(self.caminho_raiz, *rel_path.split('/')), 'rb') as f:
+                return f.read()
+        except OSError as e:
+            logging.warning(f"Não foi possível ler {rel_path}: {e}")
+            return None
+
+    def _exibir_patch(self, rel_path: str, antigo: Optional[bytes], novo: Optional[bytes],
+                      rotulo_antigo: str, rotulo_novo: str):
+        """
+        Diff unificado de um arquivo. None indica que o arquivo não existe naquele lado.
+        """
+        if b'\0' in (antigo or b'')[:AMOSTRA_BINARIO] or b'\0' in (novo or b'')[:AMOSTRA_BINARIO]:
+            print(f"Arquivos binários diferem: {rel_path}")
+            return
+        import difflib
+        linhas = difflib.unified_diff(
+            (antigo or b'').decode('utf-8', 'replace').splitlines(keepends=True),
+            (novo or b'').decode('utf-8', 'replace').splitlines(keepends=True),
+            fromfile='/dev/null' if antigo is None else f"a/{rel_path}",
+            tofile='/dev/null' if novo is None else f"b/{rel_path}",
+            fromfiledate=rotulo_antigo,
+            tofiledate=rotulo_novo,
+        )
+        for linha in linhas:
+            if linha.endswith('\n'):
+                sys.stdout.write(linha)
+            else:
+                sys.stdout.write(linha + "\n\\ No newline at end of file\n")
+
+    def exibir_historico(self, caminho: str):
+        """
+        rastro log <caminho>: snapshots em que o arquivo mudou, do mais recente para o mais antigo.
+        Consulta só o índice de histórico do catálogo, sem abrir manifestos.
+        """
+        if not self.catalogo.historico_sincronizado():
+            print("O histórico de arquivos não cobre todos os snapshots (projeto de uma versão anterior).")
+            print("Rode 'rastro log --rebuild' para reconstruí-lo.")
+            return
+        rel_path = self._caminho_no_projeto(caminho)
+        registros = self.catalogo.historico(rel_path)
+        if not registros:
+            print(f"Arquivo '{rel_path}' não aparece em nenhum snapshot.")
+            return
+
+        linhas = []
+        anterior = None
+        for snap, objeto in registros:
+            if objeto is None:
+                alteracao = "removido"
+            elif anterior is None:
+                alteracao = "criado"
+            else:
+                alteracao = "modificado"
+            linhas.append((snap, alteracao, objeto))
+            anterior = objeto
+
+        print(f"Histórico de {rel_path}:")
+        print(f"{'ID':<4} | {'Data/Hora':<19} | {'Alteração':<10} | {'Conteúdo':<12} | {'Mensagem'}")
+        print("-" * 80)
+        for snap, alteracao, objeto in reversed(linhas):
+            data_fmt = datetime.fromisoformat(snap.timestamp).strftime("%Y-%m-%d %H:%M:%S")
+            print(f"{snap.id_rastro:<4} | {data_fmt:<19} | {alteracao:<10} | {(objeto or '')[:12]:<12} | {snap.mensagem}")
+
+    def reconstruir_historico(self):
+        """
+        rastro log --rebuild: refaz o histórico de arquivos a partir de todos os snapshots.
+        Os .tar.gz antigos não têm hashes e são lidos em paralelo, um processo por arquivo.
+        """
+        snaps = list(self.catalogo)
+        legados = [os.path.join(self.caminho_rastro, s.caminho_relativo) for s in snaps if s.legado]
+        print(f"Reconstruindo histórico de {len(snaps)} snapshots ({len(legados)} no formato antigo)...")
+
+        trabalhadores = self.config.get("compressao", {}).get("trabalhadores") or TRABALHADORES_PADRAO
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=trabalhadores) as executor:
+            hashes_legados = executar_em_paralelo(executor, calcular_hashes_tar, legados, trabalhadores * 2)
+            mudancas = self.catalogo.reconstruir_historico(self._estados_snapshots(snaps, hashes_legados))
+        print(f"Histórico reconstruído: {mudancas} alterações de arquivos registradas.")
+
+    def _estados_snapshots(self, snaps: List[Snapshot], hashes_legados):
+        """
+        Conteúdo completo (caminho -> objeto) de cada snapshot, em ordem. O dicionário é o
+        mesmo a cada passo, atualizado no lugar: use-o antes de pedir o próximo.
+        """
+        for id_rastro, estado, _ in self._mudancas_snapshots(snaps, hashes_legados):
+            yield id_rastro, estado
+
+    def _mudancas_snapshots(self, snaps: List[Snapshot], hashes_legados):
+        """
+        (id, estado, mudanças) de cada snapshot, em ordem. estado é o conteúdo completo, um único
+        dicionário atualizado no lugar; mudanças, os caminhos alterados desde o snapshot anterior
+        (caminho -> objeto, ou None se removido). Manifestos incrementais sobre o snapshot anterior
+        são aplicados direto, sem reler a cadeia nem copiar o estado.
+        """
+        anterior_id = None
+        estado = {}
+        for snap in snaps:
+            manifesto = None if snap.legado else self._carregar_manifesto(snap.id_rastro)
+            if manifesto is not None and manifesto.base_id is not None and manifesto.base_id == anterior_id:
+                mudancas = {p: None for p in manifesto.removidos if p in estado}
+                mudancas.update((p, d['objeto']) for p, d in manifesto.arquivos.items()
+                                if estado.get(p) != d['objeto'])
+            else:
+                if manifesto is None:
+                    arquivos = next(hashes_legados)
+                else:
+                    arquivos = {p: d['objeto'] for p, d in self._resolver_arquivos(snap.id_rastro).items()}
+                mudancas = {p: None for p in estado if p not in arquivos}
+                mudancas.update((p, objeto) for p, objeto in arquivos.items() if estado.get(p) != objeto)
+            for rel_path, objeto in mudancas.items():
+                if objeto is None:
+                    del estado[rel_path]
+                else:
+                    estado[rel_path] = objeto
+            yield snap.id_rastro, estado, mudancas
+            anterior_id = snap.id_rastro
+
+    def buscar_conteudo(self, padrao: str, alvos: Optional[List[str]] = None, globs: Optional[List[str]] = None,
+                        ignorar_maiusculas: bool = False):
+        """
+        rastro grep <padrão>: procura o padrão (expressão regular) no conteúdo dos snapshots.
+        Cada conteúdo distinto é descomprimido e pesquisado uma única vez, num pool de processos,
+        e o resultado é impresso à medida que os objetos terminam, na ordem dos snapshots.
+        """
+        try:
+            regex = compilar_padrao(padrao, ignorar_maiusculas)
+        except re.error as e:
+            print(f"Padrão inválido: {e}")
+            return
+
+        if alvos:
+            snaps = []
+            for alvo in alvos:
+                snap = self._obter_snapshot_alvo(alvo)
+                if not snap:
+                    return
+                snaps.append(snap)
+            snaps = sorted({s.id_rastro: s for s in snaps}.values(), key=lambda s: s.id_rastro)
+        else:
+            snaps = list(self.catalogo)
+
+        # Conteúdo -> caminho -> faixas (primeira, última) de posições em ids em que aparece.
+        # Só as mudanças de cada snapshot são percorridas: a memória acompanha o número de
+        # mudanças no histórico, não snapshots x arquivos
+        ocorrencias = {}
+        ids = []
+        abertas = {}  # caminho -> (objeto, posição em que a faixa começou)
+        modernos = [s for s in snaps if not s.legado]
+        for posicao, (id_rastro, _, mudancas) in enumerate(self._mudancas_snapshots(modernos, iter(()))):
+            ids.append(id_rastro)
+            for rel_path, objeto in mudancas.items():
+                if not caminho_aceito(rel_path, globs):
+                    continue
+                aberta = abertas.pop(rel_path, None)
+                if aberta is not None:
+                    ocorrencias.setdefault(aberta[0], {}).setdefault(rel_path, []).append((aberta[1], posicao - 1))
+                if objeto is not None:
+                    abertas[rel_path] = (objeto, posicao)
+        for rel_path, (objeto, inicio) in abertas.items():
+            ocorrencias.setdefault(objeto, {}).setdefault(rel_path, []).append((inicio, len(ids) - 1))
+        del abertas
+        # Em ordem do primeiro snapshot e caminho em que cada conteúdo aparece
+        objetos = sorted(ocorrencias, key=lambda o: min((faixas[0][0], p) for p, faixas in ocorrencias[o].items()))
+        legados = [s for s in snaps if s.legado]
+
+        linhas = 0
+        trabalhadores = self.config.get("compressao", {}).get("trabalhadores") or TRABALHADORES_PADRAO
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=trabalhadores) as executor:
+            try:
+                # Snapshots .tar.gz não têm hashes: cada um é lido inteiro, sem deduplicação
+                caminhos_tar = [os.path.join(self.caminho_rastro, s.caminho_relativo) for s in legados]
+                buscar = functools.partial(buscar_em_tar, regex=regex, globs=globs, limite=LIMITE_LINHAS_LOTE)
+                resultados = executar_em_paralelo(executor, buscar, caminhos_tar, trabalhadores * 2)
+                for snap, caminho_tar, encontradas in zip(legados, caminhos_tar, resultados):
+                    if encontradas is None:
+                        logging.warning(f"Snapshot #{snap.id_rastro} não pôde ser lido.")
+                        continue
+                    if len(encontradas) > LIMITE_LINHAS_LOTE:
+                        # Lote cortado: o snapshot é lido de novo aqui, com as linhas saindo à medida que aparecem
+                        encontradas = linhas_em_tar(caminho_tar, regex, globs)
+                    for rel_path, numero, linha in encontradas:
+                        print(f"#{snap.id_rastro}:{rel_path}:{numero}:{linha}")
+                        linhas += 1
+                    sys.stdout.flush()
+
+                buscar = functools.partial(buscar_em_objeto, abrir=self.armazem.abrir, regex=regex,
+                                           limite=LIMITE_LINHAS_LOTE)
+                for objeto, encontradas in zip(objetos, executar_em_paralelo(executor, buscar, objetos, trabalhadores * 4)):
+                    if encontradas is None:
+                        logging.warning(f"Objeto {objeto} ausente ou corrompido.")
+                        continue
+                    cortado = len(encontradas) > LIMITE_LINHAS_LOTE
+                    for rel_path, faixas in sorted(ocorrencias.pop(objeto).items(), key=lambda item: (item[1][0], item[0])):
+                        rotulo = formatar_ids([i for inicio, fim in faixas for i in ids[inicio:fim + 1]])
+                        # Lote cortado: o conteúdo é lido de novo aqui para cada caminho, sem acumular as linhas
+                        linhas_objeto = 0
+                        for numero, linha in (self._linhas_objeto(objeto, regex) if cortado else encontradas):
+                            print(f"{rotulo}:{rel_path}:{numero}:{linha}")
+                            linhas_objeto += 1
+                    linhas += linhas_objeto
+                    sys.stdout.flush()
+            except BrokenPipeError:
+                # Saída fechada (rastro grep ... | head): não espera os objetos que ainda estão na fila
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
 
-    def listar_snapshots(self):
-        snaps = self.config.get("snapshots", [])
+        print(f"{linhas} linhas encontradas em {len(snaps)} snapshots "
+              f"({len(objetos)} conteúdos distintos pesquisados).", file=sys.stderr)
+
+    def _linhas_objeto(self, objeto: str, regex):
+        with self.armazem.abrir(objeto) as origem:
+            yield from buscar_no_stream(origem, regex)
+
+    def listar_snapshots(self, limite: Optional[int] = None, desde: Optional[str] = None):
+        if desde:
+            try:
+                desde = datetime.fromisoformat(desde).isoformat()
+            except ValueError:
+                print(f"Data inválida: {desde}. Use o formato AAAA-MM-DD ou AAAA-MM-DDTHH:MM.")
+                return
+        snaps = self.catalogo.listar(limite, desde)
         print(f"[Rastro: {self.config['projeto']['nome']} - {self.config['projeto']['descricao']}]")
         print(f"{'ID':<4} | {'Ativo':^5} | {'Data/Hora':<19} | {'Tamanho':<8} | {'Mensagem'}")
         print("-" * 80)
@@ -181,163 +887,629 @@ class GerenciadorRastro:
         ativo_id = self.config["rastro"].get("ultimo_restaurado_id")
         
         for s in snaps:
-            data_fmt = datetime.fromisoformat(s["timestamp"]).strftime("%Y-%m-%d %H:%M:%S")
-            ativo_mark = "*" if s["id_rastro"] == ativo_id else ""
-            print(f"{s['id_rastro']:<4} | {ativo_mark:^5} | {data_fmt:<19} | {s['tamanho']:<8} | {s['mensagem']}")
+            data_fmt = datetime.fromisoformat(s.timestamp).strftime("%Y-%m-%d %H:%M:%S")
+            ativo_mark = "*" if s.id_rastro == ativo_id else ""
+            print(f"{s.id_rastro:<4} | {ativo_mark:^5} | {data_fmt:<19} | {formatar_tamanho(s.tamanho):<8} | {s.mensagem}")
+
+        if limite is not None or desde:
+            total = self.catalogo.quantidade(desde)
+            if len(snaps) < total:
+                print(f"\nMostrando {len(snaps)} de {total} snapshots.")
 
     def restaurar_snapshot(self, alvo: str, dry_run: bool = False, save_before: bool = False):
-        snaps = self.config.get("snapshots", [])
-        if not snaps:
+        if not self.catalogo.quantidade():
             print("Nenhum snapshot para restaurar.")
             return
 
-        # Ordenar por id (que é cronológico)
-        snaps_sorted = sorted(snaps, key=lambda x: x['id_rastro'])
-        
-        target_snap = None
-        if alvo.lower() == 'last':
-            target_snap = snaps_sorted[-1]
-        else:
-            try:
-                # Se id específico (1, 2, 3...)
-                alvo_id = int(alvo)
-                # Tentar achar pelo ID exato
-                for s in snaps_sorted:
-                    if s['id_rastro'] == alvo_id:
-                        target_snap = s
-                        break
-                
-                # Se não achar por ID, talvez o usuário quis dizer "o 1º mais recente", "o 2º mais recente"
-                # A spec diz: "rastro restore 1 -> mais recente", "restore 2 -> penúltimo"
-                # Vamos seguir a SPEC, que é baseada em índice reverso (1-based)
-                if not target_snap:
-                   # SPEC: restore 1 (mais recente/last), restore 2 (penultimo)
-                   idx_reverso = int(alvo)
-                   if 1 <= idx_reverso <= len(snaps_sorted):
-                       target_snap = snaps_sorted[-idx_reverso]
-            except ValueError:
-                print("Alvo inválido.")
-                return
-
+        target_snap = self._obter_snapshot_alvo(alvo)
         if not target_snap:
-            print(f"Snapshot alvo '{alvo}' não encontrado.")
             return
 
-        print(f"Restaurando snapshot #{target_snap['id_rastro']} - {target_snap['mensagem']}...")
+        print(f"Restaurando snapshot #{target_snap.id_rastro} - {target_snap.mensagem}...")
+
+        def confirmar(estado: EstadoTrabalho) -> str:
+            resp = input("Há alterações não salvas. Continuar perderá essas alterações. Confirmar? (y/n): ")
+            return ALTERADO_DESCARTAR if resp.lower() == 'y' else ALTERADO_ABORTAR
+
+        try:
+            resultado = self.restaurar(target_snap, dry_run, ALTERADO_SALVAR if save_before else confirmar)
+        except AlteracoesNaoSalvas:
+            print("Operação cancelada.")
+            return
+        except DiretorioProtegido:
+            print("ERRO CRÍTICO: Diretório protegido. Operação abortada.")
+            return
 
-        stale = StaleChecker(self.caminho_raiz)
+        if resultado.autosave is not None:
+            self._exibir_snapshot_criado(resultado.autosave)
+        plano = resultado.plano
+        if dry_run:
+            if plano is None:
+                print("[DRY-RUN] O diretório seria limpo (exceto .rastro) e os arquivos do snapshot extraídos.")
+            else:
+                self._exibir_plano_restauracao(plano)
+            return
+        if plano is not None:
+            print(f"{len(plano.criar)} criados, {len(plano.sobrescrever)} sobrescritos, "
+                  f"{len(plano.remover)} removidos, {plano.inalterados} inalterados.")
+        print("Restauração concluída com sucesso.")
+
+    def restaurar(self, target_snap: Snapshot, dry_run: bool = False,
+                  se_alterado=ALTERADO_ABORTAR) -> ResultadoRestauracao:
+        """
+        Leva o diretório de trabalho ao estado do snapshot. se_alterado decide o que fazer com
+        alterações não salvas: uma das POLITICAS_ALTERADO, ou uma função que recebe o
+        EstadoTrabalho e devolve uma delas. ALTERADO_ABORTAR levanta AlteracoesNaoSalvas.
+        """
+        if not callable(se_alterado) and se_alterado not in POLITICAS_ALTERADO:
+            raise ValueError(f"Política desconhecida para alterações não salvas: {se_alterado}")
+        resultado = ResultadoRestauracao(snapshot=target_snap)
+
+        stale = self._criar_stale_checker()
         mods, adds, rems = stale.obter_delta_modificacao()
         
         if (mods or adds or rems) and not dry_run:
-            if save_before:
-                self.criar_snapshot(f"Autosave antes de restore para ID {target_snap['id_rastro']}")
-            else:
-                resp = input("Há alterações não salvas. Continuar perderá essas alterações. Confirmar? (y/n): ")
-                if resp.lower() != 'y':
-                    print("Operação cancelada.")
-                    return
+            estado = self._estado_trabalho(stale, mods, adds, rems)
+            politica = se_alterado(estado) if callable(se_alterado) else se_alterado
+            if politica == ALTERADO_SALVAR:
+                resultado.autosave = self.salvar_snapshot(f"Autosave antes de restore para ID {target_snap.id_rastro}")
+            elif politica != ALTERADO_DESCARTAR:
+                raise AlteracoesNaoSalvas(estado)
 
-        if dry_run:
-            print("[DRY-RUN] O diretório seria limpo (exceto .rastro) e os arquivos do snapshot extraídos.")
-            return
+        caminho_snap = os.path.join(self.caminho_rastro, target_snap.caminho_relativo)
+        if target_snap.legado:
+            if dry_run:
+                return resultado
+        else:
+            if resultado.autosave is not None and self.config["rastro"].get("ultimo_restaurado_id") != stale.base_id:
+                # O autosave mudou a base: recalcula o estado de trabalho
+                stale = self._criar_stale_checker()
+                mods, adds, rems = stale.obter_delta_modificacao()
+            with fase('plano_restauracao'):
+                alvo_arquivos = self._resolver_arquivos(target_snap.id_rastro)
+                plano = self._planejar_restauracao(alvo_arquivos, stale, mods, adds)
+            resultado.plano = plano
+            if dry_run:
+                return resultado
 
         # Segurança crítica
         if eh_diretorio_critico(self.caminho_raiz):
             logging.critical(f"Tentativa de restore em diretório crítico: {self.caminho_raiz}")
-            print("ERRO CRÍTICO: Diretório protegido. Operação abortada.")
-            return
+            raise DiretorioProtegido(f"Diretório protegido: {self.caminho_raiz}")
 
-        # Limpar diretório
-        for item in os.listdir(self.caminho_raiz):
-            if item == '.rastro': continue
-            path = os.path.join(self.caminho_raiz, item)
-            try:
-                if os.path.isdir(path):
-                    shutil.rmtree(path)
-                else:
-                    os.remove(path)
-            except Exception as e:
-                logging.error(f"Erro ao limpar {path}: {e}")
+        if target_snap.legado:
+            # Snapshot .tar.gz antigo: limpa o diretório e extrai tudo
+            for item in os.listdir(self.caminho_raiz):
+                if item == '.rastro': continue
+                path = os.path.join(self.caminho_raiz, item)
+                try:
+                    if os.path.isdir(path):
+                        shutil.rmtree(path)
+                    else:
+                        os.remove(path)
+                except Exception as e:
+                    logging.error(f"Erro ao limpar {path}: {e}")
 
-        # Extrair
-        caminho_tar = os.path.join(self.caminho_rastro, target_snap['caminho_relativo'])
-        with tarfile.open(caminho_tar, 'r:gz') as tar:
-            tar.extractall(self.caminho_raiz)
+            with fase('escrita_restauracao'):
+                EscritorRestauracao(self.caminho_raiz).extrair_tar(caminho_snap)
+            # Tudo foi reescrito: só uma nova varredura descreve o resultado
+            listagem_final = varrer_arvore(self.caminho_raiz)
+            hashes = None
+        else:
+            with fase('escrita_restauracao'):
+                listagem_final = self._aplicar_plano_restauracao(plano, alvo_arquivos, stale.obter_listagem())
+            contar('restauracao_bytes_escritos', plano.bytes_escrever)
+            hashes = {rel_path: dados['objeto'] for rel_path, dados in alvo_arquivos.items()}
             
-        self.config["rastro"]["ultimo_restaurado_id"] = target_snap['id_rastro']
+        self.config["rastro"]["ultimo_restaurado_id"] = target_snap.id_rastro
         self._salvar_config()
-        stale._salvar_state_json(base_id=target_snap['id_rastro'])
-        print("Restauração concluída com sucesso.")
+        stale.salvar_indice(target_snap.id_rastro, listagem_final, hashes)
+        resultado.executado = True
+        return resultado
+
+    def _planejar_restauracao(self, alvo_arquivos: dict, stale: StaleChecker, mods: List[str], adds: List[str]) -> PlanoRestauracao:
+        """
+        Compara o snapshot alvo com o diretório de trabalho. O conteúdo dos arquivos limpos
+        (segundo o StaleChecker) é conhecido pelo manifesto do snapshot ativo; os demais só
+        são lidos para hash quando o tamanho coincide com o do alvo.
+        """
+        listagem = stale.obter_listagem()
+        conhecidos = self._conteudo_conhecido(stale, mods, adds)
+
+        plano = PlanoRestauracao()
+        for entrada in listagem:
+            if entrada.caminho not in alvo_arquivos:
+                plano.remover.append(entrada.caminho)
+                plano.bytes_remover += entrada.size
+
+        for rel_path, dados in alvo_arquivos.items():
+            dados_atuais = listagem.get(rel_path)
+            if dados_atuais is None:
+                plano.criar.append(rel_path)
+                plano.bytes_escrever += dados['size']
+                continue
+
+            if dados_atuais.size != dados['size']:
+                identico = False
+            elif rel_path in conhecidos:
+                identico = conhecidos[rel_path] == dados['objeto']
+            else:
+                try:
+                    caminho = os.path.join(self.caminho_raiz, *rel_path.split('/'))
+                    identico = ArmazemObjetos.calcular_hash(caminho) == dados['objeto']
+                except OSError:
+                    identico = False
+
+            if identico:
+                plano.inalterados += 1
+            else:
+                plano.sobrescrever.append(rel_path)
+                plano.bytes_escrever += dados['size']
+
+        plano.criar.sort()
+        plano.sobrescrever.sort()
+        plano.remover.sort()
+        return plano
+
+    def _conteudo_conhecido(self, stale: StaleChecker, mods: List[str], adds: List[str]) -> dict:
+        """
+        Hash (caminho -> objeto) dos arquivos limpos do diretório de trabalho, tirado do
+        manifesto do snapshot ativo: estes não precisam ser lidos para comparação.
+        """
+        if stale.base_id is None:
+            return {}
+        try:
+            arquivos = self._resolver_arquivos(stale.base_id)
+        except (OSError, ValueError):
+            return {}
+        sujos = set(mods) | set(adds)
+        return {rel_path: dados['objeto'] for rel_path, dados in arquivos.items() if rel_path not in sujos}
+
+    def _exibir_plano_restauracao(self, plano: PlanoRestauracao):
+        print("[DRY-RUN] Plano de restauração:")
+        for rel_path in plano.criar:
+            print(f"  + {rel_path}")
+        for rel_path in plano.sobrescrever:
+            print(f"  ~ {rel_path}")
+        for rel_path in plano.remover:
+            print(f"  - {rel_path}")
+        print(f"Criar: {len(plano.criar)} | Sobrescrever: {len(plano.sobrescrever)} | "
+              f"Remover: {len(plano.remover)} | Inalterados: {plano.inalterados}")
+        print(f"A escrever: {plano.bytes_escrever} bytes ({formatar_tamanho(plano.bytes_escrever)}) | "
+              f"A remover: {plano.bytes_remover} bytes ({formatar_tamanho(plano.bytes_remover)})")
+
+    def _aplicar_plano_restauracao(self, plano: PlanoRestauracao, alvo_arquivos: dict,
+                                   listagem: ListagemArvore) -> ListagemArvore:
+        """
+        Remove, cria e sobrescreve só o que difere. Arquivos idênticos (e seus mtimes) ficam intactos.
+        Retorna a listagem da árvore após a restauração, derivada da listagem anterior sem nova varredura.
+        """
+        pastas_afetadas = set()
+        for rel_path in plano.remover:
+            path = os.path.join(self.caminho_raiz, *rel_path.split('/'))
+            try:
+                os.remove(path)
+            except OSError as e:
+                logging.error(f"Erro ao remover {path}: {e}")
+            pastas_afetadas.add(os.path.dirname(path))
+
+        # Pastas que ficaram vazias somem, como aconteceria numa extração limpa
+        for pasta in sorted(pastas_afetadas, key=len, reverse=True):
+            while pasta != self.caminho_raiz and pasta.startswith(self.caminho_raiz):
+                try:
+                    os.rmdir(pasta)
+                except OSError:
+                    break
+                pasta = os.path.dirname(pasta)
+
+        escritor = EscritorRestauracao(self.caminho_raiz, self.armazem)
+        escritos = escritor.extrair_objetos({rel_path: alvo_arquivos[rel_path] for rel_path in plano.criar + plano.sobrescrever})
+        return listagem.com_alteracoes(
+            atualizados=[EntradaArquivo.de_stat(rel_path, stats) for rel_path, stats in escritos.items()],
+            removidos=plano.remover
+        )
 
     def remover_snapshots(self, alvo: str, dry_run: bool = False):
-        snaps = self.config.get("snapshots", [])
-        if not snaps:
+        if not self.catalogo.quantidade():
             print("Sem snapshots para remover.")
             return
-            
-        # Ordenar crescente (mais antigo primeiro)
-        snaps_sorted = sorted(snaps, key=lambda x: x['id_rastro'])
-        to_remove = []
+        try:
+            resultado = self.remover(alvo, dry_run)
+        except ValueError:
+            print("Quantidade inválida.")
+            return
 
+        for s in resultado.ignorados:
+            print(f"Ignorando remoção do snapshot #{s.id_rastro} pois é o ativo.")
+        if dry_run:
+            print("[DRY-RUN] Seriam removidos:")
+            for s in resultado.removidos:
+                print(f"  - ID {s.id_rastro}: {s.mensagem}")
+            return
+        for s in resultado.removidos:
+            print(f"Snapshot #{s.id_rastro} removido.")
+        if resultado.bytes_liberados:
+            print(f"Espaço liberado em objetos: {formatar_tamanho(resultado.bytes_liberados)}")
+
+    def remover(self, alvo, dry_run: bool = False) -> ResultadoRemocao:
+        """
+        Remove os snapshots mais antigos: alvo é a quantidade ou 'all' (todos menos o mais
+        recente). ValueError se a quantidade for inválida.
+        """
+        total = self.catalogo.quantidade()
+        # Do mais antigo para o mais recente
         if alvo == 'all':
             # Todos exceto o último (mais recente)
-            to_remove = snaps_sorted[:-1]
+            to_remove = self.catalogo.mais_antigos(max(total - 1, 0))
         else:
-            try:
-                qtd = int(alvo)
-                to_remove = snaps_sorted[:qtd]
-            except ValueError:
-                print("Quantidade inválida.")
-                return
+            to_remove = self.catalogo.mais_antigos(max(int(alvo), 0))
         
         ativo_id = self.config["rastro"].get("ultimo_restaurado_id")
-        
-        final_remove = []
+        resultado = ResultadoRemocao()
         for s in to_remove:
-            if s['id_rastro'] == ativo_id:
-                print(f"Ignorando remoção do snapshot #{s['id_rastro']} pois é o ativo.")
+            if s.id_rastro == ativo_id:
+                resultado.ignorados.append(s)
             else:
-                final_remove.append(s)
+                resultado.removidos.append(s)
         
         if dry_run:
-            print("[DRY-RUN] Seriam removidos:")
-            for s in final_remove:
-                print(f"  - ID {s['id_rastro']}: {s['mensagem']}")
-            return
+            return resultado
 
-        commits_mantidos = [s for s in snaps if s not in final_remove]
+        final_remove = resultado.removidos
+        ids_removidos = {s.id_rastro for s in final_remove}
+        commits_mantidos = [s for s in self.catalogo if s.id_rastro not in ids_removidos]
         
+        # Antes de apagar, snapshots incrementais que dependem dos removidos viram completos
+        self._desvincular_dependentes(commits_mantidos, ids_removidos)
+        # Sai do catálogo numa transação antes de apagar os arquivos: uma falha no meio
+        # deixa no máximo manifestos órfãos, nunca registros apontando para nada
+        self.catalogo.remover(sorted(ids_removidos))
+
         for s in final_remove:
-            path_tar = os.path.join(self.caminho_rastro, s['caminho_relativo'])
+            path_snap = os.path.join(self.caminho_rastro, s.caminho_relativo)
             try:
-                if os.path.exists(path_tar):
-                    os.remove(path_tar)
-                print(f"Snapshot #{s['id_rastro']} removido.")
+                if os.path.exists(path_snap):
+                    os.remove(path_snap)
             except Exception as e:
-                logging.error(f"Erro ao deletar arquivo {path_tar}: {e}")
-                # Mantém na lista se falhar? Melhor remover do config para não ficar inconsistente
+                logging.error(f"Erro ao deletar arquivo {path_snap}: {e}")
                 
-        self.config["snapshots"] = commits_mantidos
-        self._salvar_config()
+        resultado.bytes_liberados = self._remover_objetos_orfaos(commits_mantidos)
+        resultado.executado = True
+        return resultado
+
+    def _desvincular_dependentes(self, snaps_mantidos: list, ids_removidos: set):
+        """
+        Regrava como completo todo snapshot mantido cuja cadeia incremental passa por um snapshot removido.
+        """
+        for s in snaps_mantidos:
+            if s.legado:
+                continue
+            manifesto = self._carregar_manifesto(s.id_rastro)
+            atual = manifesto.base_id
+            while atual is not None and atual not in ids_removidos:
+                atual = self._carregar_manifesto(atual).base_id
+            if atual is None:
+                continue
+
+            completo = Manifesto(id_rastro=manifesto.id_rastro, arquivos=self._resolver_arquivos(manifesto.id_rastro))
+            completo.salvar(os.path.join(self.caminho_rastro, s.caminho_relativo))
+            logging.info(f"Snapshot #{manifesto.id_rastro} convertido para completo (base removida).")
+
+    def _objetos_referenciados(self, snaps: list, ativo_id: Optional[int] = None) -> Optional[dict]:
+        """
+        Objetos e fragmentos usados pelos snapshots (dict usado como conjunto ordenado):
+        primeiro os do snapshot ativo em ordem de caminho, que é a ordem de leitura de uma
+        restauração, depois os dos demais, do mais novo ao mais antigo.
+        Retorna None se algum manifesto não puder ser lido.
+        """
+        referenciados = {}
+        ordem = sorted((s for s in snaps if not s.legado), key=lambda s: (s.id_rastro != ativo_id, -s.id_rastro))
+        for s in ordem:
+            caminho_manifesto = os.path.join(self.caminho_rastro, s.caminho_relativo)
+            try:
+                if s.id_rastro == ativo_id:
+                    arquivos = self._resolver_arquivos(s.id_rastro)
+                else:
+                    arquivos = Manifesto.carregar(caminho_manifesto).arquivos
+            except (OSError, ValueError) as e:
+                # Sem o manifesto não dá para saber o que é seguro apagar
+                logging.error(f"Manifesto ilegível {caminho_manifesto}: {e}. Limpeza de objetos cancelada.")
+                return None
+            for rel_path in sorted(arquivos):
+                dados = arquivos[rel_path]
+                if dados['objeto'] in referenciados:
+                    continue
+                referenciados[dados['objeto']] = None
+                # Objetos fragmentados mantêm os seus fragmentos
+                if dados['size'] >= LIMIAR_MINIMO:
+                    try:
+                        referenciados.update(dict.fromkeys(self.armazem.fragmentos(dados['objeto'])))
+                    except OSError:
+                        pass
+        return referenciados
+
+    def _remover_objetos_orfaos(self, snaps_mantidos: list) -> int:
+        """
+        Remove do armazém os objetos soltos que nenhum snapshot restante referencia.
+        Retorna os bytes liberados. Os que estão em pacotes saem no rastro gc.
+        """
+        referenciados = self._objetos_referenciados(snaps_mantidos)
+        if referenciados is None:
+            return 0
+
+        liberados = 0
+        for id_objeto in list(self.armazem.listar_objetos()):
+            if id_objeto not in referenciados:
+                try:
+                    liberados += self.armazem.remover(id_objeto)
+                except OSError as e:
+                    logging.error(f"Erro ao remover objeto {id_objeto}: {e}")
+        return liberados
+
+    def coletar_lixo(self, reempacotar: bool = False, dry_run: bool = False):
+        """
+        rastro gc: apaga os objetos soltos que nenhum snapshot referencia e reescreve
+        sem o lixo os pacotes que têm objetos sem referência.
+        rastro repack (reempacotar): além disso junta todos os objetos vivos, soltos ou
+        não, em pacotes grandes na ordem de leitura do snapshot ativo.
+
+        Os pacotes novos são gravados, levados ao disco e conferidos antes de qualquer
+        remoção: uma interrupção no meio deixa no máximo cópias duplicadas, que o próximo
+        gc limpa. A memória usada é proporcional ao número de objetos, não ao tamanho deles.
+        """
+        inicio = time.time()
+        maior_id = self.catalogo.maior_id()
+        ativo_id = self.config["rastro"].get("ultimo_restaurado_id")
+        referenciados = self._objetos_referenciados(list(self.catalogo), ativo_id)
+        if referenciados is None:
+            print("Coleta cancelada: há manifestos ilegíveis.")
+            return
+        snap_ativo = self._obter_snapshot_por_id(ativo_id) if ativo_id else None
+        ativos = set()
+        if snap_ativo is not None and not snap_ativo.legado:
+            ativos = set(self._objetos_referenciados([snap_ativo], ativo_id) or ())
+
+        armazem = self.armazem
+        pacotes = armazem.pacotes()
+        reescritos, mantidos = [], []
+        lixo_pacotes = 0
+        for pacote in pacotes:
+            lixo = sum(tamanho for id_objeto, _, tamanho in pacote if id_objeto not in referenciados)
+            lixo_pacotes += lixo
+            (reescritos if reempacotar or lixo else mantidos).append(pacote)
+
+        soltos = set(armazem.listar_objetos())
+        if reempacotar and len(reescritos) == 1 and not lixo_pacotes and not any(i in referenciados for i in soltos):
+            # Já está tudo num único pacote sem lixo
+            mantidos, reescritos = reescritos, []
+
+        def em_mantidos(id_objeto):
+            return any(p.localizar(id_objeto) is not None for p in mantidos)
+
+        # Objetos soltos: lixo (sem referência e anteriores ao início da coleta, para não
+        # apagar o que um rastro save rodando agora acabou de gravar) e cópias que já estão
+        # num pacote mantido
+        a_apagar = []
+        for id_objeto in soltos:
+            if id_objeto in referenciados:
+                if em_mantidos(id_objeto):
+                    a_apagar.append(id_objeto)
+                continue
+            try:
+                if os.path.getmtime(armazem.caminho_objeto(id_objeto)) < inicio:
+                    a_apagar.append(id_objeto)
+            except OSError:
+                pass
+
+        # Objetos vivos que vão para pacotes novos, na ordem de referenciados
+        a_empacotar = []
+        faltando = 0
+        for id_objeto in referenciados:
+            if em_mantidos(id_objeto):
+                continue
+            solto = id_objeto in soltos
+            if solto and not reempacotar:
+                continue
+            if solto or any(p.localizar(id_objeto) is not None for p in reescritos):
+                a_empacotar.append(id_objeto)
+            else:
+                faltando += 1
+        if faltando:
+            logging.warning(f"{faltando} objeto(s) referenciado(s) não encontrado(s) no armazém.")
+
+        sem_referencia = [i for i in a_apagar if i not in referenciados]
+        if dry_run:
+            estimativa = sum(armazem.tamanho_objeto(i) for i in sem_referencia) + lixo_pacotes
+            print("[DRY-RUN] Coleta de lixo:")
+            print(f"  Objetos soltos a apagar: {len(sem_referencia)}")
+            print(f"  Pacotes a reescrever: {len(reescritos)} de {len(pacotes)}")
+            print(f"  Objetos a empacotar: {len(a_empacotar)}")
+            print(f"  Espaço a liberar: ~{formatar_tamanho(estimativa)}")
+            return
+        if not a_apagar and not reescritos and not a_empacotar:
+            print("Nada a coletar.")
+            return
+
+        antes = self._tamanho_armazem()
+        novos = self._gravar_pacotes(a_empacotar, ativos)
+        if novos is None:
+            print("Coleta cancelada: os pacotes novos não passaram na conferência. Nada foi apagado.")
+            return
+        if self.catalogo.maior_id() != maior_id:
+            # Um snapshot novo pode usar um objeto que esta coleta considerou lixo
+            print("Um snapshot foi criado durante a coleta; nada foi apagado. Rode o comando de novo.")
+            armazem.fechar_pacotes()
+            return
+
+        # Só agora o que foi copiado sai do lugar antigo: primeiro o índice (o pacote
+        # deixa de ser lido), depois os dados
+        novos_nomes = {os.path.basename(c) for c in novos}
+        armazem.fechar_pacotes()
+        for pacote in reescritos:
+            if os.path.basename(pacote.caminho_indice) in novos_nomes:
+                continue # Reescrito com o mesmo conteúdo: é o próprio pacote novo
+            for caminho in (pacote.caminho_indice, pacote.caminho_pacote):
+                try:
+                    os.remove(caminho)
+                except OSError as e:
+                    logging.error(f"Erro ao remover {caminho}: {e}")
+        for id_objeto in a_apagar + [i for i in a_empacotar if i in soltos]:
+            try:
+                armazem.remover(id_objeto)
+            except OSError as e:
+                logging.error(f"Erro ao remover objeto {id_objeto}: {e}")
+        self._remover_temporarios_armazem(inicio)
+
+        depois = self._tamanho_armazem()
+        print(f"Objetos sem referência removidos: {len(sem_referencia)}")
+        print(f"Pacotes: {len(pacotes)} -> {len(armazem.pacotes())} ({len(a_empacotar)} objetos empacotados)")
+        print(f"Espaço liberado: {formatar_tamanho(max(antes - depois, 0))}")
+
+    def _gravar_pacotes(self, ids: List[str], ativos: set) -> Optional[List[str]]:
+        """
+        Copia os objetos para pacotes novos de até TAMANHO_MAXIMO_PACOTE bytes e confere cada um:
+        os bytes relidos do disco e, para os objetos do snapshot ativo, o SHA-256 do conteúdo.
+        Retorna os caminhos dos índices gravados, ou None (sem pacotes novos) se algo não conferir.
+        """
+        gravados = []
+        escritor = None
+        existentes = {p.caminho_indice for p in self.armazem.pacotes()}
+        try:
+            for id_objeto in ids:
+                if escritor is None:
+                    escritor = EscritorPacote(self.armazem.caminho_pacotes)
+                with self.armazem.abrir_bruto(id_objeto) as origem:
+                    escritor.adicionar(id_objeto, origem)
+                if escritor.tamanho >= TAMANHO_MAXIMO_PACOTE:
+                    gravados.append((Pacote(escritor.concluir()), escritor.resumos))
+                    escritor = None
+            if escritor is not None:
+                gravados.append((Pacote(escritor.concluir()), escritor.resumos))
+                escritor = None
+            conferidos = all(
+                not conferir_pacote(pacote, resumos)
+                and all(self._conferir_conteudo(pacote, i) for i in resumos if i in ativos)
+                for pacote, resumos in gravados)
+        except (OSError, ValueError, EOFError) as e:
+            logging.error(f"Erro ao gravar pacote: {e}")
+            conferidos = False
+
+        if escritor is not None:
+            escritor.descartar()
+        for pacote, _ in gravados:
+            pacote.fechar()
+            if not conferidos and pacote.caminho_indice not in existentes:
+                for caminho in (pacote.caminho_indice, pacote.caminho_pacote):
+                    if os.path.exists(caminho):
+                        os.remove(caminho)
+        return [p.caminho_indice for p, _ in gravados] if conferidos else None
+
+    @staticmethod
+    def _conferir_conteudo(pacote: Pacote, id_objeto: str) -> bool:
+        posicao, tamanho = pacote.localizar(id_objeto)
+        with pacote.abrir_bruto(posicao, tamanho) as origem:
+            if origem.read(len(CABECALHO_FRAGMENTOS)) == CABECALHO_FRAGMENTOS:
+                return True # Lista de fragmentos: os bytes já foram conferidos, e os fragmentos também
+        resumo = hashlib.sha256()
+        with abrir_leitura_stream(pacote.abrir_bruto(posicao, tamanho)) as origem:
+            for bloco in iter(lambda: origem.read(TAMANHO_BLOCO), b''):
+                resumo.update(bloco)
+        if resumo.hexdigest() != id_objeto:
+            logging.error(f"Objeto {id_objeto} não confere no pacote {pacote.nome}.")
+            return False
+        return True
+
+    def _tamanho_armazem(self) -> int:
+        total = 0
+        for pasta in (self.armazem.caminho_objetos, self.armazem.caminho_pacotes):
+            for raiz, _, arquivos in os.walk(pasta):
+                for nome in arquivos:
+                    try:
+                        total += os.path.getsize(os.path.join(raiz, nome))
+                    except OSError:
+                        pass
+        return total
+
+    def _remover_temporarios_armazem(self, antes_de: float):
+        """
+        Restos de gravações interrompidas: temporários de objetos e de pacotes, e pacotes sem índice.
+        """
+        candidatos = []
+        for raiz, _, arquivos in os.walk(self.armazem.caminho_objetos):
+            candidatos += [os.path.join(raiz, n) for n in arquivos if '.tmp' in n]
+        if os.path.isdir(self.armazem.caminho_pacotes):
+            nomes = set(os.listdir(self.armazem.caminho_pacotes))
+            for nome in nomes:
+                sem_indice = nome.endswith('.pack') and nome[:-len('.pack')] + '.idx' not in nomes
+                if nome.startswith('tmp-') or sem_indice:
+                    candidatos.append(os.path.join(self.armazem.caminho_pacotes, nome))
+        for caminho in candidatos:
+            try:
+                if os.path.getmtime(caminho) < antes_de:
+                    os.remove(caminho)
+            except OSError:
+                pass
+
+    def gerenciar_observador(self, acao: str):
+        """
+        rastro watch start|stop|status: daemon que acompanha as mudanças do projeto
+        para o status não precisar varrer a árvore toda.
+        """
+        if not observador_suportado():
+            print("O observador não é suportado nesta plataforma.")
+            return
+
+        ativo = consultar_observador(self.caminho_raiz, {'comando': 'ping'})
+        if acao == 'start':
+            if ativo:
+                print(f"Observador já está ativo (PID {ativo['pid']}, {ativo['modo']}).")
+                return
+            resposta = iniciar_observador(self.caminho_raiz)
+            if resposta:
+                print(f"Observador iniciado (PID {resposta['pid']}, {resposta['modo']}).")
+            else:
+                print("Erro: o observador não respondeu. Veja o log do projeto.")
+        elif acao == 'stop':
+            if not ativo:
+                print("Observador não está ativo.")
+            elif parar_observador(self.caminho_raiz):
+                print("Observador parado.")
+        elif ativo:
+            print(f"Observador ativo (PID {ativo['pid']}, {ativo['modo']}), "
+                  f"{ativo['alterados']} caminhos alterados desde o início.")
+        else:
+            print("Observador não está ativo.")
 
     def exibir_status(self):
-        print(f"Projeto: {self.config['projeto']['nome']}")
-        ativo = self.config["rastro"].get("ultimo_restaurado_id")
-        print(f"Snapshot Ativo ID: {ativo}")
-        
-        stale = StaleChecker(self.caminho_raiz)
-        mods, adds, rems = stale.obter_delta_modificacao()
+        estado = self.obter_status()
+        print(f"Projeto: {estado.projeto}")
+        print(f"Snapshot Ativo ID: {estado.ativo_id}")
         
-        if not mods and not adds and not rems:
+        if estado.limpo:
             print("\nDiretório de trabalho limpo. Nada a salvar.")
         else:
             print("\n>>> Modificações detectadas. Trabalho não salvo presente.")
-            if mods:
+            if estado.modificados:
                 print("\nArquivos Modificados:")
-                for f in mods: print(f"  - {f}")
-            if adds:
+                for f in estado.modificados: print(f"  - {f}")
+            if estado.adicionados:
                 print("\nArquivos Novos:")
-                for f in adds: print(f"  + {f}")
-            if rems:
+                for f in estado.adicionados: print(f"  + {f}")
+            if estado.removidos:
                 print("\nArquivos Deletados:")
-                for f in rems: print(f"  - {f}")
+                for f in estado.removidos: print(f"  - {f}")
+
+    def obter_status(self) -> EstadoTrabalho:
+        stale = self._criar_stale_checker()
+        mods, adds, rems = stale.obter_delta_modificacao()
+        return self._estado_trabalho(stale, mods, adds, rems)
+
+    def _estado_trabalho(self, stale: StaleChecker, mods: List[str], adds: List[str], rems: List[str]) -> EstadoTrabalho:
+        return EstadoTrabalho(
+            projeto=self.config['projeto']['nome'],
+            ativo_id=self.config["rastro"].get("ultimo_restaurado_id"),
+            modificados=mods,
+            adicionados=adds,
+            removidos=rems,
+            varredura=dict(stale.estatisticas_varredura or {})
+        )
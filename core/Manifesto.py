@@ -0,0 +1,58 @@
+import os
+import json
+from dataclasses import dataclass, field
+from typing import Optional
+
+@dataclass
+class Manifesto:
+    """
+    Lista de arquivos de um snapshot: caminho_relativo -> {objeto, size, mod_time, modo}.
+    O conteúdo fica no ArmazemObjetos; o manifesto só guarda as referências.
+
+    Um manifesto incremental tem base_id: guarda apenas os arquivos novos ou
+    modificados e a lista de removidos em relação ao snapshot base.
+    """
+    id_rastro: int
+    arquivos: dict = field(default_factory=dict)
+    base_id: Optional[int] = None
+    removidos: list = field(default_factory=list)
+    profundidade: int = 0
+
+    @property
+    def incremental(self) -> bool:
+        return self.base_id is not None
+
+    def para_json(self) -> dict:
+        dados = {
+            "id_rastro": self.id_rastro,
+            "arquivos": self.arquivos
+        }
+        if self.incremental:
+            dados["base_id"] = self.base_id
+            dados["removidos"] = self.removidos
+            dados["profundidade"] = self.profundidade
+        return dados
+
+    @staticmethod
+    def de_json(d: dict) -> 'Manifesto':
+        return Manifesto(
+            id_rastro=d["id_rastro"],
+            arquivos=d.get("arquivos", {}),
+            base_id=d.get("base_id"),
+            removidos=d.get("removidos", []),
+            profundidade=d.get("profundidade", 0)
+        )
+
+    def objetos_referenciados(self) -> set:
+        return {dados["objeto"] for dados in self.arquivos.values()}
+
+    def salvar(self, caminho: str):
+        temporario = f"{caminho}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(self.para_json(), f, separators=(',', ':'))
+        os.replace(temporario, caminho)
+
+    @staticmethod
+    def carregar(caminho: str) -> 'Manifesto':
+        with open(caminho, 'r', encoding='utf-8') as f:
+            return Manifesto.de_json(json.load(f))
@@ -0,0 +1,248 @@
+import io
+import os
+import mmap
+import struct
+import hashlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+DIRETORIO_PACOTES = 'packs'
+EXTENSAO_PACOTE = '.pack'
+EXTENSAO_INDICE = '.idx'
+TAMANHO_COPIA = 1024 * 1024
+# O rastro repack começa um pacote novo quando o atual passa deste tamanho
+TAMANHO_MAXIMO_PACOTE = 512 * 1024 * 1024
+
+# Arquivo .pack: cabeçalho seguido dos objetos, byte a byte como seriam guardados soltos
+# (comprimidos, com o codec de cada um). Arquivo .idx: cabeçalho com a quantidade de objetos
+# e as entradas (id binário, posição no .pack, tamanho) em ordem de id, para busca binária.
+# O .idx é renomeado por último: um pacote sem índice é lixo de uma gravação interrompida.
+ASSINATURA_PACOTE = b'RASTRO-PACK\x00'
+ASSINATURA_INDICE = b'RASTRO-PIDX\x00'
+VERSAO_PACOTE = 1
+CABECALHO_PACOTE = struct.Struct('<12sH')
+CABECALHO_INDICE = struct.Struct('<12sHQ')
+ENTRADA_INDICE = struct.Struct('<32sQQ')
+TAMANHO_ID = 32
+
+class PacoteInvalido(ValueError):
+    pass
+
+class Pacote:
+    """
+    Pacote somente leitura. O índice é mapeado em memória: abrir um pacote não lê
+    o índice inteiro, e cada busca toca só O(log n) entradas.
+    """
+    def __init__(self, caminho_indice: str):
+        self.caminho_indice = caminho_indice
+        self.caminho_pacote = caminho_indice[:-len(EXTENSAO_INDICE)] + EXTENSAO_PACOTE
+        with open(caminho_indice, 'rb') as f:
+            self._indice = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            assinatura, versao, self.quantidade = CABECALHO_INDICE.unpack_from(self._indice)
+            if assinatura != ASSINATURA_INDICE or versao != VERSAO_PACOTE:
+                raise PacoteInvalido(f"Índice de pacote desconhecido: {caminho_indice}")
+            if len(self._indice) != CABECALHO_INDICE.size + self.quantidade * ENTRADA_INDICE.size:
+                raise PacoteInvalido(f"Índice de pacote truncado: {caminho_indice}")
+        except (struct.error, PacoteInvalido):
+            self._indice.close()
+            raise
+
+    @property
+    def nome(self) -> str:
+        return os.path.basename(self.caminho_pacote)[:-len(EXTENSAO_PACOTE)]
+
+    def _id_na_posicao(self, posicao: int) -> bytes:
+        inicio = CABECALHO_INDICE.size + posicao * ENTRADA_INDICE.size
+        return self._indice[inicio:inicio + TAMANHO_ID]
+
+    def localizar(self, id_objeto: str) -> Optional[Tuple[int, int]]:
+        """
+        (posição, tamanho) do objeto no .pack, ou None se ele não estiver no pacote.
+        """
+        chave = bytes.fromhex(id_objeto)
+        baixo, alto = 0, self.quantidade
+        while baixo < alto:
+            meio = (baixo + alto) // 2
+            atual = self._id_na_posicao(meio)
+            if atual < chave:
+                baixo = meio + 1
+            elif atual > chave:
+                alto = meio
+            else:
+                _, posicao, tamanho = ENTRADA_INDICE.unpack_from(self._indice, CABECALHO_INDICE.size + meio * ENTRADA_INDICE.size)
+                return posicao, tamanho
+        return None
+
+    def __iter__(self) -> Iterator[Tuple[str, int, int]]:
+        """
+        (id, posição, tamanho) de cada objeto, em ordem de id.
+        """
+        for i in range(self.quantidade):
+            id_binario, posicao, tamanho = ENTRADA_INDICE.unpack_from(self._indice, CABECALHO_INDICE.size + i * ENTRADA_INDICE.size)
+            yield id_binario.hex(), posicao, tamanho
+
+    def abrir_bruto(self, posicao: int, tamanho: int) -> 'TrechoArquivo':
+        """
+        Bytes guardados do objeto (ainda comprimidos), lidos direto do .pack.
+        """
+        return TrechoArquivo(self.caminho_pacote, posicao, tamanho)
+
+    def tamanho_em_disco(self) -> int:
+        return os.path.getsize(self.caminho_pacote) + os.path.getsize(self.caminho_indice)
+
+    def fechar(self):
+        self._indice.close()
+
+class TrechoArquivo(io.RawIOBase):
+    """
+    Visão somente leitura de [inicio, inicio + tamanho) de um arquivo. Os descompressores
+    leem dele como de um objeto solto, sem passar para o objeto seguinte do pacote.
+    """
+    def __init__(self, caminho: str, inicio: int, tamanho: int):
+        self._arquivo = open(caminho, 'rb')
+        self._inicio = inicio
+        self._tamanho = tamanho
+        self._posicao = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._posicao
+
+    def seek(self, deslocamento: int, origem: int = io.SEEK_SET) -> int:
+        if origem == io.SEEK_CUR:
+            deslocamento += self._posicao
+        elif origem == io.SEEK_END:
+            deslocamento += self._tamanho
+        self._posicao = max(0, min(deslocamento, self._tamanho))
+        return self._posicao
+
+    def readinto(self, buffer) -> int:
+        restante = self._tamanho - self._posicao
+        if restante <= 0:
+            return 0
+        visao = memoryview(buffer).cast('B')[:restante]
+        self._arquivo.seek(self._inicio + self._posicao)
+        lidos = self._arquivo.readinto(visao)
+        self._posicao += lidos
+        return lidos
+
+    def close(self):
+        if not self.closed:
+            self._arquivo.close()
+        super().close()
+
+class EscritorPacote:
+    """
+    Grava um pacote novo em arquivos temporários na pasta de pacotes. Ele só fica visível
+    em concluir(), depois de ir para o disco: uma interrupção no meio deixa apenas
+    temporários, e os objetos continuam onde estavam.
+    """
+    def __init__(self, pasta: str):
+        import tempfile
+        os.makedirs(pasta, exist_ok=True)
+        self.pasta = pasta
+        descritor, self._temporario = tempfile.mkstemp(prefix='tmp-', suffix=EXTENSAO_PACOTE, dir=pasta)
+        self._saida = os.fdopen(descritor, 'wb')
+        self._saida.write(CABECALHO_PACOTE.pack(ASSINATURA_PACOTE, VERSAO_PACOTE))
+        self._entradas: List[Tuple[bytes, int, int]] = []
+        # SHA-256 dos bytes copiados de cada objeto, para conferir o pacote depois de gravado
+        self.resumos: Dict[str, bytes] = {}
+        self.tamanho = CABECALHO_PACOTE.size
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+    def adicionar(self, id_objeto: str, origem):
+        """
+        Copia para o pacote os bytes guardados do objeto, lidos de origem em blocos.
+        """
+        posicao = self.tamanho
+        resumo = hashlib.sha256()
+        while True:
+            bloco = origem.read(TAMANHO_COPIA)
+            if not bloco:
+                break
+            resumo.update(bloco)
+            self._saida.write(bloco)
+        tamanho = self._saida.tell() - posicao
+        self.tamanho += tamanho
+        self._entradas.append((bytes.fromhex(id_objeto), posicao, tamanho))
+        self.resumos[id_objeto] = resumo.digest()
+
+    def concluir(self) -> str:
+        """
+        Grava o índice e publica o pacote. Retorna o caminho do índice.
+        """
+        self._saida.flush()
+        os.fsync(self._saida.fileno())
+        self._saida.close()
+
+        self._entradas.sort()
+        nome = hashlib.sha256()
+        for entrada in self._entradas:
+            nome.update(ENTRADA_INDICE.pack(*entrada))
+        base = os.path.join(self.pasta, f"pack-{nome.hexdigest()}")
+
+        if os.path.exists(base + EXTENSAO_INDICE):
+            # Os mesmos objetos nas mesmas posições: o pacote já existe
+            os.remove(self._temporario)
+            return base + EXTENSAO_INDICE
+
+        import tempfile
+        descritor, temporario_indice = tempfile.mkstemp(prefix='tmp-', suffix=EXTENSAO_INDICE, dir=self.pasta)
+        try:
+            with os.fdopen(descritor, 'wb') as indice:
+                indice.write(CABECALHO_INDICE.pack(ASSINATURA_INDICE, VERSAO_PACOTE, len(self._entradas)))
+                for entrada in self._entradas:
+                    indice.write(ENTRADA_INDICE.pack(*entrada))
+                indice.flush()
+                os.fsync(indice.fileno())
+            os.replace(self._temporario, base + EXTENSAO_PACOTE)
+            os.replace(temporario_indice, base + EXTENSAO_INDICE)
+        finally:
+            if os.path.exists(temporario_indice):
+                os.remove(temporario_indice)
+        sincronizar_pasta(self.pasta)
+        return base + EXTENSAO_INDICE
+
+    def descartar(self):
+        self._saida.close()
+        if os.path.exists(self._temporario):
+            os.remove(self._temporario)
+
+def conferir_pacote(pacote: Pacote, resumos: Dict[str, bytes]) -> List[str]:
+    """
+    Relê do disco os bytes de cada objeto do pacote. Retorna os ids que faltam ou não conferem.
+    """
+    encontrados = set()
+    ruins = []
+    for id_objeto, posicao, tamanho in pacote:
+        encontrados.add(id_objeto)
+        resumo = hashlib.sha256()
+        with pacote.abrir_bruto(posicao, tamanho) as origem:
+            while True:
+                bloco = origem.read(TAMANHO_COPIA)
+                if not bloco:
+                    break
+                resumo.update(bloco)
+        if resumos.get(id_objeto) != resumo.digest():
+            ruins.append(id_objeto)
+    ruins.extend(i for i in resumos if i not in encontrados)
+    return ruins
+
+def sincronizar_pasta(pasta: str):
+    """
+    Leva ao disco as entradas da pasta (renomeações e remoções). Sem efeito no Windows.
+    """
+    if os.name == 'nt':
+        return
+    descritor = os.open(pasta, os.O_RDONLY)
+    try:
+        os.fsync(descritor)
+    finally:
+        os.close(descritor)
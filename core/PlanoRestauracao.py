@@ -0,0 +1,18 @@
+from dataclasses import dataclass, field
+
+@dataclass
+class PlanoRestauracao:
+    """
+    Diferença entre o diretório de trabalho e o snapshot alvo.
+    Só os arquivos em criar, sobrescrever e remover são tocados na restauração.
+    """
+    criar: list = field(default_factory=list)
+    sobrescrever: list = field(default_factory=list)
+    remover: list = field(default_factory=list)
+    inalterados: int = 0
+    bytes_escrever: int = 0
+    bytes_remover: int = 0
+
+    @property
+    def vazio(self) -> bool:
+        return not self.criar and not self.sobrescrever and not self.remover
@@ -0,0 +1,148 @@
+import os
+import time
+import logging
+from typing import Iterator, List, Optional
+from .Repositorio import Repositorio
+from .Resultados import ResultadoProjeto
+try:
+    from global_db.GerenciadorGlobal import GerenciadorGlobal
+    from util.Utilitarios import formatar_tamanho
+except ImportError:
+    from rastro_app.global_db.GerenciadorGlobal import GerenciadorGlobal
+    from rastro_app.util.Utilitarios import formatar_tamanho
+
+# Projetos atendidos ao mesmo tempo (um processo cada) em projects --status e save --all
+TRABALHADORES_PADRAO = os.cpu_count() or 1
+
+def projetos_registrados(gerenciador_global: Optional[GerenciadorGlobal] = None) -> List[ResultadoProjeto]:
+    """
+    Projetos do registro global, ainda sem resultado, em ordem de nome.
+    """
+    gerenciador_global = gerenciador_global or GerenciadorGlobal()
+    projetos = [ResultadoProjeto(id_unico, nome, caminho)
+                for id_unico, nome, caminho, _ in gerenciador_global.listar_projetos_globais()]
+    # Os processos filhos abrem as próprias conexões
+    gerenciador_global.fechar()
+    return sorted(projetos, key=lambda p: (p.nome.lower(), p.caminho))
+
+def _iniciar_trabalhador():
+    # Mensagens informativas de cada projeto iriam se misturar na saída: só avisos e erros
+    # vão para o console (o arquivo de log continua completo)
+    for handler in logging.getLogger().handlers:
+        if type(handler) is logging.StreamHandler:
+            handler.setLevel(logging.WARNING)
+
+def _status(projeto: ResultadoProjeto, verificar_conteudo: bool) -> ResultadoProjeto:
+    with Repositorio(projeto.caminho, verificar_conteudo) as repo:
+        projeto.estado = repo.status()
+    return projeto
+
+def _salvar(projeto: ResultadoProjeto, mensagem: Optional[str], completo: bool,
+            codec: Optional[str], nivel: Optional[int], verificar_conteudo: bool) -> ResultadoProjeto:
+    with Repositorio(projeto.caminho, verificar_conteudo) as repo:
+        projeto.snapshot = repo.save(mensagem, completo, codec, nivel)
+    return projeto
+
+def _executar(operacao, projeto: ResultadoProjeto, *argumentos) -> ResultadoProjeto:
+    """
+    Roda a operação num processo do pool. Erros viram resultado: um projeto com problema
+    não interrompe os demais.
+    """
+    inicio = time.perf_counter()
+    try:
+        operacao(projeto, *argumentos)
+    except Exception as e:
+        # A mensagem sai na linha do projeto; o traceback fica só no arquivo de log
+        logging.error(f"Erro no projeto {projeto.nome} ({projeto.caminho}): {e}", exc_info=True,
+                      extra={'so_arquivo': True})
+        projeto.erro = f"{type(e).__name__}: {e}"
+    projeto.segundos = time.perf_counter() - inicio
+    return projeto
+
+def executar_em_projetos(projetos: List[ResultadoProjeto], operacao, argumentos: tuple = (),
+                         trabalhadores: int = TRABALHADORES_PADRAO) -> Iterator[ResultadoProjeto]:
+    """
+    Roda operacao em cada projeto num pool de processos e entrega os resultados à medida
+    que terminam. Projetos cujo caminho não tem mais um .rastro saem primeiro, como ausentes,
+    sem ocupar o pool.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    presentes = []
+    for projeto in projetos:
+        if os.path.isdir(os.path.join(projeto.caminho, '.rastro')):
+            presentes.append(projeto)
+        else:
+            projeto.ausente = True
+            yield projeto
+    if not presentes:
+        return
+
+    with ProcessPoolExecutor(max_workers=max(1, min(trabalhadores, len(presentes))),
+                             initializer=_iniciar_trabalhador) as executor:
+        futuros = [executor.submit(_executar, operacao, projeto, *argumentos) for projeto in presentes]
+        try:
+            for futuro in as_completed(futuros):
+                yield futuro.result()
+        finally:
+            # Interrompido (Ctrl+C ou o consumidor parou de ler): não começa os que faltam
+            for futuro in futuros:
+                futuro.cancel()
+
+def status_projetos(projetos: List[ResultadoProjeto], trabalhadores: int = TRABALHADORES_PADRAO,
+                    verificar_conteudo: bool = False) -> Iterator[ResultadoProjeto]:
+    return executar_em_projetos(projetos, _status, (verificar_conteudo,), trabalhadores)
+
+def salvar_projetos(projetos: List[ResultadoProjeto], mensagem: Optional[str] = None, completo: bool = False,
+                    codec: Optional[str] = None, nivel: Optional[int] = None,
+                    trabalhadores: int = TRABALHADORES_PADRAO,
+                    verificar_conteudo: bool = False) -> Iterator[ResultadoProjeto]:
+    return executar_em_projetos(projetos, _salvar, (mensagem, completo, codec, nivel, verificar_conteudo), trabalhadores)
+
+def _situacao(projeto: ResultadoProjeto) -> str:
+    if projeto.ausente:
+        return "AUSENTE (caminho sem projeto Rastro)"
+    if projeto.erro:
+        return f"ERRO: {projeto.erro}"
+    if projeto.snapshot is not None:
+        resultado = projeto.snapshot
+        if not resultado.criado:
+            return "nada para salvar"
+        return (f"snapshot #{resultado.snapshot.id_rastro} ({resultado.tipo}), {resultado.arquivos} arquivos, "
+                f"{resultado.objetos_novos} objetos novos, {formatar_tamanho(resultado.snapshot.tamanho)}")
+    estado = projeto.estado
+    if estado.limpo:
+        return "limpo"
+    return (f"{len(estado.modificados)} modificados, {len(estado.adicionados)} novos, "
+            f"{len(estado.removidos)} removidos")
+
+def exibir_resultados(resultados: Iterator[ResultadoProjeto], total: int) -> int:
+    """
+    Imprime uma linha por projeto assim que ele termina e um resumo no fim.
+    Retorna a quantidade de projetos com erro.
+    """
+    salvos = alterados = ausentes = erros = 0
+    houve_save = houve_status = False
+    inicio = time.perf_counter()
+    for concluidos, projeto in enumerate(resultados, 1):
+        if projeto.ausente:
+            ausentes += 1
+        elif projeto.erro:
+            erros += 1
+        elif projeto.snapshot is not None:
+            houve_save = True
+            salvos += projeto.snapshot.criado
+        else:
+            houve_status = True
+            alterados += not projeto.estado.limpo
+        print(f"[{concluidos}/{total}] {projeto.nome:<20} {_situacao(projeto)}  ({projeto.caminho})", flush=True)
+
+    resumo = [f"{total} projetos em {time.perf_counter() - inicio:.1f}s"]
+    if houve_save:
+        resumo.append(f"{salvos} snapshots criados")
+    if houve_status:
+        resumo.append(f"{alterados} com alterações")
+    resumo.append(f"{ausentes} ausentes")
+    resumo.append(f"{erros} com erro")
+    print("\n" + ", ".join(resumo) + ".")
+    return erros
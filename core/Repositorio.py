@@ -0,0 +1,121 @@
+import os
+from datetime import datetime
+from typing import List, Optional
+from .GerenciadorRastro import GerenciadorRastro
+from .Snapshot import Snapshot
+from .Resultados import (EstadoTrabalho, ResultadoSnapshot, ResultadoRestauracao, ResultadoRemocao,
+                         ALTERADO_ABORTAR)
+
+class Repositorio:
+    """
+    API do Rastro para uso dentro de um processo Python, sem a linha de comando:
+
+        repo = Repositorio('/caminho/do/projeto')
+        if not repo.status().limpo:
+            repo.save("Antes do deploy")
+
+    Os métodos retornam objetos de resultado em vez de imprimir, nunca pedem confirmação
+    (restore recebe a política para alterações não salvas) e nunca mudam o diretório do
+    processo. A instância pode ser mantida aberta: o catálogo e os caches continuam quentes
+    entre chamadas, e o config.json é relido a cada operação.
+    """
+    def __init__(self, caminho: str, verificar_conteudo: bool = False):
+        # caminho pode ser uma subpasta do projeto; ProjetoNaoInicializado se não houver projeto
+        self._gerenciador = GerenciadorRastro(caminho, verificar_conteudo=verificar_conteudo)
+
+    @classmethod
+    def init(cls, caminho: str, nome: Optional[str] = None, descricao: Optional[str] = None) -> 'Repositorio':
+        """
+        Inicializa o projeto em caminho. FileExistsError se ele já for um projeto Rastro.
+        """
+        gerenciador = GerenciadorRastro(caminho, comando_atual='init')
+        if gerenciador.caminho_raiz != os.path.abspath(caminho):
+            raise FileExistsError(f"{caminho} já está dentro do projeto Rastro {gerenciador.caminho_raiz}")
+        gerenciador.criar_projeto(nome, descricao=descricao)
+        return cls(caminho)
+
+    @property
+    def caminho(self) -> str:
+        return self._gerenciador.caminho_raiz
+
+    @property
+    def nome(self) -> str:
+        return self._gerenciador.config['projeto']['nome']
+
+    def _atualizar(self) -> GerenciadorRastro:
+        # Outro processo (ou a linha de comando) pode ter salvo ou restaurado desde a última chamada
+        self._gerenciador._carregar_config()
+        return self._gerenciador
+
+    def status(self) -> EstadoTrabalho:
+        return self._atualizar().obter_status()
+
+    def save(self, mensagem: Optional[str] = None, completo: bool = False,
+             codec: Optional[str] = None, nivel: Optional[int] = None) -> ResultadoSnapshot:
+        return self._atualizar().salvar_snapshot(mensagem, completo, codec, nivel)
+
+    def list(self, limite: Optional[int] = None, desde: Optional[str] = None) -> List[Snapshot]:
+        """
+        Snapshots em ordem de ID; com limite, só os mais recentes. desde: data ISO
+        (AAAA-MM-DD[THH:MM]); ValueError se for inválida.
+        """
+        if desde:
+            desde = datetime.fromisoformat(desde).isoformat()
+        return self._atualizar().catalogo.listar(limite, desde)
+
+    def snapshot(self, alvo) -> Snapshot:
+        """
+        Snapshot por ID, 'last' ou posição a partir do mais recente (SnapshotNaoEncontrado se não houver).
+        """
+        return self._atualizar().resolver_alvo(alvo)
+
+    @property
+    def ativo_id(self) -> Optional[int]:
+        return self._atualizar().config["rastro"].get("ultimo_restaurado_id")
+
+    def restore(self, alvo, dry_run: bool = False, se_alterado=ALTERADO_ABORTAR) -> ResultadoRestauracao:
+        """
+        se_alterado: ALTERADO_ABORTAR (levanta AlteracoesNaoSalvas), ALTERADO_DESCARTAR,
+        ALTERADO_SALVAR (autosave antes) ou uma função EstadoTrabalho -> política.
+        """
+        gerenciador = self._atualizar()
+        return gerenciador.restaurar(gerenciador.resolver_alvo(alvo), dry_run, se_alterado)
+
+    def remover(self, alvo, dry_run: bool = False) -> ResultadoRemocao:
+        """
+        Remove os alvo snapshots mais antigos ('all': todos menos o mais recente). O ativo é mantido.
+        """
+        return self._atualizar().remover(alvo, dry_run)
+
+    def ls(self, alvo) -> dict:
+        """
+        Arquivos do snapshot: caminho -> entrada do manifesto (objeto, size, mod_time, modo).
+        """
+        gerenciador = self._atualizar()
+        snap = gerenciador.resolver_alvo(alvo)
+        if snap.legado:
+            raise ValueError(f"Snapshot #{snap.id_rastro} está no formato antigo (.tar.gz)")
+        return gerenciador._resolver_arquivos(snap.id_rastro)
+
+    def show(self, alvo, caminho: str) -> bytes:
+        """
+        Conteúdo de um arquivo do snapshot (caminho relativo à raiz, com '/'). KeyError se não existir.
+        """
+        gerenciador = self._atualizar()
+        snap = gerenciador.resolver_alvo(alvo)
+        dados = None if snap.legado else gerenciador._localizar_arquivo(snap.id_rastro, caminho)
+        if dados is None:
+            raise KeyError(f"Arquivo '{caminho}' não existe no snapshot #{snap.id_rastro}.")
+        with gerenciador.armazem.abrir(dados['objeto']) as origem:
+            return origem.read()
+
+    def fechar(self):
+        self._gerenciador.catalogo.fechar()
+        self._gerenciador.armazem.fechar_pacotes()
+
+    def __enter__(self) -> 'Repositorio':
+        return self
+
+    def __exit__(self, *excecao):
+        self.fechar()
+        return False
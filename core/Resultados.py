@@ -0,0 +1,81 @@
+from dataclasses import dataclass, field
+from typing import List, Optional
+from .Snapshot import Snapshot
+from .PlanoRestauracao import PlanoRestauracao
+
+# O que fazer quando uma restauração encontra alterações não salvas
+ALTERADO_ABORTAR = 'abortar'
+ALTERADO_DESCARTAR = 'descartar'
+ALTERADO_SALVAR = 'salvar'
+POLITICAS_ALTERADO = (ALTERADO_ABORTAR, ALTERADO_DESCARTAR, ALTERADO_SALVAR)
+
+@dataclass
+class EstadoTrabalho:
+    """
+    Resultado do rastro status: caminhos alterados em relação ao snapshot ativo.
+    """
+    projeto: str
+    ativo_id: Optional[int]
+    modificados: List[str] = field(default_factory=list)
+    adicionados: List[str] = field(default_factory=list)
+    removidos: List[str] = field(default_factory=list)
+    # Pastas reaproveitadas do cache e relistadas na varredura (vazio com o observador)
+    varredura: dict = field(default_factory=dict)
+
+    @property
+    def limpo(self) -> bool:
+        return not self.modificados and not self.adicionados and not self.removidos
+
+@dataclass
+class ResultadoSnapshot:
+    """
+    Resultado do rastro save. snapshot é None quando não havia nada para salvar.
+    """
+    snapshot: Optional[Snapshot] = None
+    tipo: str = ''
+    codec: str = ''
+    arquivos: int = 0
+    objetos_novos: int = 0
+    bytes_lidos: int = 0
+    bytes_comprimidos: int = 0
+    bytes_sem_compressao: int = 0
+
+    @property
+    def criado(self) -> bool:
+        return self.snapshot is not None
+
+@dataclass
+class ResultadoRestauracao:
+    """
+    Resultado do rastro restore. plano é None para snapshots .tar.gz antigos, que são
+    extraídos inteiros; com dry_run nada é escrito e executado fica False.
+    """
+    snapshot: Snapshot
+    plano: Optional[PlanoRestauracao] = None
+    executado: bool = False
+    autosave: Optional[ResultadoSnapshot] = None
+
+@dataclass
+class ResultadoRemocao:
+    """
+    Resultado do rastro remover. O snapshot ativo nunca é removido: fica em ignorados.
+    """
+    removidos: List[Snapshot] = field(default_factory=list)
+    ignorados: List[Snapshot] = field(default_factory=list)
+    bytes_liberados: int = 0
+    executado: bool = False
+
+@dataclass
+class ResultadoProjeto:
+    """
+    Resultado de uma operação num projeto do registro global (rastro projects --status,
+    rastro save --all). ausente: o caminho registrado não tem mais um projeto Rastro.
+    """
+    id_unico: str
+    nome: str
+    caminho: str
+    ausente: bool = False
+    erro: Optional[str] = None
+    estado: Optional[EstadoTrabalho] = None
+    snapshot: Optional[ResultadoSnapshot] = None
+    segundos: float = 0.0
@@ -1,13 +1,34 @@
+import re
 from dataclasses import dataclass
 from typing import Optional
 
+_TAMANHO_FORMATADO = re.compile(r'\s*([\d.]+)\s*(B|KB|MB|GB)?\s*$', re.IGNORECASE)
+_MULTIPLICADORES = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+def _tamanho_em_bytes(valor) -> int:
+    """
+    Converte o tamanho de snapshots antigos ("0.8 KB", "1.2 MB") em bytes (aproximado).
+    """
+    if isinstance(valor, int):
+        return valor
+    casamento = _TAMANHO_FORMATADO.match(str(valor))
+    if not casamento:
+        return 0
+    numero, unidade = casamento.groups()
+    return int(float(numero) * _MULTIPLICADORES[(unidade or 'B').upper()])
+
 @dataclass
 class Snapshot:
     id_rastro: int
     mensagem: str
     timestamp: str
     caminho_relativo: str
-    tamanho: str
+    tamanho: int  # bytes ocupados em disco (objetos novos + manifesto)
+
+    @property
+    def legado(self) -> bool:
+        # Snapshots criados antes do armazém de objetos são .tar.gz completos
+        return self.caminho_relativo.endswith('.tar.gz')
 
     def para_json(self) -> dict:
         return {
@@ -25,5 +46,5 @@ class Snapshot:
             mensagem=d["mensagem"],
             timestamp=d["timestamp"],
             caminho_relativo=d["caminho_relativo"],
-            tamanho=d["tamanho"]
+            tamanho=_tamanho_em_bytes(d.get("tamanho", 0))
         )
@@ -1,121 +1,153 @@
 import os
-import sqlite3
 import hashlib
 import logging
 import shutil
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
 try:
     from util.Utilitarios import eh_diretorio_critico
+    from util.Instrumentacao import contador_consultas
 except ImportError:
     from rastro_app.util.Utilitarios import eh_diretorio_critico
+    from rastro_app.util.Instrumentacao import contador_consultas
+if TYPE_CHECKING:
+    import sqlite3
+
+# Versão do esquema, guardada em PRAGMA user_version: o DDL só roda quando ela muda
+VERSAO_ESQUEMA = 1
+# Quanto um processo espera por um lock de escrita de outro antes de falhar (segundos)
+TEMPO_ESPERA_BLOQUEIO = 30.0
 
 class GerenciadorGlobal:
+    # Uma conexão por processo e por banco, aberta no primeiro uso
+    _conexoes = {}
+
     def __init__(self):
         self.home = os.path.expanduser('~')
         self.rastro_global_dir = os.path.join(self.home, '.rastro')
         self.db_path = os.path.join(self.rastro_global_dir, 'rastro_global.db')
-        self._inicializar_db()
 
-    def _inicializar_db(self):
+    @property
+    def conexao(self) -> 'sqlite3.Connection':
+        conexao = GerenciadorGlobal._conexoes.get(self.db_path)
+        if conexao is None:
+            conexao = self._abrir()
+            GerenciadorGlobal._conexoes[self.db_path] = conexao
+        return conexao
+
+    def _abrir(self) -> 'sqlite3.Connection':
+        import sqlite3
         if not os.path.exists(self.rastro_global_dir):
             os.makedirs(self.rastro_global_dir, exist_ok=True)
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Projetos (
-                id_unico TEXT PRIMARY KEY,
-                nome_projeto TEXT,
-                caminho_absoluto TEXT,
-                data_adicao TEXT
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_projetos_caminho
-            ON Projetos (caminho_absoluto)
-        ''')
-        
-        conn.commit()
-        conn.close()
+
+        # isolation_level=None: as transações são abertas explicitamente com BEGIN IMMEDIATE
+        conexao = sqlite3.connect(self.db_path, timeout=TEMPO_ESPERA_BLOQUEIO, isolation_level=None)
+        conexao.set_trace_callback(contador_consultas('consultas_db_global'))
+        try:
+            # WAL: leitores não bloqueiam o escritor, vários processos rastro convivem
+            conexao.execute('PRAGMA journal_mode=WAL')
+        except sqlite3.OperationalError as e:
+            logging.debug(f"Não foi possível ativar WAL no DB Global: {e}")
+        conexao.execute('PRAGMA synchronous=NORMAL')
+        if conexao.execute('PRAGMA user_version').fetchone()[0] < VERSAO_ESQUEMA:
+            self._migrar_esquema(conexao)
+        return conexao
+
+    @contextmanager
+    def _transacao(self):
+        """
+        Transação de escrita. BEGIN IMMEDIATE pega o lock de escrita logo no início,
+        então a espera de busy_timeout vale; com BEGIN comum, dois processos que leem
+        e depois tentam escrever recebem 'database is locked' na hora.
+        """
+        conexao = self.conexao
+        conexao.execute('BEGIN IMMEDIATE')
+        try:
+            yield conexao
+        except BaseException:
+            conexao.execute('ROLLBACK')
+            raise
+        conexao.execute('COMMIT')
+
+    def _migrar_esquema(self, conexao: 'sqlite3.Connection'):
+        conexao.execute('BEGIN IMMEDIATE')
+        try:
+            # Outro processo pode ter migrado enquanto esperávamos o lock
+            if conexao.execute('PRAGMA user_version').fetchone()[0] < VERSAO_ESQUEMA:
+                conexao.execute('''
+                    CREATE TABLE IF NOT EXISTS Projetos (
+                        id_unico TEXT PRIMARY KEY,
+                        nome_projeto TEXT,
+                        caminho_absoluto TEXT,
+                        data_adicao TEXT
+                    )
+                ''')
+                
+                conexao.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_projetos_caminho
+                    ON Projetos (caminho_absoluto)
+                ''')
+                conexao.execute(f'PRAGMA user_version = {VERSAO_ESQUEMA}')
+        except BaseException:
+            conexao.execute('ROLLBACK')
+            raise
+        conexao.execute('COMMIT')
 
     def registrar_projeto(self, nome: str, caminho: str, data_inicializacao: str) -> str:
         id_unico = hashlib.sha256(f"{nome}::{data_inicializacao}".encode()).hexdigest()[:16]
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT OR REPLACE INTO Projetos (id_unico, nome_projeto, caminho_absoluto, data_adicao)
-            VALUES (?, ?, ?, datetime('now'))
-        ''', (id_unico, nome, caminho))
-        
-        conn.commit()
-        conn.close()
+        with self._transacao() as conexao:
+            conexao.execute('''
+                INSERT OR REPLACE INTO Projetos (id_unico, nome_projeto, caminho_absoluto, data_adicao)
+                VALUES (?, ?, ?, datetime('now'))
+            ''', (id_unico, nome, caminho))
         
         return id_unico
 
     def obter_projeto_por_id(self, id_unico: str):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM Projetos WHERE id_unico = ?', (id_unico,))
-        projeto = cursor.fetchone()
-        conn.close()
-        return projeto
+        return self.conexao.execute('SELECT * FROM Projetos WHERE id_unico = ?', (id_unico,)).fetchone()
         
     def obter_projeto_por_nome(self, nome: str):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM Projetos WHERE nome_projeto = ?', (nome,))
-        projetos = cursor.fetchall()
-        conn.close()
-        return projetos
+        return self.conexao.execute('SELECT * FROM Projetos WHERE nome_projeto = ?', (nome,)).fetchall()
 
     def listar_projetos_globais(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT id_unico, nome_projeto, caminho_absoluto, data_adicao FROM Projetos')
-        projetos = cursor.fetchall()
-        conn.close()
-        return projetos
+        return self.conexao.execute('SELECT id_unico, nome_projeto, caminho_absoluto, data_adicao FROM Projetos').fetchall()
+
+    def fechar(self):
+        """
+        Fecha a conexão deste processo (reaberta no próximo uso). Chamado antes de criar
+        processos filhos: uma conexão SQLite não pode ser usada dos dois lados de um fork.
+        """
+        conexao = GerenciadorGlobal._conexoes.pop(self.db_path, None)
+        if conexao is not None:
+            conexao.close()
 
     def atualizar_caminho(self, id_unico: str, novo_caminho: str) -> bool:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
         try:
-            cursor.execute('UPDATE Projetos SET caminho_absoluto = ? WHERE id_unico = ?', (novo_caminho, id_unico))
-            conn.commit()
+            with self._transacao() as conexao:
+                conexao.execute('UPDATE Projetos SET caminho_absoluto = ? WHERE id_unico = ?', (novo_caminho, id_unico))
             return True
         except Exception as e:
             logging.error(f"Erro ao atualizar caminho no DB Global: {e}")
             return False
-        finally:
-            conn.close()
 
     def esquecer_projeto(self, identificador: str, dry_run: bool = False):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         # Tentar achar por ID primeiro
-        cursor.execute('SELECT * FROM Projetos WHERE id_unico = ?', (identificador,))
-        projeto = cursor.fetchone()
+        projeto = self.obter_projeto_por_id(identificador)
         
         if not projeto:
             # Tentando por nome
-            cursor.execute('SELECT * FROM Projetos WHERE nome_projeto = ?', (identificador,))
-            projetos = cursor.fetchall()
+            projetos = self.obter_projeto_por_nome(identificador)
             if len(projetos) > 1:
                 print(f"Múltiplos projetos encontrados com o nome '{identificador}'. Use o ID.")
                 for p in projetos:
                     print(f"ID: {p[0]} - Caminho: {p[2]}")
-                conn.close()
                 return
             elif len(projetos) == 1:
                 projeto = projetos[0]
         
         if not projeto:
             print(f"Projeto '{identificador}' não encontrado.")
-            conn.close()
             return
 
         id_unico, nome, caminho, _ = projeto
@@ -126,17 +158,14 @@ class GerenciadorGlobal:
         
         if dry_run:
             print("[DRY-RUN] O registro seria removido do DB e a pasta .rastro deletada (se segura).")
-            conn.close()
             return
 
         confirm = input("Tem certeza que deseja esquecer este projeto? (y/n): ")
         if confirm.lower() != 'y':
-            conn.close()
             return
 
-        cursor.execute('DELETE FROM Projetos WHERE id_unico = ?', (id_unico,))
-        conn.commit()
-        conn.close()
+        with self._transacao() as conexao:
+            conexao.execute('DELETE FROM Projetos WHERE id_unico = ?', (id_unico,))
         print(f"Projeto removido do banco de dados global.")
         
         caminho_rastro = os.path.join(caminho, '.rastro')
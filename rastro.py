@@ -1,5 +1,6 @@
 import sys
 import os
+import json
 import logging
 
 # Adicionar o diretório atual ao path para garantir que imports funcionem
@@ -7,19 +8,27 @@ import logging
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 try:
-    # Tenta importar como pacote (python -m rastro_app.rastro)
-    from rastro_app.util.ArgumentParser import criar_parser
-    from rastro_app.core.GerenciadorRastro import GerenciadorRastro, ProjetoNaoInicializado
-    from rastro_app.global_db.GerenciadorGlobal import GerenciadorGlobal
-except ImportError:
-    # Fallback para execução direta (python rastro.py) ou se rastro_app não estiver no path
-    try:
+    if __package__:
+        # Executado como pacote (python -m rastro_app.rastro)
+        from rastro_app.util.ArgumentParser import criar_parser
+        from rastro_app.core.GerenciadorRastro import GerenciadorRastro, ProjetoNaoInicializado
+        from rastro_app.global_db.GerenciadorGlobal import GerenciadorGlobal
+        from rastro_app.util import Instrumentacao
+        from rastro_app.core import ProjetosGlobais
+    else:
+        # Execução direta (python rastro.py): importa direto, sem uma busca por rastro_app
+        # que falharia a cada chamada
         from util.ArgumentParser import criar_parser
         from core.GerenciadorRastro import GerenciadorRastro, ProjetoNaoInicializado
         from global_db.GerenciadorGlobal import GerenciadorGlobal
-    except ImportError as e:
-        print(f"Erro crítico de importação: {e}")
-        sys.exit(1)
+        from util import Instrumentacao
+        from core import ProjetosGlobais
+except ImportError as e:
+    print(f"Erro crítico de importação: {e}")
+    sys.exit(1)
+
+# Comandos que só leem o projeto: não conferem nem atualizam o registro global
+COMANDOS_SOMENTE_LEITURA = {'list', 'status', 'show', 'cat', 'ls', 'diff', 'log', 'grep', 'watch'}
 
 def setup_logging(caminho_projeto=None):
     log_format = '%(asctime)s - %(levelname)s - %(message)s'
@@ -31,6 +40,8 @@ def setup_logging(caminho_projeto=None):
     # Handler Console
     ch = logging.StreamHandler()
     ch.setLevel(logging.INFO)
+    # Registros marcados com extra={'so_arquivo': True} vão só para o rastro.log
+    ch.addFilter(lambda registro: not getattr(registro, 'so_arquivo', False))
     logger.addHandler(ch)
     
     # Handler Arquivo (se estiver num projeto)
@@ -55,8 +66,77 @@ def setup_logging(caminho_projeto=None):
 def main():
     parser = criar_parser()
     args = parser.parse_args()
+    # Destino dos diagnósticos: '-' é a saída de erro
+    destino_estatisticas = args.stats_json_file or ('-' if args.stats_json else None)
+    destino_perfil = args.profile_file or ('-' if args.profile else None)
+
+    # Desligada, a instrumentação custa só chamadas vazias; o cProfile nem é importado
+    if destino_estatisticas is not None:
+        Instrumentacao.ativar()
+    perfil = None
+    if destino_perfil is not None:
+        import cProfile
+        perfil = cProfile.Profile()
+        perfil.enable()
+    try:
+        with Instrumentacao.fase('comando'):
+            executar(args)
+    except BrokenPipeError:
+        # Quem lia a saída fechou o pipe (rastro grep ... | head): encerra sem traceback.
+        # O stdout passa a apontar para /dev/null para o flush final do interpretador não falhar de novo
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    finally:
+        if perfil is not None:
+            perfil.disable()
+            exibir_perfil(perfil, destino_perfil)
+        if destino_estatisticas is not None:
+            gravar_estatisticas(args.comando, destino_estatisticas)
+
+def exibir_perfil(perfil, destino: str):
+    if destino == '-':
+        import pstats
+        pstats.Stats(perfil, stream=sys.stderr).sort_stats('cumulative').print_stats(30)
+    else:
+        perfil.dump_stats(destino)
+        print(f"Perfil gravado em {destino} (python -m pstats {destino}).", file=sys.stderr)
+
+def gravar_estatisticas(comando: str, destino: str):
+    relatorio = {'comando': comando, **Instrumentacao.relatorio()}
+    logging.info(f"Estatísticas: {json.dumps(relatorio, ensure_ascii=False)}", extra={'so_arquivo': True})
+    texto = json.dumps(relatorio, ensure_ascii=False, indent=2)
+    if destino == '-':
+        print(texto, file=sys.stderr)
+    else:
+        with open(destino, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
+
+def executar_em_todos(args):
+    """
+    rastro projects --status e rastro save --all: um processo por projeto do registro global,
+    com o resultado de cada um impresso assim que ele termina.
+    """
+    setup_logging()
+    projetos = ProjetosGlobais.projetos_registrados()
+    if not projetos:
+        print("Nenhum projeto no registro global.")
+        return
+    trabalhadores = args.jobs or ProjetosGlobais.TRABALHADORES_PADRAO
+    if args.comando == 'save':
+        resultados = ProjetosGlobais.salvar_projetos(projetos, args.message, args.full, args.codec, args.level,
+                                                     trabalhadores, args.verify)
+    else:
+        resultados = ProjetosGlobais.status_projetos(projetos, trabalhadores)
+    print(f"{len(projetos)} projetos, {min(trabalhadores, len(projetos))} em paralelo.")
+    if ProjetosGlobais.exibir_resultados(resultados, len(projetos)):
+        sys.exit(1)
 
+def executar(args):
     # Comandos que não exigem estar num projeto
+    if args.comando == 'projects' and args.status or args.comando == 'save' and args.all:
+        executar_em_todos(args)
+        return
+
     if args.comando == 'projects':
         gg = GerenciadorGlobal()
         projs = gg.listar_projetos_globais()
@@ -82,17 +162,19 @@ def main():
         
         gerenciador = GerenciadorRastro(
             caminho_inicial=caminho_inicial if args.comando == 'init' else None,
-            comando_atual=args.comando
+            comando_atual=args.comando,
+            verificar_conteudo=getattr(args, 'verify', False),
+            verificar_registro=args.comando not in COMANDOS_SOMENTE_LEITURA
         )
 
         if args.comando == 'init':
             gerenciador.inicializar(args.name, args.message)
         
         elif args.comando == 'save':
-            gerenciador.criar_snapshot(args.message)
+            gerenciador.criar_snapshot(args.message, args.full, args.codec, args.level)
             
         elif args.comando == 'list':
-            gerenciador.listar_snapshots()
+            gerenciador.listar_snapshots(args.limit, args.since)
             
         elif args.comando == 'status':
             gerenciador.exibir_status()
@@ -103,6 +185,32 @@ def main():
         elif args.comando == 'remover':
             gerenciador.remover_snapshots(args.alvo, args.dry_run)
 
+        elif args.comando in ('gc', 'repack'):
+            gerenciador.coletar_lixo(args.comando == 'repack', args.dry_run)
+
+        elif args.comando in ('show', 'cat'):
+            gerenciador.exibir_arquivo(args.alvo, args.caminho)
+
+        elif args.comando == 'ls':
+            gerenciador.listar_arquivos(args.alvo, args.long)
+
+        elif args.comando == 'diff':
+            gerenciador.comparar_snapshots(args.alvo, args.alvo_novo, args.patch)
+
+        elif args.comando == 'log':
+            if args.rebuild:
+                gerenciador.reconstruir_historico()
+            if args.caminho:
+                gerenciador.exibir_historico(args.caminho)
+            elif not args.rebuild:
+                print("Informe o caminho do arquivo ou --rebuild.")
+
+        elif args.comando == 'grep':
+            gerenciador.buscar_conteudo(args.padrao, args.ids, args.path_glob, args.ignore_case)
+
+        elif args.comando == 'watch':
+            gerenciador.gerenciar_observador(args.acao)
+
     except ProjetoNaoInicializado:
         print("Este diretório não parece ser um projeto Rastro.")
         # Se não for init, perguntar se quer criar?
@@ -120,6 +228,9 @@ def main():
         else:
             print("Operação abortada.")
             
+    except BrokenPipeError:
+        # Tratado em main: não é um erro do comando, e imprimir o aviso falharia de novo
+        raise
     except Exception as e:
         logging.critical(f"Erro inesperado: {e}", exc_info=True)
         print(f"Erro: {e}")
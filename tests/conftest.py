@@ -0,0 +1,98 @@
+import os
+import sys
+import json
+import subprocess
+from typing import Optional
+
+import pytest
+
+RAIZ_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RASTRO = os.path.join(RAIZ_REPO, 'rastro.py')
+
+# Os testes importam os módulos como o rastro.py: a partir da raiz do repositório
+if RAIZ_REPO not in sys.path:
+    sys.path.insert(0, RAIZ_REPO)
+
+class ProjetoTeste:
+    """
+    Projeto numa pasta temporária, com comandos rodando o rastro.py num processo filho
+    (como na linha de comando) e HOME isolado, para não tocar no registro global real.
+    """
+    def __init__(self, caminho: str, ambiente: dict):
+        self.caminho = caminho
+        self.caminho_rastro = os.path.join(caminho, '.rastro')
+        self.ambiente = ambiente
+
+    def rastro(self, *argumentos, entrada: Optional[str] = None, verificar: bool = True) -> subprocess.CompletedProcess:
+        processo = subprocess.run([sys.executable, RASTRO] + list(argumentos), cwd=self.caminho,
+                                  env=self.ambiente, input=entrada, capture_output=True, text=True)
+        if verificar and processo.returncode != 0:
+            raise AssertionError(f"rastro {' '.join(argumentos)} falhou ({processo.returncode}):\n"
+                                 f"{processo.stdout}{processo.stderr}")
+        return processo
+
+    def restaurar(self, alvo) -> subprocess.CompletedProcess:
+        # Confirma a perda de alterações não salvas, se o restore perguntar
+        return self.rastro('restore', str(alvo), entrada='y\n')
+
+    def ids_snapshots(self) -> list:
+        from core.CatalogoSnapshots import CatalogoSnapshots
+        catalogo = CatalogoSnapshots(self.caminho_rastro)
+        try:
+            return sorted(s.id_rastro for s in catalogo)
+        finally:
+            catalogo.fechar()
+
+    def configurar(self, secao: str, valores: dict):
+        caminho_config = os.path.join(self.caminho_rastro, 'config.json')
+        with open(caminho_config, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        config.setdefault(secao, {}).update(valores)
+        with open(caminho_config, 'w', encoding='utf-8') as f:
+            json.dump(config, f, indent=4)
+
+    def escrever(self, arquivos: dict):
+        """
+        Grava {caminho relativo: conteúdo (str ou bytes)}; None remove o arquivo.
+        """
+        for relativo, conteudo in arquivos.items():
+            caminho = os.path.join(self.caminho, *relativo.split('/'))
+            if conteudo is None:
+                os.remove(caminho)
+                continue
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            modo = 'wb' if isinstance(conteudo, bytes) else 'w'
+            with open(caminho, modo) as f:
+                f.write(conteudo)
+
+    def arvore(self) -> dict:
+        """
+        {caminho relativo: bytes} de tudo fora do .rastro.
+        """
+        arquivos = {}
+        for pasta, subpastas, nomes in os.walk(self.caminho):
+            subpastas[:] = [s for s in subpastas if s != '.rastro']
+            for nome in nomes:
+                caminho = os.path.join(pasta, nome)
+                with open(caminho, 'rb') as f:
+                    arquivos[os.path.relpath(caminho, self.caminho).replace(os.sep, '/')] = f.read()
+        return arquivos
+
+@pytest.fixture
+def casa(tmp_path, monkeypatch) -> str:
+    casa = tmp_path / 'home'
+    casa.mkdir()
+    monkeypatch.setenv('HOME', str(casa))
+    monkeypatch.setenv('USERPROFILE', str(casa))
+    return str(casa)
+
+@pytest.fixture
+def projeto(tmp_path, casa) -> ProjetoTeste:
+    """
+    Projeto inicializado e ainda sem snapshots.
+    """
+    caminho = tmp_path / 'projeto'
+    caminho.mkdir()
+    projeto = ProjetoTeste(str(caminho), dict(os.environ))
+    projeto.rastro('init', '--name', 'teste')
+    return projeto
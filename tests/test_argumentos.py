@@ -0,0 +1,49 @@
+import os
+import json
+
+import pytest
+
+from util.ArgumentParser import criar_parser
+
+@pytest.mark.parametrize('argumentos, atributo, valor', [
+    (['log', '--stats-json', 'src/a.txt'], 'caminho', 'src/a.txt'),
+    (['log', 'src/a.txt', '--stats-json'], 'caminho', 'src/a.txt'),
+    (['grep', '--stats-json', 'TODO'], 'padrao', 'TODO'),
+    (['restore', '--stats-json', '3'], 'alvo', '3'),
+    (['show', '--profile', '2', 'a.txt'], 'caminho', 'a.txt'),
+])
+def test_diagnostico_nao_consome_o_posicional(argumentos, atributo, valor):
+    args = criar_parser().parse_args(argumentos)
+    assert getattr(args, atributo) == valor
+    assert args.stats_json or args.profile
+    assert args.stats_json_file is None and args.profile_file is None
+
+def test_arquivo_de_saida_so_pelas_opcoes_file():
+    args = criar_parser().parse_args(['log', '--stats-json-file', 'saida.json', 'src/a.txt'])
+    assert args.caminho == 'src/a.txt'
+    assert args.stats_json_file == 'saida.json'
+    assert not args.stats_json
+
+    args = criar_parser().parse_args(['status', '--profile-file', 'perfil.out'])
+    assert args.profile_file == 'perfil.out'
+
+def test_stats_json_file_exige_arquivo():
+    args = criar_parser().parse_args(['status', '--stats-json'])
+    assert args.stats_json and args.stats_json_file is None
+    with pytest.raises(SystemExit):
+        criar_parser().parse_args(['status', '--stats-json-file'])
+
+def test_stats_json_na_linha_de_comando(projeto):
+    projeto.escrever({'a.txt': 'a\n'})
+    projeto.rastro('save', '-m', 'um')
+
+    processo = projeto.rastro('log', '--stats-json', 'a.txt')
+    assert 'um' in processo.stdout
+    assert json.loads(processo.stderr[processo.stderr.index('{'):])['comando'] == 'log'
+    # O arquivo do projeto não foi tomado como destino do JSON
+    assert projeto.arvore() == {'a.txt': b'a\n'}
+
+    destino = os.path.join(projeto.caminho, '..', 'estatisticas.json')
+    projeto.rastro('status', '--stats-json-file', destino)
+    with open(destino, encoding='utf-8') as f:
+        assert json.load(f)['comando'] == 'status'
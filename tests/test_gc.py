@@ -0,0 +1,87 @@
+import os
+import random
+import hashlib
+import time
+
+import pytest
+
+from core.ArmazemObjetos import ArmazemObjetos
+
+def _envelhecer(caminho: str):
+    # O gc só apaga soltos e temporários anteriores ao seu início
+    passado = time.time() - 3600
+    os.utime(caminho, (passado, passado))
+
+@pytest.fixture
+def historico(projeto):
+    """
+    Três snapshots incrementais (um com arquivo fragmentado); devolve a árvore de cada um.
+    """
+    projeto.configurar('fragmentacao', {'limiar': 1024 * 1024, 'tamanho_medio': 4096})
+    gerador = random.Random(7)
+    grande = bytearray(gerador.randbytes(2 * 1024 * 1024))
+    projeto.escrever({f'f{i}.txt': f'arquivo {i}\n' for i in range(20)})
+    projeto.escrever({'grande.bin': bytes(grande), 'sub/num.txt': '\n'.join(map(str, range(5000)))})
+    projeto.rastro('save', '-m', 'um')
+    arvores = [projeto.arvore()]
+
+    grande[500_000:500_010] = b'0123456789'
+    projeto.escrever({'grande.bin': bytes(grande), 'f1.txt': 'mudou\n', 'novo.txt': 'novo\n'})
+    projeto.rastro('save', '-m', 'dois')
+    arvores.append(projeto.arvore())
+
+    projeto.escrever({'f2.txt': None, 'sub/num.txt': 'trocado\n'})
+    projeto.rastro('save', '-m', 'tres')
+    arvores.append(projeto.arvore())
+    return arvores
+
+def _conferir_todos(projeto, arvores, ids=None):
+    for id_rastro in ids or range(1, len(arvores) + 1):
+        projeto.restaurar(id_rastro)
+        assert projeto.arvore() == arvores[id_rastro - 1], f"snapshot {id_rastro}"
+
+def test_gc_mantem_objetos_alcancaveis(projeto, historico, tmp_path):
+    armazem = ArmazemObjetos(projeto.caminho_rastro)
+    orfao_origem = tmp_path / 'orfao.txt'
+    orfao_origem.write_text('ninguém referencia\n')
+    orfao = armazem.armazenar_arquivo(str(orfao_origem), 'gzip', 6)[0]
+    _envelhecer(armazem.caminho_objeto(orfao))
+    temporario = armazem.caminho_objeto(orfao) + f'.tmp{os.getpid()}-1'
+    with open(temporario, 'wb') as f:
+        f.write(b'gravacao interrompida')
+    _envelhecer(temporario)
+    antes = set(armazem.listar_objetos())
+
+    projeto.rastro('gc')
+
+    depois = set(armazem.listar_objetos())
+    assert depois == antes - {orfao}
+    assert not os.path.exists(temporario)
+    _conferir_todos(projeto, historico)
+
+def test_repack_mantem_objetos_alcancaveis(projeto, historico):
+    armazem = ArmazemObjetos(projeto.caminho_rastro)
+    projeto.rastro('repack')
+
+    assert list(armazem.listar_objetos()) == []
+    assert len(armazem.pacotes()) == 1
+    armazem.fechar_pacotes()
+    _conferir_todos(projeto, historico)
+
+    # Um segundo repack não tem o que fazer e não perde nada
+    projeto.rastro('repack')
+    _conferir_todos(projeto, historico)
+
+def test_gc_depois_de_remover_snapshot(projeto, historico):
+    projeto.rastro('repack')
+    projeto.restaurar(3)
+    projeto.rastro('remover', '1')
+    projeto.rastro('gc')
+    assert projeto.ids_snapshots() == [2, 3]
+
+    armazem = ArmazemObjetos(projeto.caminho_rastro)
+    # f1.txt original só existia no snapshot removido; f2.txt ainda está no 2
+    assert not armazem.existe(hashlib.sha256(historico[0]['f1.txt']).hexdigest())
+    assert armazem.existe(hashlib.sha256(historico[1]['f2.txt']).hexdigest())
+    armazem.fechar_pacotes()
+    _conferir_todos(projeto, historico, ids=[2, 3])
@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+from util.RegrasIgnorar import RegrasIgnorar, carregar_regras
+
+def _regras(tmp_path, gitignores: dict) -> RegrasIgnorar:
+    """
+    {pasta relativa ('' para a raiz): conteúdo do .gitignore}
+    """
+    for pasta, conteudo in gitignores.items():
+        destino = tmp_path.joinpath(*pasta.split('/')) if pasta else tmp_path
+        destino.mkdir(parents=True, exist_ok=True)
+        (destino / '.gitignore').write_text(conteudo)
+    return carregar_regras(str(tmp_path))
+
+@pytest.mark.parametrize('caminho, eh_dir, esperado', [
+    ('app.log', False, True),
+    ('sub/app.log', False, True),
+    ('importante.log', False, False),
+    ('sub/importante.log', False, False),
+    # A última regra que casa vence, mesmo vindo de outro grupo (extensão x nome x geral)
+    ('debug.log', False, True),
+    ('build', True, True),
+    ('build', False, False),
+    ('sub/build/saida.o', False, True),
+    ('config.local', False, True),
+    ('sub/config.local', False, False),
+    ('docs/a/b/rascunho.tmp', False, True),
+    ('docs/rascunho.tmp', False, True),
+    ('rascunho.tmp', False, False),
+    ('cache', True, True),
+    ('cache/manter.txt', False, True),
+    ('x.pyc', False, True),
+    ('.rastro', True, True),
+])
+def test_negacao_e_ancoragem(tmp_path, caminho, eh_dir, esperado):
+    regras = _regras(tmp_path, {'': '\n'.join([
+        '# comentário',
+        '*.log',
+        '!importante.log',
+        '!debug.log',
+        'debug.*',
+        'build/',
+        '/config.local',
+        'docs/**/*.tmp',
+        'cache/',
+        # Não reinclui: a pasta cache inteira já foi excluída
+        '!cache/manter.txt',
+    ])})
+    assert regras.ignorar(caminho, eh_dir) is esperado
+
+@pytest.mark.parametrize('caminho, esperado', [
+    ('a.log', True),
+    ('outra/a.log', True),
+    # sub/.gitignore reinclui os .log só abaixo de sub
+    ('sub/a.log', False),
+    ('sub/fundo/a.log', False),
+    ('segredo.txt', False),
+    ('sub/segredo.txt', True),
+    ('sub/fundo/segredo.txt', True),
+    # Ancorado em sub/.gitignore: só sub/local.txt
+    ('sub/local.txt', True),
+    ('sub/fundo/local.txt', False),
+    # O .gitignore mais fundo vence o de sub
+    ('sub/fundo/b.log', True),
+    ('sub/fundo/c.log', False),
+])
+def test_gitignore_aninhado(tmp_path, caminho, esperado):
+    regras = _regras(tmp_path, {
+        '': '*.log\n',
+        'sub': '!*.log\nsegredo.txt\n/local.txt\n',
+        'sub/fundo': 'b.log\n',
+    })
+    assert regras.ignorar(caminho, False) is esperado
+
+def test_pasta_ignorada_em_gitignore_aninhado(tmp_path):
+    regras = _regras(tmp_path, {'sub': 'gerado/\n'})
+    assert regras.ignorar('sub/gerado', True)
+    assert regras.ignorar('sub/gerado/x.txt', False)
+    assert not regras.ignorar('gerado/x.txt', False)
+
+def test_deve_ignorar_caminho_absoluto(tmp_path):
+    regras = _regras(tmp_path, {'': '*.log\n!manter.log\n'})
+    (tmp_path / 'pasta').mkdir()
+    assert regras.deve_ignorar(os.path.join(str(tmp_path), 'pasta', 'x.log'), str(tmp_path))
+    assert not regras.deve_ignorar(os.path.join(str(tmp_path), 'pasta', 'manter.log'), str(tmp_path))
+    assert not regras.deve_ignorar(os.path.join(str(tmp_path), 'pasta'), str(tmp_path))
+
+def test_muitas_regras_por_grupo():
+    # Regras suficientes para cada grupo (literais, extensão, gerais) ter várias alternativas
+    regras = RegrasIgnorar([f'arquivo{i}.txt' for i in range(300)]
+                           + [f'*.ext{i}' for i in range(300)]
+                           + [f'pre{i}*' for i in range(300)]
+                           + ['!arquivo150.txt', '!*.ext7', '!pre42*'])
+    assert regras.ignorar('arquivo149.txt', False)
+    assert not regras.ignorar('arquivo150.txt', False)
+    assert regras.ignorar('a/b.ext299', False)
+    assert not regras.ignorar('a/b.ext7', False)
+    assert regras.ignorar('pre41x', False)
+    assert not regras.ignorar('pre42x', False)
+    assert not regras.ignorar('outro.txt', False)
@@ -0,0 +1,61 @@
+import os
+
+from core.CatalogoSnapshots import CatalogoSnapshots
+from core.Manifesto import Manifesto
+
+def _bases(projeto) -> dict:
+    """
+    id do snapshot -> id da base incremental (None para completo).
+    """
+    catalogo = CatalogoSnapshots(projeto.caminho_rastro)
+    try:
+        return {s.id_rastro: Manifesto.carregar(os.path.join(projeto.caminho_rastro, s.caminho_relativo)).base_id
+                for s in catalogo}
+    finally:
+        catalogo.fechar()
+
+def test_remover_snapshot_do_meio_da_cadeia(projeto):
+    projeto.escrever({'fixo.txt': 'fixo\n', 'muda.txt': 'v1\n', 'some.txt': 'vai sumir\n'})
+    projeto.rastro('save', '-m', 'um')
+    # Só o snapshot 2 adiciona novo.txt e altera muda.txt: o 3 depende disso pela cadeia
+    projeto.escrever({'muda.txt': 'v2\n', 'novo.txt': 'novo\n'})
+    projeto.rastro('save', '-m', 'dois')
+    projeto.escrever({'some.txt': None})
+    projeto.rastro('save', '-m', 'tres')
+    projeto.escrever({'fixo.txt': 'fixo alterado\n'})
+    projeto.rastro('save', '-m', 'quatro')
+    arvores = {}
+    for id_rastro in (1, 3, 4):
+        projeto.restaurar(id_rastro)
+        arvores[id_rastro] = projeto.arvore()
+    assert _bases(projeto) == {1: None, 2: 1, 3: 2, 4: 3}
+
+    # Com o 1 ativo, remover os dois mais antigos só tira o 2
+    projeto.restaurar(1)
+    saida = projeto.rastro('remover', '2').stdout
+    assert 'Snapshot #2 removido.' in saida
+    assert projeto.ids_snapshots() == [1, 3, 4]
+
+    bases = _bases(projeto)
+    assert 2 not in bases.values()
+    assert bases[4] == 3
+    for id_rastro, esperado in arvores.items():
+        projeto.restaurar(id_rastro)
+        assert projeto.arvore() == esperado, f"snapshot {id_rastro}"
+
+    # O gc depois da remoção não pode levar nada que a cadeia refeita ainda usa
+    projeto.rastro('gc')
+    for id_rastro, esperado in arvores.items():
+        projeto.restaurar(id_rastro)
+        assert projeto.arvore() == esperado, f"snapshot {id_rastro} depois do gc"
+
+def test_remover_ignora_snapshot_ativo(projeto):
+    projeto.escrever({'a.txt': 'a\n'})
+    projeto.rastro('save', '-m', 'um')
+    projeto.escrever({'a.txt': 'b\n'})
+    projeto.rastro('save', '-m', 'dois')
+    projeto.restaurar(1)
+
+    saida = projeto.rastro('remover', '1').stdout
+    assert 'Ignorando remoção do snapshot #1' in saida
+    assert projeto.ids_snapshots() == [1, 2]
@@ -0,0 +1,90 @@
+import os
+import random
+
+import pytest
+
+from core.ArmazemObjetos import ArmazemObjetos
+from util.Compressao import CODECS
+
+def _binario(tamanho: int, semente: int) -> bytes:
+    return random.Random(semente).randbytes(tamanho)
+
+ESTADO_INICIAL = {
+    'leiame.txt': 'primeira versão\n' * 50,
+    'src/principal.py': 'print("olá")\n',
+    'src/util/vazio.txt': '',
+    'dados.bin': _binario(200 * 1024, 1),
+}
+
+ALTERACOES = {
+    'leiame.txt': 'segunda versão\n' * 50,
+    'src/principal.py': None,
+    'src/novo.py': 'x = 1\n',
+    'dados.bin': _binario(200 * 1024, 2),
+}
+
+@pytest.mark.parametrize('codec', CODECS)
+def test_restaura_cada_snapshot_com_o_codec(projeto, codec):
+    projeto.escrever(ESTADO_INICIAL)
+    projeto.rastro('save', '-m', 'um', '--codec', codec)
+    primeiro = projeto.arvore()
+
+    projeto.escrever(ALTERACOES)
+    projeto.rastro('save', '-m', 'dois', '--codec', codec)
+    segundo = projeto.arvore()
+
+    projeto.restaurar(1)
+    assert projeto.arvore() == primeiro
+    projeto.restaurar(2)
+    assert projeto.arvore() == segundo
+
+def test_historico_com_codecs_misturados(projeto):
+    esperados = []
+    for i, codec in enumerate(CODECS):
+        projeto.escrever({'comum.txt': f'versão {i}\n' * 100, f'so_{codec}.txt': codec * 1000})
+        projeto.rastro('save', '-m', codec, '--codec', codec)
+        esperados.append(projeto.arvore())
+
+    for id_rastro, esperado in enumerate(esperados, start=1):
+        projeto.restaurar(id_rastro)
+        assert projeto.arvore() == esperado
+
+def test_arquivo_fragmentado(projeto):
+    # Limiar e tamanho médio mínimos: um arquivo de 3 MiB vira centenas de fragmentos
+    projeto.configurar('fragmentacao', {'limiar': 1024 * 1024, 'tamanho_medio': 4096})
+    grande = bytearray(_binario(3 * 1024 * 1024, 3))
+    projeto.escrever({'grande.bin': bytes(grande), 'pequeno.txt': 'pequeno\n'})
+    projeto.rastro('save', '-m', 'um')
+    primeiro = projeto.arvore()
+
+    armazem = ArmazemObjetos(projeto.caminho_rastro)
+    fragmentados = [i for i in armazem.listar_objetos() if armazem.fragmentos(i)]
+    assert len(fragmentados) == 1
+    fragmentos_antes = set(armazem.fragmentos(fragmentados[0]))
+    assert len(fragmentos_antes) > 1
+
+    # Uma alteração no meio do arquivo só produz fragmentos novos em volta dela
+    grande[1024 * 1024:1024 * 1024 + 100] = b'X' * 100
+    projeto.escrever({'grande.bin': bytes(grande)})
+    projeto.rastro('save', '-m', 'dois')
+    segundo = projeto.arvore()
+
+    novo, = [i for i in armazem.listar_objetos() if armazem.fragmentos(i) and i != fragmentados[0]]
+    fragmentos_depois = set(armazem.fragmentos(novo))
+    assert len(fragmentos_depois - fragmentos_antes) < len(fragmentos_depois) // 10
+
+    projeto.restaurar(1)
+    assert projeto.arvore() == primeiro
+    projeto.restaurar(2)
+    assert projeto.arvore() == segundo
+    with armazem.abrir(fragmentados[0]) as f:
+        assert f.read() == primeiro['grande.bin']
+
+def test_restaurar_apaga_arquivos_novos(projeto):
+    projeto.escrever({'a.txt': 'a\n'})
+    projeto.rastro('save', '-m', 'um')
+    projeto.escrever({'b/c.txt': 'c\n'})
+
+    projeto.restaurar(1)
+    assert projeto.arvore() == {'a.txt': b'a\n'}
+    assert not os.path.exists(os.path.join(projeto.caminho, 'b', 'c.txt'))
@@ -0,0 +1,67 @@
+import os
+import time
+
+import pytest
+
+from util.StaleChecker import StaleChecker, JANELA_RACY_NS, CAMINHO_RASTRO, ARQUIVO_INDICE
+
+def _definir_mtime(caminho: str, mtime_ns: int):
+    os.utime(caminho, ns=(mtime_ns, mtime_ns))
+
+@pytest.fixture
+def racy(projeto):
+    """
+    a.txt gravado no mesmo "tique" do index.bin, como num file system de mtime em segundos:
+    o stat guardado no índice não distingue uma escrita feita logo depois do save.
+    """
+    tique = (time.time_ns() // 1_000_000_000) * 1_000_000_000
+    projeto.escrever({'a.txt': 'conteúdo A\n', 'b.txt': 'conteúdo B\n'})
+    caminho = os.path.join(projeto.caminho, 'a.txt')
+    _definir_mtime(caminho, tique)
+    projeto.rastro('save', '-m', 'um')
+    _definir_mtime(os.path.join(projeto.caminho, CAMINHO_RASTRO, ARQUIVO_INDICE), tique)
+    return caminho, tique
+
+def test_racy_clean_com_conteudo_alterado(projeto, racy):
+    caminho, tique = racy
+    antes = os.stat(caminho)
+    # Mesmo tamanho e mesmo mtime: só o conteúdo denuncia a mudança
+    with open(caminho, 'w') as f:
+        f.write('conteúdo Z\n')
+    _definir_mtime(caminho, tique)
+    depois = os.stat(caminho)
+    assert (depois.st_size, depois.st_mtime_ns, depois.st_ino) == (antes.st_size, antes.st_mtime_ns, antes.st_ino)
+
+    assert StaleChecker(projeto.caminho).obter_delta_modificacao() == (['a.txt'], [], [])
+    assert 'a.txt' in projeto.rastro('status').stdout
+
+def test_racy_clean_sem_alteracao(projeto, racy):
+    assert StaleChecker(projeto.caminho).obter_delta_modificacao() == ([], [], [])
+
+def test_fora_da_janela_racy_nao_e_suspeito(projeto):
+    projeto.escrever({'a.txt': 'conteúdo A\n'})
+    antigo = time.time_ns() - 10 * JANELA_RACY_NS
+    _definir_mtime(os.path.join(projeto.caminho, 'a.txt'), antigo)
+    projeto.rastro('save', '-m', 'um')
+
+    assert StaleChecker(projeto.caminho).obter_delta_modificacao() == ([], [], [])
+
+def test_hash_recente_nao_entra_no_cache(projeto):
+    projeto.escrever({'recente.txt': 'recente\n', 'antigo.txt': 'antigo\n'})
+    antigo = os.path.join(projeto.caminho, 'antigo.txt')
+    _definir_mtime(antigo, time.time_ns() - 10 * JANELA_RACY_NS)
+    projeto.rastro('save', '-m', 'um')
+
+    verificador = StaleChecker(projeto.caminho)
+    listagem = verificador.obter_listagem()
+    hashes = verificador.calcular_hashes(['recente.txt', 'antigo.txt'])
+    assert None not in hashes.values()
+
+    # O cache só guarda o hash de quem saiu da janela racy: o outro ainda pode mudar sem mudar o stat
+    cache = StaleChecker(projeto.caminho).cache_hashes
+    for entrada in listagem:
+        registrado = cache.obter(entrada.inode, entrada.size, entrada.mtime_ns)
+        if entrada.caminho == 'antigo.txt':
+            assert registrado == hashes['antigo.txt']
+        elif entrada.caminho == 'recente.txt':
+            assert registrado is None
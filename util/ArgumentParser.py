@@ -1,4 +1,8 @@
 import argparse
+try:
+    from util.Compressao import CODECS
+except ImportError:
+    from rastro_app.util.Compressao import CODECS
 
 def criar_parser():
     parser = argparse.ArgumentParser(
@@ -16,30 +20,101 @@ def criar_parser():
     # Save
     p_save = subparsers.add_parser('save', help='Salva o estado atual (snapshot)')
     p_save.add_argument('-m', '--message', help='Mensagem do snapshot')
+    p_save.add_argument('--full', action='store_true', help='Grava um snapshot completo em vez de incremental')
+    p_save.add_argument('--codec', choices=CODECS, help='Codec de compressão (padrão: config.json do projeto ou gzip)')
+    p_save.add_argument('--level', type=int, help='Nível de compressão do codec')
+    p_save.add_argument('--verify', action='store_true', help='Confere por hash os arquivos com stat alterado')
+    p_save.add_argument('--all', action='store_true', help='Salva todos os projetos do registro global')
+    _adicionar_trabalhadores(p_save)
 
     # List
     p_list = subparsers.add_parser('list', help='Lista os snapshots do projeto')
+    p_list.add_argument('--limit', type=int, help='Mostra só os N snapshots mais recentes')
+    p_list.add_argument('--since', help='Mostra só os snapshots a partir da data (AAAA-MM-DD)')
 
     # Status
     p_status = subparsers.add_parser('status', help='Mostra o status atual')
+    p_status.add_argument('--verify', action='store_true', help='Confere por hash os arquivos com stat alterado')
 
     # Restore
     p_restore = subparsers.add_parser('restore', help='Restaura um snapshot anterior')
     p_restore.add_argument('alvo', help='ID do snapshot ou "last" ou indice relativo (1=ultimo)')
     p_restore.add_argument('--dry-run', action='store_true', help='Simula a restauração')
     p_restore.add_argument('--save-before', action='store_true', help='Salva snapshot atual antes de restaurar')
+    p_restore.add_argument('--verify', action='store_true', help='Confere por hash os arquivos com stat alterado')
+
+    # Show
+    p_show = subparsers.add_parser('show', aliases=['cat'], help='Mostra o conteúdo de um arquivo de um snapshot')
+    p_show.add_argument('alvo', help='ID do snapshot ou "last" ou indice relativo (1=ultimo)')
+    p_show.add_argument('caminho', help='Caminho do arquivo no projeto')
+
+    # Ls
+    p_ls = subparsers.add_parser('ls', help='Lista os arquivos de um snapshot')
+    p_ls.add_argument('alvo', help='ID do snapshot ou "last" ou indice relativo (1=ultimo)')
+    p_ls.add_argument('-l', '--long', action='store_true', help='Mostra tamanho e data de modificação')
+
+    # Diff
+    p_diff = subparsers.add_parser('diff', help='Compara dois snapshots, ou um snapshot e o diretório de trabalho')
+    p_diff.add_argument('alvo', help='ID do snapshot ou "last" ou indice relativo (1=ultimo)')
+    p_diff.add_argument('alvo_novo', nargs='?', help='Segundo snapshot (padrão: diretório de trabalho)')
+    p_diff.add_argument('-p', '--patch', action='store_true', help='Mostra o diff unificado dos arquivos de texto')
+
+    # Log
+    p_log = subparsers.add_parser('log', help='Mostra os snapshots em que um arquivo mudou')
+    p_log.add_argument('caminho', nargs='?', help='Caminho do arquivo no projeto')
+    p_log.add_argument('--rebuild', action='store_true', help='Reconstrói o histórico de arquivos a partir de todos os snapshots')
+
+    # Grep
+    p_grep = subparsers.add_parser('grep', help='Procura um padrão no conteúdo dos snapshots')
+    p_grep.add_argument('padrao', help='Expressão regular a procurar')
+    p_grep.add_argument('--ids', nargs='+', metavar='ALVO', help='Snapshots a pesquisar (padrão: todos)')
+    p_grep.add_argument('--path-glob', action='append', metavar='GLOB', help='Só arquivos cujo caminho casa com o glob (pode repetir)')
+    p_grep.add_argument('-i', '--ignore-case', action='store_true', help='Ignora maiúsculas e minúsculas')
 
     # Remover
     p_remove = subparsers.add_parser('remover', help='Remove snapshots antigos')
     p_remove.add_argument('alvo', help='Quantidade a remover (antigos) ou "all"')
     p_remove.add_argument('--dry-run', action='store_true', help='Simula a remoção')
 
+    # GC / Repack
+    p_gc = subparsers.add_parser('gc', help='Apaga objetos sem referência e reescreve pacotes com lixo')
+    p_gc.add_argument('--dry-run', action='store_true', help='Só mostra o que seria liberado')
+    p_repack = subparsers.add_parser('repack', help='Junta os objetos em pacotes grandes (inclui o gc)')
+    p_repack.add_argument('--dry-run', action='store_true', help='Só mostra o que seria feito')
+
+    # Watch
+    p_watch = subparsers.add_parser('watch', help='Controla o observador de mudanças em segundo plano')
+    p_watch.add_argument('acao', choices=['start', 'stop', 'status'], help='Iniciar, parar ou consultar o observador')
+
     # Projects
     p_projects = subparsers.add_parser('projects', help='Lista todos os projetos rastreados globalmente')
+    p_projects.add_argument('--status', action='store_true', help='Mostra o status de cada projeto')
+    _adicionar_trabalhadores(p_projects)
 
     # Forget
     p_forget = subparsers.add_parser('forget', help='Remove um projeto do registro global')
     p_forget.add_argument('identificador', help='ID ou Nome do projeto')
     p_forget.add_argument('--dry-run', action='store_true', help='Simula o esquecimento')
 
+    # Diagnóstico: depois do comando (rastro save --stats-json). Antes dele não dá: com o
+    # ARQUIVO opcional, rastro --stats-json save tomaria o nome do comando como arquivo
+    for p in {id(p): p for p in subparsers.choices.values()}.values():
+        _adicionar_diagnostico(p)
+
     return parser
+
+def _adicionar_trabalhadores(parser):
+    parser.add_argument('-j', '--jobs', type=int, metavar='N',
+                        help='Projetos processados em paralelo com --all/--status (padrão: número de CPUs)')
+
+def _adicionar_diagnostico(parser):
+    # O arquivo de saída só vem das opções -file: com um argumento opcional, a opção tomaria
+    # o argumento seguinte do próprio comando (rastro log --stats-json src/a.txt) como destino
+    parser.add_argument('--stats-json', action='store_true',
+                        help='Tempos por fase e contadores do comando em JSON, na saída de erro')
+    parser.add_argument('--stats-json-file', metavar='ARQUIVO',
+                        help='Como --stats-json, mas grava o JSON em ARQUIVO')
+    parser.add_argument('--profile', action='store_true',
+                        help='Roda o comando sob cProfile e mostra o resumo na saída de erro')
+    parser.add_argument('--profile-file', metavar='ARQUIVO',
+                        help='Como --profile, mas grava os dados para pstats/snakeviz em ARQUIVO')
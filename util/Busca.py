@@ -0,0 +1,105 @@
+import re
+import fnmatch
+import itertools
+from typing import Iterator, List, Optional, Tuple
+
+TAMANHO_BLOCO_BUSCA = 1024 * 1024
+# Bytes iniciais examinados para decidir se um arquivo é binário
+AMOSTRA_BINARIO = 8000
+# Linhas que um processo do pool devolve de uma vez; um conteúdo com mais que isso é
+# pesquisado de novo no processo principal, imprimindo à medida que encontra
+LIMITE_LINHAS_LOTE = 10000
+
+def compilar_padrao(padrao: str, ignorar_maiusculas: bool = False) -> 're.Pattern':
+    """
+    A busca é feita nos bytes, sem decodificar o arquivo inteiro; só as linhas encontradas são decodificadas.
+    """
+    flags = re.MULTILINE | (re.IGNORECASE if ignorar_maiusculas else 0)
+    return re.compile(padrao.encode('utf-8', 'surrogateescape'), flags)
+
+def caminho_aceito(caminho: str, globs: Optional[List[str]]) -> bool:
+    return not globs or any(fnmatch.fnmatchcase(caminho, g) for g in globs)
+
+def buscar_no_stream(origem, regex: 're.Pattern') -> Iterator[Tuple[int, str]]:
+    """
+    Linhas (número, texto) do stream que contêm o padrão, à medida que são encontradas.
+    Lê em blocos: a memória usada é a de um bloco mais a maior linha. Arquivos binários
+    não produzem nada.
+    """
+    pendente = origem.read(AMOSTRA_BINARIO)
+    if b'\0' in pendente:
+        return
+    linha_base = 1
+    fim_de_arquivo = False
+    while not fim_de_arquivo:
+        bloco = origem.read(TAMANHO_BLOCO_BUSCA)
+        if bloco:
+            dados = pendente + bloco
+            corte = dados.rfind(b'\n') + 1
+            if corte == 0:
+                # Linha maior que o bloco: continua acumulando
+                pendente = dados
+                continue
+            dados, pendente = dados[:corte], dados[corte:]
+        else:
+            dados, pendente = pendente, b''
+            fim_de_arquivo = True
+            if not dados:
+                break
+
+        posicao_contada, linha_atual, fim_ultima = 0, linha_base, -1
+        # O '\n' final fica de fora: senão '^' acharia uma linha vazia depois dele
+        limite = len(dados) - 1 if dados.endswith(b'\n') else len(dados)
+        for achado in regex.finditer(dados, 0, limite):
+            inicio = dados.rfind(b'\n', 0, achado.start()) + 1
+            if inicio <= fim_ultima:
+                continue # Uma linha só aparece uma vez
+            fim = dados.find(b'\n', achado.start())
+            if fim < 0:
+                fim = len(dados)
+            linha_atual += dados.count(b'\n', posicao_contada, inicio)
+            posicao_contada = inicio
+            yield linha_atual, dados[inicio:fim].decode('utf-8', 'replace')
+            fim_ultima = fim
+        linha_base += dados.count(b'\n')
+
+def _lote(linhas: Iterator, limite: Optional[int]) -> list:
+    # limite + 1 itens no máximo: mais que limite avisa o chamador que o lote foi cortado
+    return list(itertools.islice(linhas, None if limite is None else limite + 1))
+
+def buscar_em_objeto(id_objeto: str, abrir, regex: 're.Pattern',
+                     limite: Optional[int] = None) -> Optional[List[Tuple[int, str]]]:
+    """
+    Linhas encontradas no objeto, lido com abrir(id_objeto); None se ele não puder ser lido.
+    Com limite, no máximo limite + 1 linhas.
+    """
+    try:
+        with abrir(id_objeto) as origem:
+            return _lote(buscar_no_stream(origem, regex), limite)
+    except (OSError, EOFError):
+        return None
+
+def linhas_em_tar(caminho_tar: str, regex: 're.Pattern',
+                  globs: Optional[List[str]] = None) -> Iterator[Tuple[str, int, str]]:
+    """
+    (caminho, número, texto) das linhas encontradas nos arquivos de um snapshot antigo
+    (.tar.gz), lendo o stream uma vez.
+    """
+    import tarfile
+    with tarfile.open(caminho_tar, 'r:*') as tar:
+        for membro in tar:
+            if not membro.isfile() or not caminho_aceito(membro.name, globs):
+                continue
+            for numero, linha in buscar_no_stream(tar.extractfile(membro), regex):
+                yield membro.name, numero, linha
+
+def buscar_em_tar(caminho_tar: str, regex: 're.Pattern', globs: Optional[List[str]] = None,
+                  limite: Optional[int] = None) -> Optional[List[Tuple[str, int, str]]]:
+    """
+    Como linhas_em_tar, em lista (no máximo limite + 1 linhas). None se o arquivo não puder ser lido.
+    """
+    import tarfile
+    try:
+        return _lote(linhas_em_tar(caminho_tar, regex, globs), limite)
+    except (OSError, EOFError, tarfile.TarError):
+        return None
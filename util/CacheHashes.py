@@ -0,0 +1,60 @@
+import os
+import struct
+import logging
+from typing import Optional
+
+ARQUIVO_CACHE_HASHES = 'hashes.bin'
+
+# (inode, size, mtime_ns) -> SHA-256 do conteúdo
+REGISTRO_CACHE = struct.Struct('<QQq32s')
+
+class CacheHashes:
+    """
+    Cache persistente de hashes de conteúdo, chaveado por (inode, size, mtime_ns).
+    Enquanto o stat de um arquivo não muda, o hash já calculado continua valendo,
+    então verificar de novo um arquivo só tocado (touch) não exige reler o conteúdo.
+    """
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._hashes = None
+        self._alterado = False
+
+    def _carregar(self) -> dict:
+        if self._hashes is None:
+            self._hashes = {}
+            try:
+                with open(self.caminho, 'rb') as f:
+                    dados = f.read()
+                for inode, size, mtime_ns, digest in REGISTRO_CACHE.iter_unpack(dados):
+                    self._hashes[inode, size, mtime_ns] = digest.hex()
+            except FileNotFoundError:
+                pass
+            except (OSError, struct.error) as e:
+                logging.warning(f"Cache de hashes ignorado: {e}")
+                self._hashes = {}
+        return self._hashes
+
+    def obter(self, inode: int, size: int, mtime_ns: int) -> Optional[str]:
+        return self._carregar().get((inode, size, mtime_ns))
+
+    def registrar(self, inode: int, size: int, mtime_ns: int, hash_conteudo: str):
+        self._carregar()[inode, size, mtime_ns] = hash_conteudo
+        self._alterado = True
+
+    def salvar(self, chaves_vivas: Optional[set]):
+        """
+        Persiste o cache mantendo só as chaves que ainda correspondem a arquivos existentes
+        (ou todas, se chaves_vivas for None).
+        """
+        if not self._alterado:
+            return
+        temporario = f"{self.caminho}.tmp"
+        try:
+            with open(temporario, 'wb') as f:
+                for chave, hash_conteudo in self._carregar().items():
+                    if chaves_vivas is None or chave in chaves_vivas:
+                        f.write(REGISTRO_CACHE.pack(*chave, bytes.fromhex(hash_conteudo)))
+            os.replace(temporario, self.caminho)
+            self._alterado = False
+        except OSError as e:
+            logging.error(f"Erro ao salvar cache de hashes: {e}")
@@ -0,0 +1,131 @@
+import os
+import time
+import struct
+import logging
+from typing import Optional
+
+ARQUIVO_CACHE_PASTAS = 'pastas.bin'
+
+# Formato do pastas.bin (little-endian):
+#   cabeçalho: magic, versão, quantidade de pastas
+#   por pasta: mtime_ns, tamanho do caminho, tamanho do bloco de nomes, quantidade de entradas,
+#   seguidos do caminho, dos nomes separados por '\0' e de um byte de tipo por entrada
+MAGIC = b'RPAS'
+VERSAO = 1
+CABECALHO = struct.Struct('<4sHI')
+PASTA = struct.Struct('<qIII')
+
+TIPO_ARQUIVO = 0
+TIPO_PASTA = 1
+TIPO_OUTRO = 2  # Links para pastas: a varredura não segue
+
+# Pastas modificadas há menos que isto não entram no cache: uma entrada criada no mesmo
+# tique do mtime registrado não mudaria o mtime da pasta
+JANELA_RACY_NS = 2_000_000_000
+
+class CachePastas:
+    """
+    Cache da lista de entradas de cada pasta, chaveado pelo mtime da pasta.
+    Se o mtime não mudou, nenhuma entrada foi criada, removida ou renomeada ali:
+    a varredura reaproveita a lista e só refaz o stat dos arquivos, sem listar a pasta.
+    """
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._pastas = None
+        self._mtimes_lidos = {}
+        self._visitadas = set()
+        self._alterado = False
+        self._inicio_ns = time.time_ns()
+        self.reaproveitadas = 0
+        self.relistadas = 0
+
+    def _carregar(self) -> dict:
+        if self._pastas is None:
+            self._pastas = {}
+            try:
+                with open(self.caminho, 'rb') as f:
+                    dados = f.read()
+                self._pastas = self._decodificar(dados)
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError, struct.error) as e:
+                logging.warning(f"Cache de pastas ignorado: {e}")
+                self._pastas = {}
+        return self._pastas
+
+    @staticmethod
+    def _decodificar(dados: bytes) -> dict:
+        magic, versao, quantidade = CABECALHO.unpack_from(dados, 0)
+        if magic != MAGIC or versao != VERSAO:
+            raise ValueError("pastas.bin com formato desconhecido")
+        pastas = {}
+        posicao = CABECALHO.size
+        for _ in range(quantidade):
+            mtime_ns, tamanho_caminho, tamanho_nomes, n = PASTA.unpack_from(dados, posicao)
+            posicao += PASTA.size
+            pasta = dados[posicao:posicao + tamanho_caminho].decode('utf-8', 'surrogateescape')
+            posicao += tamanho_caminho
+            nomes = dados[posicao:posicao + tamanho_nomes].decode('utf-8', 'surrogateescape').split('\0') if n else []
+            posicao += tamanho_nomes
+            tipos = dados[posicao:posicao + n]
+            posicao += n
+            if len(nomes) != n or len(tipos) != n:
+                raise ValueError("pastas.bin truncado")
+            pastas[pasta] = (mtime_ns, list(zip(nomes, tipos)))
+        return pastas
+
+    def obter(self, pasta: str, caminho_pasta: str) -> Optional[list]:
+        """
+        Entradas (nome, tipo) da pasta se ela não mudou desde o registro; None se precisa listar.
+        """
+        try:
+            mtime_ns = os.stat(caminho_pasta).st_mtime_ns
+        except OSError:
+            return None
+        self._visitadas.add(pasta)
+        self._mtimes_lidos[pasta] = mtime_ns
+        registro = self._carregar().get(pasta)
+        if registro is not None and registro[0] == mtime_ns:
+            self.reaproveitadas += 1
+            return registro[1]
+        self.relistadas += 1
+        return None
+
+    def registrar(self, pasta: str, entradas: list):
+        # O mtime usado é o lido antes da listagem: mudanças durante ela invalidam o registro
+        mtime_ns = self._mtimes_lidos.get(pasta)
+        pastas = self._carregar()
+        if mtime_ns is None or mtime_ns >= self._inicio_ns - JANELA_RACY_NS:
+            if pastas.pop(pasta, None) is not None:
+                self._alterado = True
+            return
+        pastas[pasta] = (mtime_ns, entradas)
+        self._alterado = True
+
+    def salvar(self):
+        """
+        Persiste o cache, descartando as pastas que não apareceram nesta varredura.
+        """
+        pastas = self._carregar()
+        if not self._alterado and self._visitadas.issuperset(pastas):
+            return
+        blocos = []
+        quantidade = 0
+        for pasta, (mtime_ns, entradas) in pastas.items():
+            if pasta not in self._visitadas:
+                continue
+            caminho = pasta.encode('utf-8', 'surrogateescape')
+            nomes = '\0'.join(nome for nome, _ in entradas).encode('utf-8', 'surrogateescape')
+            blocos.append(PASTA.pack(mtime_ns, len(caminho), len(nomes), len(entradas)))
+            blocos += [caminho, nomes, bytes(tipo for _, tipo in entradas)]
+            quantidade += 1
+
+        temporario = f"{self.caminho}.tmp"
+        try:
+            with open(temporario, 'wb') as f:
+                f.write(CABECALHO.pack(MAGIC, VERSAO, quantidade))
+                f.write(b''.join(blocos))
+            os.replace(temporario, self.caminho)
+            self._alterado = False
+        except OSError as e:
+            logging.error(f"Erro ao salvar cache de pastas: {e}")
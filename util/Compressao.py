@@ -0,0 +1,153 @@
+import io
+import os
+import zlib
+import importlib
+
+# Objetos "store" ganham este cabeçalho para que a detecção automática
+# nunca confunda um arquivo cru com um stream gzip/bz2/xz.
+CABECALHO_STORE = b'RASTRO-STORE\x00'
+
+CODEC_PADRAO = 'gzip'
+
+NIVEIS_PADRAO = {
+    'gzip': 1,
+    'lzma': 1,
+    'bz2': 1,
+    'store': 0,
+}
+
+CODECS = tuple(NIVEIS_PADRAO)
+
+# Formatos que já são comprimidos: recomprimir gasta CPU sem ganho de espaço
+EXTENSOES_COMPRIMIDAS = frozenset({
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif', '.heic',
+    '.mp3', '.mp4', '.m4a', '.m4v', '.mkv', '.mov', '.avi', '.webm', '.ogg', '.opus', '.flac',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.lz4', '.zst', '.7z', '.rar',
+    '.whl', '.jar', '.apk', '.docx', '.xlsx', '.pptx', '.odt', '.epub', '.pdf',
+})
+
+# Amostra usada no teste rápido de compressibilidade
+TAMANHO_AMOSTRA = 64 * 1024
+# Se a amostra não encolher pelo menos até esta fração, o arquivo é guardado sem compressão
+RAZAO_MINIMA = 0.9
+
+class CodecInvalido(ValueError):
+    pass
+
+def validar_codec(codec: str, nivel=None) -> tuple:
+    """
+    Valida o codec e o nível. Retorna (codec, nivel) com o nível padrão preenchido.
+    """
+    if codec not in NIVEIS_PADRAO:
+        raise CodecInvalido(f"Codec desconhecido: {codec}. Use um de: {', '.join(CODECS)}")
+    if nivel is None:
+        nivel = NIVEIS_PADRAO[codec]
+    limite = 0 if codec == 'store' else 9
+    if not (0 <= nivel <= limite) or (codec == 'bz2' and nivel < 1):
+        raise CodecInvalido(f"Nível {nivel} inválido para o codec {codec}.")
+    return codec, nivel
+
+def vale_comprimir(caminho: str, amostra: bytes) -> bool:
+    """
+    Heurística: extensão de formato já comprimido ou amostra inicial que quase não encolhe.
+    """
+    if os.path.splitext(caminho)[1].lower() in EXTENSOES_COMPRIMIDAS:
+        return False
+    if len(amostra) < 512:
+        return True
+    return len(zlib.compress(amostra, 1)) < len(amostra) * RAZAO_MINIMA
+
+def _modulo(codec: str):
+    """
+    Módulo do codec (gzip, lzma ou bz2), importado no primeiro uso: comandos que não
+    leem nem gravam objetos não carregam nenhum deles.
+    """
+    return importlib.import_module(codec)
+
+def abrir_escrita(caminho: str, codec: str, nivel: int):
+    """
+    Abre um arquivo para escrita comprimida com o codec escolhido.
+    """
+    if codec == 'gzip':
+        return _modulo('gzip').open(caminho, 'wb', compresslevel=nivel)
+    if codec == 'lzma':
+        return _modulo('lzma').open(caminho, 'wb', preset=nivel)
+    if codec == 'bz2':
+        return _modulo('bz2').open(caminho, 'wb', compresslevel=nivel)
+    if codec == 'store':
+        f = open(caminho, 'wb')
+        f.write(CABECALHO_STORE)
+        return f
+    raise CodecInvalido(f"Codec desconhecido: {codec}")
+
+def detectar_codec(inicio: bytes) -> str:
+    """
+    Identifica o codec pelos primeiros bytes do arquivo.
+    """
+    if inicio.startswith(CABECALHO_STORE):
+        return 'store'
+    if inicio.startswith(b'\x1f\x8b'):
+        return 'gzip'
+    if inicio.startswith(b'\xfd7zXZ\x00'):
+        return 'lzma'
+    if inicio.startswith(b'BZh'):
+        return 'bz2'
+    raise CodecInvalido("Formato de compressão não reconhecido.")
+
+def abrir_leitura(caminho: str):
+    """
+    Abre um arquivo comprimido para leitura, detectando o codec automaticamente.
+    """
+    with open(caminho, 'rb') as f:
+        codec = detectar_codec(f.read(len(CABECALHO_STORE)))
+
+    if codec == 'gzip':
+        return _modulo('gzip').open(caminho, 'rb')
+    if codec == 'lzma':
+        return _modulo('lzma').open(caminho, 'rb')
+    if codec == 'bz2':
+        return _modulo('bz2').open(caminho, 'rb')
+    f = open(caminho, 'rb')
+    f.seek(len(CABECALHO_STORE), io.SEEK_SET)
+    return f
+
+def abrir_leitura_stream(origem):
+    """
+    Como abrir_leitura, para um arquivo já aberto e posicionado no início do objeto
+    (por exemplo, um trecho de um pacote). Fechar o leitor retornado fecha a origem.
+    """
+    try:
+        codec = detectar_codec(origem.read(len(CABECALHO_STORE)))
+    except Exception:
+        origem.close()
+        raise
+    if codec == 'store':
+        return origem
+    origem.seek(0)
+    if codec == 'gzip':
+        fluxo = _modulo('gzip').GzipFile(fileobj=origem, mode='rb')
+    elif codec == 'lzma':
+        fluxo = _modulo('lzma').LZMAFile(origem, 'rb')
+    else:
+        fluxo = _modulo('bz2').BZ2File(origem, 'rb')
+    return io.BufferedReader(_LeitorComOrigem(fluxo, origem))
+
+class _LeitorComOrigem(io.RawIOBase):
+    """
+    GzipFile, LZMAFile e BZ2File não fecham o arquivo que recebem já aberto.
+    """
+    def __init__(self, fluxo, origem):
+        self._fluxo = fluxo
+        self._origem = origem
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        return self._fluxo.readinto(buffer)
+
+    def close(self):
+        if not self.closed:
+            self._fluxo.close()
+            self._origem.close()
+        super().close()
@@ -0,0 +1,114 @@
+import math
+import hashlib
+from typing import Iterator
+
+# Arquivos a partir deste tamanho são guardados em fragmentos definidos pelo conteúdo
+LIMIAR_PADRAO = 16 * 1024 * 1024
+TAMANHO_MEDIO_PADRAO = 256 * 1024
+TAMANHO_MEDIO_MINIMO = 4 * 1024
+TAMANHO_MEDIO_MAXIMO = 1024 * 1024
+LIMIAR_MINIMO = 1024 * 1024
+
+# Leitura do arquivo em blocos: a memória usada é a de um bloco mais o maior fragmento
+TAMANHO_LEITURA = 1024 * 1024
+
+# Hash rolante: soma ponderada dos últimos JANELA bytes (após uma permutação fixa), calculada
+# para todas as posições de um bloco de uma vez. Os bytes vão em "casas" de 3 bytes de um inteiro
+# grande; multiplicá-lo por sum(peso_i << 24*i) deixa em cada casa a soma da janela terminada ali.
+# A multiplicação roda em C, umas dez vezes mais rápido que um laço byte a byte em Python.
+# Pesos de 12 bits: 16 * 4095 * 255 < 2**24, então uma casa nunca transborda para a seguinte.
+# As tabelas são fixas: mudar qualquer uma muda as fronteiras e desfaz a deduplicação.
+JANELA = 16
+BYTES_CASA = 3
+_SEMENTE = hashlib.sha256(b'rastro-fragmentacao-v1').digest()
+PESOS = [int.from_bytes(_SEMENTE[2 * i:2 * i + 2], 'little') & 0xFFF for i in range(JANELA)]
+PERMUTACAO = bytes(sorted(range(256), key=lambda v: hashlib.sha256(_SEMENTE + bytes([v])).digest()))
+MULTIPLICADOR = sum(peso << (8 * BYTES_CASA * i) for i, peso in enumerate(PESOS))
+# Os bits baixos da soma são comparados com este alvo (byte baixo não nulo: uma janela
+# de zeros, comum em bancos de dados e imagens de disco, nunca é fronteira)
+ALVO = int.from_bytes(_SEMENTE[-3:], 'little') | 0x1
+
+class FragmentacaoInvalida(ValueError):
+    pass
+
+def validar_fragmentacao(limiar=None, tamanho_medio=None) -> tuple:
+    """
+    Valida a configuração. Retorna (limiar, tamanho_medio) com os padrões preenchidos.
+    """
+    limiar = LIMIAR_PADRAO if limiar is None else limiar
+    tamanho_medio = TAMANHO_MEDIO_PADRAO if tamanho_medio is None else tamanho_medio
+    if not (TAMANHO_MEDIO_MINIMO <= tamanho_medio <= TAMANHO_MEDIO_MAXIMO):
+        raise FragmentacaoInvalida(f"Tamanho médio de fragmento {tamanho_medio} fora do intervalo "
+                                   f"{TAMANHO_MEDIO_MINIMO}-{TAMANHO_MEDIO_MAXIMO} bytes.")
+    if limiar < max(LIMIAR_MINIMO, tamanho_medio * 4):
+        raise FragmentacaoInvalida(f"Limiar de fragmentação {limiar} muito pequeno "
+                                   f"(mínimo: {max(LIMIAR_MINIMO, tamanho_medio * 4)} bytes).")
+    return limiar, tamanho_medio
+
+def _parametros(tamanho_medio: int) -> tuple:
+    # Nenhuma fronteira antes do mínimo; depois dele, cada posição é fronteira com
+    # probabilidade 1/2**bits, de modo que a média fica perto do tamanho pedido
+    minimo = tamanho_medio // 2
+    bits = max(8, round(math.log2(tamanho_medio - minimo)))
+    return minimo, tamanho_medio * 4, bits
+
+def _fronteiras(dados: bytes, bits: int) -> list:
+    """
+    Posições p de dados em que a janela terminada em p satisfaz a condição de fronteira.
+    As primeiras JANELA-1 posições usam janelas parciais (completadas pelo bloco anterior).
+    """
+    quantidade = len(dados)
+    casas = bytearray(BYTES_CASA * quantidade)
+    casas[0::BYTES_CASA] = dados.translate(PERMUTACAO)
+    somas = (int.from_bytes(casas, 'little') * MULTIPLICADOR).to_bytes(BYTES_CASA * (quantidade + JANELA), 'little')
+    mascara = (1 << bits) - 1
+    alvo = ALVO & mascara
+    # Filtro rápido pelo byte baixo (busca em C); os bits restantes só são conferidos nos candidatos
+    baixos = somas[0:BYTES_CASA * quantidade:BYTES_CASA]
+    byte_alvo = alvo & 0xFF
+    encontradas = []
+    posicao = baixos.find(byte_alvo)
+    while posicao >= 0:
+        inicio = posicao * BYTES_CASA
+        if int.from_bytes(somas[inicio:inicio + BYTES_CASA], 'little') & mascara == alvo:
+            encontradas.append(posicao)
+        posicao = baixos.find(byte_alvo, posicao + 1)
+    return encontradas
+
+def fragmentar(origem, tamanho_medio: int = TAMANHO_MEDIO_PADRAO) -> Iterator[bytes]:
+    """
+    Divide o stream em fragmentos definidos pelo conteúdo: uma alteração local muda só
+    os fragmentos em volta dela, e os demais se repetem mesmo que o conteúdo se desloque.
+    """
+    minimo, maximo, bits = _parametros(tamanho_medio)
+    atual = bytearray()
+    cauda = b''
+    while True:
+        bloco = origem.read(TAMANHO_LEITURA)
+        if not bloco:
+            break
+        # A cauda do bloco anterior completa as janelas do início deste
+        deslocamento = len(cauda)
+        inicio = 0
+        for posicao in _fronteiras(cauda + bloco, bits):
+            fim = posicao - deslocamento + 1
+            if fim <= inicio:
+                continue
+            while len(atual) + fim - inicio > maximo:
+                corte = inicio + maximo - len(atual)
+                yield bytes(atual) + bloco[inicio:corte]
+                atual.clear()
+                inicio = corte
+            if len(atual) + fim - inicio >= minimo:
+                yield bytes(atual) + bloco[inicio:fim]
+                atual.clear()
+                inicio = fim
+        while len(atual) + len(bloco) - inicio > maximo:
+            corte = inicio + maximo - len(atual)
+            yield bytes(atual) + bloco[inicio:corte]
+            atual.clear()
+            inicio = corte
+        atual += bloco[inicio:]
+        cauda = (cauda + bloco)[-(JANELA - 1):]
+    if atual:
+        yield bytes(atual)
@@ -0,0 +1,237 @@
+import os
+import mmap
+import json
+import struct
+import logging
+from typing import Iterator, Optional, Tuple
+from .Varredura import ListagemArvore, EntradaArquivo
+
+# Formato do index.bin (little-endian):
+#   cabeçalho: magic, versão, flags, base_id (-1 = nenhum), quantidade, tamanho do bloco de caminhos
+#   registros de tamanho fixo, ordenados por caminho (UTF-8)
+#   bloco com os caminhos concatenados
+MAGIC = b'RIDX'
+VERSAO = 2
+CABECALHO = struct.Struct('<4sHHqII')
+# offset_caminho, tamanho_caminho, modo, mtime_ns, size, inode, SHA-256 do conteúdo (zeros = desconhecido)
+REGISTRO = struct.Struct('<IHIqQQ32s')
+REGISTROS_POR_VERSAO = {
+    1: struct.Struct('<IHIqQQ'),
+    2: REGISTRO,
+}
+HASH_DESCONHECIDO = bytes(32)
+
+# Índice migrado do state.json: o mtime só tem precisão de float, então a comparação usa tolerância
+FLAG_MTIME_APROXIMADO = 0x1
+TOLERANCIA_APROXIMADA_NS = 1_000_000
+
+class IndiceInvalido(ValueError):
+    pass
+
+class IndiceArvore:
+    """
+    Índice binário, compacto e ordenado do diretório de trabalho (.rastro/index.bin).
+    É lido via mmap, sem montar dicionários: a comparação com a varredura atual é um
+    merge em streaming das duas listas ordenadas.
+    """
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+
+    @staticmethod
+    def escrever(caminho: str, listagem: ListagemArvore, base_id: Optional[int], flags: int = 0,
+                 hashes: Optional[dict] = None):
+        """
+        Grava o índice. hashes (caminho -> SHA-256 hex) guarda o conteúdo conhecido de cada
+        arquivo, usado para confirmar mudanças suspeitas sem depender só do stat.
+        """
+        hashes = hashes or {}
+        caminhos = bytearray()
+        registros = bytearray()
+        for entrada in listagem:
+            nome = entrada.caminho.encode('utf-8', 'surrogateescape')
+            hash_conteudo = hashes.get(entrada.caminho)
+            registros += REGISTRO.pack(len(caminhos), len(nome), entrada.modo,
+                                       entrada.mtime_ns, entrada.size, entrada.inode,
+                                       bytes.fromhex(hash_conteudo) if hash_conteudo else HASH_DESCONHECIDO)
+            caminhos += nome
+
+        temporario = f"{caminho}.tmp"
+        with open(temporario, 'wb') as f:
+            f.write(CABECALHO.pack(MAGIC, VERSAO, flags, -1 if base_id is None else base_id,
+                                   len(listagem), len(caminhos)))
+            f.write(registros)
+            f.write(caminhos)
+        os.replace(temporario, caminho)
+
+    def ler(self) -> 'LeitorIndice':
+        return LeitorIndice(self.caminho)
+
+class LeitorIndice:
+    """
+    Acesso somente leitura ao index.bin mapeado em memória. Use como context manager.
+    """
+    def __init__(self, caminho: str):
+        self._arquivo = open(caminho, 'rb')
+        try:
+            self._mapa = mmap.mmap(self._arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._arquivo.close()
+            raise IndiceInvalido("index.bin vazio")
+
+        try:
+            magic, versao, self.flags, base_id, self.quantidade, tamanho_caminhos = CABECALHO.unpack_from(self._mapa, 0)
+        except struct.error:
+            self.fechar()
+            raise IndiceInvalido("Cabeçalho do index.bin truncado")
+        if magic != MAGIC or versao not in REGISTROS_POR_VERSAO:
+            self.fechar()
+            raise IndiceInvalido("index.bin com formato desconhecido")
+
+        self.versao = versao
+        self._registro = REGISTROS_POR_VERSAO[versao]
+        # mtime do próprio índice, no relógio do file system: arquivos com mtime igual ou
+        # posterior podem ter mudado no mesmo "tique" em que o índice foi gravado (racy clean)
+        self.mtime_ns = os.fstat(self._arquivo.fileno()).st_mtime_ns
+        self.base_id = None if base_id < 0 else base_id
+        self._inicio_registros = CABECALHO.size
+        self._inicio_caminhos = self._inicio_registros + self.quantidade * self._registro.size
+        if len(self._mapa) != self._inicio_caminhos + tamanho_caminhos:
+            self.fechar()
+            raise IndiceInvalido("index.bin truncado")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    def fechar(self):
+        if getattr(self, '_mapa', None) is not None:
+            self._mapa.close()
+            self._mapa = None
+        self._arquivo.close()
+
+    @property
+    def mtime_aproximado(self) -> bool:
+        return bool(self.flags & FLAG_MTIME_APROXIMADO)
+
+    def __iter__(self) -> Iterator[Tuple[str, int, int, int, int, Optional[str]]]:
+        """
+        Percorre (caminho, mtime_ns, size, inode, modo, hash) em ordem de caminho.
+        hash é None quando o conteúdo não é conhecido.
+        """
+        fim_registros = self._inicio_caminhos
+        registros = memoryview(self._mapa)[self._inicio_registros:fim_registros]
+        try:
+            for campos in self._registro.iter_unpack(registros):
+                yield self._montar(campos)
+        finally:
+            registros.release()
+
+    def _montar(self, campos) -> tuple:
+        offset, tamanho, modo, mtime_ns, size, inode, *digest = campos
+        inicio = self._inicio_caminhos + offset
+        caminho = self._mapa[inicio:inicio + tamanho].decode('utf-8', 'surrogateescape')
+        hash_conteudo = digest[0].hex() if digest and digest[0] != HASH_DESCONHECIDO else None
+        return caminho, mtime_ns, size, inode, modo, hash_conteudo
+
+    def _ler_registro(self, posicao: int) -> tuple:
+        return self._montar(self._registro.unpack_from(self._mapa, self._inicio_registros + posicao * self._registro.size))
+
+    def _primeira_posicao(self, caminho: str) -> int:
+        # Busca binária direto no mmap: a primeira posição com caminho >= o informado
+        inicio, fim = 0, self.quantidade
+        while inicio < fim:
+            meio = (inicio + fim) // 2
+            if self._ler_registro(meio)[0] < caminho:
+                inicio = meio + 1
+            else:
+                fim = meio
+        return inicio
+
+    def registros_sob(self, caminho: str) -> list:
+        """
+        Registros do próprio caminho e, se for uma pasta, de tudo abaixo dele,
+        sem percorrer o índice inteiro.
+        """
+        encontrados = []
+        posicao = self._primeira_posicao(caminho)
+        if posicao < self.quantidade:
+            registro = self._ler_registro(posicao)
+            if registro[0] == caminho:
+                encontrados.append(registro)
+
+        prefixo = caminho + '/'
+        posicao = self._primeira_posicao(prefixo)
+        while posicao < self.quantidade:
+            registro = self._ler_registro(posicao)
+            if not registro[0].startswith(prefixo):
+                break
+            encontrados.append(registro)
+            posicao += 1
+        return encontrados
+
+def comparar_com_listagem(leitor: LeitorIndice, listagem: ListagemArvore, verificar_conteudo: bool = False,
+                          registros=None):
+    """
+    Merge em streaming do índice com a varredura atual (ambos ordenados por caminho).
+    Retorna (modificados, adicionados, removidos, suspeitos).
+
+    suspeitos (caminho -> hash conhecido ou None) são arquivos cujo conteúdo precisa ser
+    conferido: os "racy clean" (stat igual, mas mtime no mesmo tique da gravação do índice)
+    e, com verificar_conteudo, os que só mudaram de mtime mantendo o tamanho.
+    registros (ordenados) limita a comparação a uma parte do índice, junto com uma listagem parcial.
+    """
+    if registros is None:
+        registros = leitor
+    tolerancia = TOLERANCIA_APROXIMADA_NS if leitor.mtime_aproximado else 0
+    modificados = []
+    adicionados = []
+    removidos = []
+    suspeitos = {}
+
+    atuais = iter(listagem)
+    atual = next(atuais, None)
+    for caminho, mtime_ns, size, _, _, hash_conteudo in registros:
+        while atual is not None and atual.caminho < caminho:
+            adicionados.append(atual.caminho)
+            atual = next(atuais, None)
+        if atual is None or atual.caminho != caminho:
+            removidos.append(caminho)
+            continue
+        if atual.size != size:
+            modificados.append(caminho)
+        elif abs(atual.mtime_ns - mtime_ns) > tolerancia:
+            if verificar_conteudo and hash_conteudo:
+                suspeitos[caminho] = hash_conteudo
+            else:
+                modificados.append(caminho)
+        elif mtime_ns >= leitor.mtime_ns:
+            suspeitos[caminho] = hash_conteudo
+        atual = next(atuais, None)
+
+    while atual is not None:
+        adicionados.append(atual.caminho)
+        atual = next(atuais, None)
+
+    return modificados, adicionados, removidos, suspeitos
+
+def migrar_state_json(caminho_state: str, caminho_indice: str) -> bool:
+    """
+    Converte um state.json antigo em index.bin e o renomeia para state.json.migrado.
+    """
+    try:
+        with open(caminho_state, 'r', encoding='utf-8') as f:
+            dados = json.load(f)
+        entradas = [
+            EntradaArquivo(caminho, d['mod_time'], d['size'], int(round(d['mod_time'] * 1e9)), 0, 0)
+            for caminho, d in dados.get("arquivos", {}).items()
+        ]
+        IndiceArvore.escrever(caminho_indice, ListagemArvore(entradas), dados.get("base_id"),
+                              flags=FLAG_MTIME_APROXIMADO)
+        os.replace(caminho_state, caminho_state + '.migrado')
+    except Exception as e:
+        logging.error(f"Erro ao migrar state.json para index.bin: {e}")
+        return False
+    logging.info("state.json migrado para index.bin.")
+    return True
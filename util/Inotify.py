@@ -0,0 +1,94 @@
+import os
+import sys
+import errno
+import struct
+
+# Constantes de <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# Tudo que pode mudar o conteúdo, o stat ou a existência de um arquivo numa pasta
+MASCARA_PADRAO = (IN_MODIFY | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+                  | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK)
+
+# wd, mask, cookie, len (struct inotify_event), seguido do nome com len bytes
+EVENTO = struct.Struct('iIII')
+TAMANHO_LEITURA = 64 * 1024
+
+class Inotify:
+    """
+    Acesso mínimo ao inotify do Linux via ctypes, sem dependências externas.
+    O descritor é não bloqueante: ler() devolve só os eventos já enfileirados pelo kernel.
+    """
+    def __init__(self):
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, "inotify só está disponível no Linux")
+        # ctypes só é carregado quando o observador sobe, não em todo comando
+        import ctypes
+        import ctypes.util
+        try:
+            self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            self._libc.inotify_init1.argtypes = [ctypes.c_int]
+            self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            self._libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        except (OSError, AttributeError) as e:
+            raise OSError(errno.ENOSYS, f"inotify indisponível: {e}")
+
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            import ctypes
+            numero = ctypes.get_errno()
+            raise OSError(numero, os.strerror(numero))
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def adicionar(self, caminho: str, mascara: int = MASCARA_PADRAO) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(caminho), mascara)
+        if wd < 0:
+            import ctypes
+            numero = ctypes.get_errno()
+            raise OSError(numero, os.strerror(numero), caminho)
+        return wd
+
+    def remover(self, wd: int):
+        # Falha se o kernel já removeu a observação (pasta apagada); nada a fazer
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def ler(self) -> list:
+        """
+        Lê todos os eventos pendentes. Retorna [(wd, mask, nome)], com nome vazio
+        quando o evento é da própria pasta observada.
+        """
+        eventos = []
+        while True:
+            try:
+                dados = os.read(self.fd, TAMANHO_LEITURA)
+            except BlockingIOError:
+                return eventos
+            posicao = 0
+            while posicao < len(dados):
+                wd, mascara, _, tamanho = EVENTO.unpack_from(dados, posicao)
+                posicao += EVENTO.size
+                nome = os.fsdecode(dados[posicao:posicao + tamanho].rstrip(b'\0'))
+                posicao += tamanho
+                eventos.append((wd, mascara, nome))
+
+    def fechar(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
@@ -0,0 +1,81 @@
+import time
+import threading
+
+# Tempos por fase e contadores do comando atual (rastro <comando> --stats-json).
+# Desligada por padrão: fase() devolve um objeto nulo compartilhado e contar() retorna
+# na primeira linha, então o custo de um ponto instrumentado é o de uma chamada vazia.
+# Os pontos ficam em trechos grossos (uma vez por fase, não por arquivo); contagens
+# por arquivo são acumuladas em variáveis locais e registradas uma vez no fim.
+_ativa = False
+_trava = threading.Lock()
+_fases = {}
+_contadores = {}
+
+def ativar():
+    global _ativa
+    with _trava:
+        _fases.clear()
+        _contadores.clear()
+        _ativa = True
+
+def ativa() -> bool:
+    return _ativa
+
+class _Fase:
+    __slots__ = ('nome', 'inicio')
+
+    def __init__(self, nome: str):
+        self.nome = nome
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *excecao):
+        duracao = time.perf_counter() - self.inicio
+        with _trava:
+            total = _fases.setdefault(self.nome, [0.0, 0])
+            total[0] += duracao
+            total[1] += 1
+        return False
+
+class _FaseNula:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        return False
+
+_FASE_NULA = _FaseNula()
+
+def fase(nome: str):
+    """
+    Cronometra um bloco with: o tempo de chamadas repetidas da mesma fase é somado.
+    Fases aninhadas contam nas duas (o tempo da externa inclui o da interna).
+    """
+    return _Fase(nome) if _ativa else _FASE_NULA
+
+def contar(nome: str, quantidade: int = 1):
+    if not _ativa:
+        return
+    with _trava:
+        _contadores[nome] = _contadores.get(nome, 0) + quantidade
+
+def contador_consultas(nome: str):
+    """
+    Callback para sqlite3.Connection.set_trace_callback: conta cada comando SQL executado
+    no banco. None se a instrumentação estiver desligada (a conexão fica sem callback).
+    """
+    if not _ativa:
+        return None
+    return lambda _comando: contar(nome)
+
+def relatorio() -> dict:
+    with _trava:
+        return {
+            'fases': {nome: {'segundos': round(segundos, 6), 'chamadas': chamadas}
+                      for nome, (segundos, chamadas) in sorted(_fases.items())},
+            'contadores': dict(sorted(_contadores.items())),
+        }
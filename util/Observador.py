@@ -0,0 +1,362 @@
+import os
+import json
+import time
+import errno
+import hashlib
+import logging
+from typing import Optional, TYPE_CHECKING
+from .Inotify import (Inotify, IN_CREATE, IN_MOVED_TO, IN_MOVED_FROM, IN_DELETE,
+                      IN_DELETE_SELF, IN_MOVE_SELF, IN_Q_OVERFLOW, IN_IGNORED, IN_ISDIR)
+from .RegrasIgnorar import ARQUIVO_GITIGNORE, carregar_regras
+from .Varredura import varrer_arvore
+if TYPE_CHECKING:
+    import socket
+
+CAMINHO_RASTRO = '.rastro'
+ARQUIVO_SOCKET = 'watch.sock'
+# sun_path tem 108 bytes no Linux; caminhos maiores vão para o diretório temporário
+LIMITE_CAMINHO_SOCKET = 100
+
+TEMPO_LIMITE_RESPOSTA = 5.0
+TEMPO_LIMITE_INICIO = 30.0
+INTERVALO_VERIFICACAO = 2.0
+
+MODO_INOTIFY = 'inotify'
+MODO_POLLING = 'polling'
+
+# socket, selectors e tempfile são importados só quando usados: o rastro status sem
+# observador rodando não passa do teste de existência do socket
+
+def caminho_socket(caminho_raiz: str) -> str:
+    caminho = os.path.join(caminho_raiz, CAMINHO_RASTRO, ARQUIVO_SOCKET)
+    if len(os.fsencode(caminho)) <= LIMITE_CAMINHO_SOCKET:
+        return caminho
+    import tempfile
+    chave = hashlib.sha256(os.fsencode(os.path.abspath(caminho_raiz))).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f"rastro-{chave}.sock")
+
+def observador_suportado() -> bool:
+    import socket
+    return hasattr(socket, 'AF_UNIX') and hasattr(os, 'fork')
+
+class _BackendInotify:
+    """
+    Observa cada pasta não ignorada com inotify. Pastas novas (criadas ou movidas para
+    dentro do projeto) passam a ser observadas na hora; pastas que saem são esquecidas.
+    """
+    modo = MODO_INOTIFY
+
+    def __init__(self, caminho_raiz: str):
+        self.caminho_raiz = caminho_raiz
+        self.raiz_removida = False
+        self.inotify = Inotify()
+        try:
+            self._observar_tudo()
+        except OSError:
+            self.inotify.fechar()
+            raise
+
+    def _observar_tudo(self):
+        self.regras = carregar_regras(self.caminho_raiz)
+        self.pastas = {}  # wd -> pasta relativa
+        self.wds = {}     # pasta relativa -> wd
+        self._observar_subarvore('')
+
+    def fileno(self) -> int:
+        return self.inotify.fileno()
+
+    def _observar_subarvore(self, pasta: str):
+        pendentes = [pasta]
+        while pendentes:
+            rel = pendentes.pop()
+            caminho = os.path.join(self.caminho_raiz, *rel.split('/')) if rel else self.caminho_raiz
+            try:
+                wd = self.inotify.adicionar(caminho)
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    raise # Limite de observações do kernel (fs.inotify.max_user_watches)
+                continue # Pasta removida enquanto era percorrida
+            anterior = self.pastas.get(wd)
+            if anterior is not None and anterior != rel:
+                self.wds.pop(anterior, None)
+            self.pastas[wd] = rel
+            self.wds[rel] = wd
+
+            try:
+                with os.scandir(caminho) as iterador:
+                    for entrada in iterador:
+                        filho = f"{rel}/{entrada.name}" if rel else entrada.name
+                        try:
+                            if entrada.is_dir(follow_symlinks=False) and not self.regras.ignorar(filho, True):
+                                pendentes.append(filho)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+
+    def _esquecer_subarvore(self, pasta: str):
+        prefixo = pasta + '/'
+        for rel in [p for p in self.wds if p == pasta or p.startswith(prefixo)]:
+            wd = self.wds.pop(rel)
+            self.pastas.pop(wd, None)
+            self.inotify.remover(wd)
+
+    def ler_eventos(self):
+        """
+        Retorna (caminhos alterados, perdeu_eventos). perdeu_eventos indica que não dá para
+        saber exatamente o que mudou (fila do kernel estourou ou regras de ignorar mudaram).
+        """
+        alterados = []
+        perdeu_eventos = False
+        regras_mudaram = False
+        for wd, mascara, nome in self.inotify.ler():
+            if mascara & IN_Q_OVERFLOW:
+                perdeu_eventos = True
+                continue
+            pasta = self.pastas.get(wd)
+            if mascara & IN_IGNORED:
+                if pasta is not None and self.wds.get(pasta) == wd:
+                    del self.wds[pasta]
+                self.pastas.pop(wd, None)
+                continue
+            if pasta is None:
+                continue
+            if not nome:
+                if pasta == '' and mascara & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    self.raiz_removida = True
+                continue
+
+            rel = f"{pasta}/{nome}" if pasta else nome
+            eh_dir = bool(mascara & IN_ISDIR)
+            if nome == ARQUIVO_GITIGNORE:
+                regras_mudaram = True
+            if self.regras.ignorar(rel, eh_dir):
+                continue
+            alterados.append(rel)
+            if eh_dir:
+                if mascara & (IN_MOVED_FROM | IN_DELETE):
+                    self._esquecer_subarvore(rel)
+                if mascara & (IN_CREATE | IN_MOVED_TO):
+                    self._observar_subarvore(rel)
+
+        if regras_mudaram:
+            # Pastas antes ignoradas podem ter passado a valer: recomeça do zero
+            for wd in list(self.pastas):
+                self.inotify.remover(wd)
+            self._observar_tudo()
+            perdeu_eventos = True
+        return alterados, perdeu_eventos
+
+    def fechar(self):
+        self.inotify.fechar()
+
+class _BackendPolling:
+    """
+    Alternativa sem inotify: a cada consulta varre a árvore e compara com a varredura anterior.
+    Não evita a varredura, mas mantém as respostas corretas em qualquer plataforma.
+    """
+    modo = MODO_POLLING
+    raiz_removida = False
+
+    def __init__(self, caminho_raiz: str):
+        self.caminho_raiz = caminho_raiz
+        self.listagem = varrer_arvore(caminho_raiz)
+
+    def fileno(self) -> Optional[int]:
+        return None
+
+    def ler_eventos(self):
+        nova = varrer_arvore(self.caminho_raiz)
+        anteriores = {e.caminho: e for e in self.listagem}
+        alterados = [e.caminho for e in nova if anteriores.pop(e.caminho, None) != e]
+        alterados.extend(anteriores)
+        self.listagem = nova
+        return alterados, False
+
+    def fechar(self):
+        pass
+
+class ServidorObservador:
+    """
+    Daemon por projeto (rastro watch start). Mantém em memória os caminhos alterados,
+    cada um com o número de sequência do último evento, e responde pelo socket Unix
+    quais mudaram desde um token. O token é gravado junto do index.bin.
+    """
+    def __init__(self, caminho_raiz: str):
+        self.caminho_raiz = caminho_raiz
+        self.caminho_socket = caminho_socket(caminho_raiz)
+        self.instancia = f"{os.getpid()}-{time.time_ns()}"
+        self.sequencia = 0
+        # Tokens anteriores a este número não são confiáveis (eventos perdidos)
+        self.sequencia_reinicio = 0
+        self.alterados = {}
+        self.ativo = True
+        import selectors
+        self.seletor = selectors.DefaultSelector()
+        try:
+            self.backend = _BackendInotify(caminho_raiz)
+        except OSError as e:
+            logging.warning(f"inotify indisponível ({e}); usando polling.")
+            self.backend = _BackendPolling(caminho_raiz)
+
+    def _token(self) -> str:
+        return f"{self.instancia}:{self.sequencia}"
+
+    def _reiniciar(self):
+        self.sequencia += 1
+        self.sequencia_reinicio = self.sequencia
+        self.alterados.clear()
+
+    def _processar_eventos(self):
+        try:
+            alterados, perdeu_eventos = self.backend.ler_eventos()
+        except OSError as e:
+            logging.warning(f"Falha no observador ({e}); passando para polling.")
+            if self.backend.fileno() is not None:
+                self.seletor.unregister(self.backend.fileno())
+            self.backend.fechar()
+            self.backend = _BackendPolling(self.caminho_raiz)
+            self._reiniciar()
+            return
+
+        if perdeu_eventos:
+            self._reiniciar()
+        if alterados:
+            self.sequencia += 1
+            for caminho in alterados:
+                self.alterados[caminho] = self.sequencia
+        if self.backend.raiz_removida:
+            self.ativo = False
+
+    def _responder(self, pedido: dict) -> dict:
+        comando = pedido.get('comando')
+        if comando == 'ping':
+            return {'pid': os.getpid(), 'modo': self.backend.modo, 'alterados': len(self.alterados)}
+        if comando == 'parar':
+            self.ativo = False
+            return {'ok': True}
+        if comando == 'alteracoes':
+            # Eventos de escritas anteriores à consulta já estão na fila do kernel
+            self._processar_eventos()
+            resposta = {'token': self._token(), 'completo': True, 'caminhos': []}
+            instancia, _, sequencia = (pedido.get('desde') or '').rpartition(':')
+            if instancia == self.instancia and sequencia.isdigit() and int(sequencia) >= self.sequencia_reinicio:
+                desde = int(sequencia)
+                resposta['completo'] = False
+                resposta['caminhos'] = sorted(c for c, s in self.alterados.items() if s > desde)
+            return resposta
+        return {'erro': f"comando desconhecido: {comando}"}
+
+    def _atender(self, servidor: 'socket.socket'):
+        conexao, _ = servidor.accept()
+        with conexao:
+            try:
+                conexao.settimeout(TEMPO_LIMITE_RESPOSTA)
+                pedido = json.loads(_ler_linha(conexao))
+                conexao.sendall(json.dumps(self._responder(pedido)).encode('utf-8') + b'\n')
+            except (OSError, ValueError) as e:
+                logging.debug(f"Pedido inválido ao observador: {e}")
+
+    def executar(self):
+        import socket
+        import selectors
+        servidor = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            if os.path.exists(self.caminho_socket):
+                os.unlink(self.caminho_socket) # Socket órfão de um daemon que não encerrou direito
+            antiga = os.umask(0o077)
+            try:
+                servidor.bind(self.caminho_socket)
+            finally:
+                os.umask(antiga)
+            servidor.listen()
+            self.seletor.register(servidor, selectors.EVENT_READ, 'cliente')
+            if self.backend.fileno() is not None:
+                self.seletor.register(self.backend.fileno(), selectors.EVENT_READ, 'eventos')
+            logging.info(f"Observador ativo em {self.caminho_raiz} ({self.backend.modo}).")
+
+            caminho_rastro = os.path.join(self.caminho_raiz, CAMINHO_RASTRO)
+            while self.ativo:
+                for chave, _ in self.seletor.select(timeout=INTERVALO_VERIFICACAO):
+                    if chave.data == 'eventos':
+                        self._processar_eventos()
+                    else:
+                        self._atender(servidor)
+                if not os.path.isdir(caminho_rastro):
+                    break # Projeto removido ou desinicializado
+        finally:
+            self.seletor.close()
+            servidor.close()
+            self.backend.fechar()
+            try:
+                os.unlink(self.caminho_socket)
+            except OSError:
+                pass
+            logging.info("Observador encerrado.")
+
+def _ler_linha(conexao: 'socket.socket') -> bytes:
+    dados = b''
+    while not dados.endswith(b'\n'):
+        bloco = conexao.recv(64 * 1024)
+        if not bloco:
+            break
+        dados += bloco
+    return dados
+
+def consultar_observador(caminho_raiz: str, pedido: dict, tempo_limite: float = TEMPO_LIMITE_RESPOSTA) -> Optional[dict]:
+    """
+    Envia um pedido ao daemon do projeto. Retorna None se ele não estiver rodando ou não responder.
+    """
+    caminho = caminho_socket(caminho_raiz)
+    if not os.path.exists(caminho):
+        return None
+    import socket
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conexao:
+            conexao.settimeout(tempo_limite)
+            conexao.connect(caminho)
+            conexao.sendall(json.dumps(pedido).encode('utf-8') + b'\n')
+            return json.loads(_ler_linha(conexao))
+    except (OSError, ValueError) as e:
+        logging.debug(f"Observador indisponível: {e}")
+        return None
+
+def iniciar_observador(caminho_raiz: str) -> Optional[dict]:
+    """
+    Inicia o daemon em segundo plano (fork duplo) e espera ele responder.
+    Retorna a resposta do ping, ou None se ele não subiu a tempo.
+    """
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.setsid()
+            if os.fork():
+                os._exit(0)
+            os.chdir('/')
+            nulo = os.open(os.devnull, os.O_RDWR)
+            for fd in (0, 1, 2):
+                os.dup2(nulo, fd)
+            ServidorObservador(caminho_raiz).executar()
+        except BaseException:
+            logging.exception("Erro no observador")
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+
+    limite = time.monotonic() + TEMPO_LIMITE_INICIO
+    while time.monotonic() < limite:
+        resposta = consultar_observador(caminho_raiz, {'comando': 'ping'})
+        if resposta:
+            return resposta
+        time.sleep(0.05)
+    return None
+
+def parar_observador(caminho_raiz: str) -> bool:
+    if consultar_observador(caminho_raiz, {'comando': 'parar'}) is None:
+        return False
+    limite = time.monotonic() + TEMPO_LIMITE_RESPOSTA
+    while os.path.exists(caminho_socket(caminho_raiz)) and time.monotonic() < limite:
+        time.sleep(0.05)
+    return True
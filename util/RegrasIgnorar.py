@@ -1,11 +1,267 @@
 import os
-import fnmatch
+import re
+from typing import Optional
+from .Instrumentacao import fase, contar
 
 REGRAS_PADRAO_RASTRO = ['.rastro', '.rastro/*', '*.pyc', '__pycache__']
 
+ARQUIVO_GITIGNORE = '.gitignore'
+
+def _traduzir_padrao(padrao: str) -> str:
+    """
+    Traduz um padrão do .gitignore (já sem '!', '/' inicial e '/' final) para regex.
+    '*' e '?' não atravessam '/'; '**' cobre qualquer quantidade de pastas.
+    """
+    partes = []
+    i = 0
+    n = len(padrao)
+    while i < n:
+        c = padrao[i]
+        if c == '*':
+            if padrao.startswith('**', i):
+                inicio_segmento = i == 0 or padrao[i - 1] == '/'
+                fim_segmento = i + 2 == n or padrao[i + 2] == '/'
+                if inicio_segmento and fim_segmento:
+                    if i + 2 == n:
+                        # 'a/**': tudo dentro de a
+                        partes.append('.*')
+                        i += 2
+                    else:
+                        # '**/' no início ou '/**/' no meio: zero ou mais pastas
+                        partes.append('(?:.*/)?')
+                        i += 3
+                    continue
+                # Outros '**' valem como '*' comum
+                while i < n and padrao[i] == '*':
+                    i += 1
+                partes.append('[^/]*')
+                continue
+            partes.append('[^/]*')
+        elif c == '?':
+            partes.append('[^/]')
+        elif c == '[':
+            j = i + 1
+            if j < n and padrao[j] in '!^':
+                j += 1
+            if j < n and padrao[j] == ']':
+                j += 1  # ']' logo após '[' é literal
+            fim = padrao.find(']', j)
+            if fim == -1:
+                partes.append(re.escape(c))
+            else:
+                classe = padrao[i + 1:fim]
+                negada = classe[0] in '!^'
+                if negada:
+                    classe = classe[1:]
+                classe = classe.replace('\\', '\\\\').replace('[', '\\[')
+                partes.append('[' + ('^' if negada else '') + classe + ']')
+                i = fim
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            partes.append(re.escape(padrao[i]))
+        else:
+            partes.append(re.escape(c))
+        i += 1
+    return ''.join(partes)
+
+# Caracteres que tornam um padrão não literal
+_CURINGAS = frozenset('*?[]\\')
+
+def _compilar_linha(linha: str):
+    """
+    Converte uma linha do .gitignore em (padrão, negacao, so_diretorio, ancorado), com o padrão
+    já sem '!' e sem as barras do início e do fim. A tradução para regex fica para quando
+    (e se) o grupo da regra for compilado.
+    Retorna None para linhas vazias e comentários.
+    """
+    linha = linha.rstrip('\r\n')
+    # Espaços no fim são ignorados, a menos que escapados com '\'
+    sem_espacos = linha.rstrip(' ')
+    if sem_espacos.endswith('\\') and len(sem_espacos) < len(linha):
+        sem_espacos += ' '
+    linha = sem_espacos
+    if not linha or linha.startswith('#'):
+        return None
+
+    negacao = False
+    if linha.startswith('!'):
+        negacao = True
+        linha = linha[1:]
+    elif linha.startswith('\\!') or linha.startswith('\\#'):
+        linha = linha[1:]
+
+    so_diretorio = linha.endswith('/')
+    linha = linha.rstrip('/')
+    if not linha:
+        return None
+
+    # Padrão com '/' no início ou no meio é relativo à pasta do .gitignore;
+    # sem '/', vale para o nome em qualquer profundidade.
+    ancorado = '/' in linha
+    linha = linha.lstrip('/')
+    return linha, negacao, so_diretorio, ancorado
+
+def _extensao(texto: str) -> Optional[str]:
+    # Parte depois do último '.' do último segmento; None sem '.' ou com o '.' no fim
+    nome = texto.rpartition('/')[2]
+    if '.' not in nome:
+        return None
+    return nome.rpartition('.')[2] or None
+
+class _GrupoRegras:
+    """
+    Regras de um .gitignore com o mesmo alvo (nome ou caminho) e o mesmo tipo (só diretório ou não).
+
+    Achar a regra vencedora (a última que casa) não exige compilar todas: padrões sem curinga
+    ('build/', '/docs/gerado.log') são consultados num dicionário; padrões que terminam numa
+    extensão literal ('*.log', 'teste*.tmp') só são compilados quando aparece um nome com
+    aquela extensão; o resto fica numa única regex. Cada regex tem uma alternativa por regra,
+    da última para a primeira, terminada por um grupo vazio: a primeira alternativa que casa é
+    a da regra vencedora, e m.lastindex diz qual é. O grupo fica no fim porque só é marcado
+    quando a alternativa já casou; com '(regra)' o motor salvaria as marcas a cada alternativa
+    tentada, o que fica quadrático em .gitignore grandes.
+    """
+    def __init__(self):
+        self.literais = {}       # texto -> índice da última regra com esse padrão
+        self.por_extensao = {}   # extensão -> índices das regras
+        self.gerais = []
+        # chave (extensão ou None para as gerais) -> (regex, índices em ordem dos grupos)
+        self._compiladas = {}
+
+    def adicionar(self, indice: int, padrao: str):
+        if not _CURINGAS.intersection(padrao):
+            self.literais[padrao] = indice
+            return
+        extensao = _extensao(padrao)
+        if extensao is not None and not _CURINGAS.intersection(extensao):
+            self.por_extensao.setdefault(extensao, []).append(indice)
+        else:
+            self.gerais.append(indice)
+
+    def _regex(self, chave: Optional[str], regras: list) -> tuple:
+        compilada = self._compiladas.get(chave)
+        if compilada is None:
+            indices = self.gerais if chave is None else self.por_extensao.get(chave, [])
+            indices = indices[::-1]
+            regex = None
+            if indices:
+                with fase('regras_ignorar'):
+                    regex = re.compile('|'.join(f'(?:{_traduzir_padrao(regras[i][0])}\\Z)()' for i in indices),
+                                       re.DOTALL)
+            compilada = self._compiladas[chave] = (regex, indices)
+        return compilada
+
+    def vencedora(self, alvo: str, regras: list) -> int:
+        """
+        Índice da última regra do grupo que casa com alvo; -1 se nenhuma casa.
+        """
+        vencedora = self.literais.get(alvo, -1)
+        chaves = [None]
+        extensao = _extensao(alvo)
+        if extensao in self.por_extensao:
+            chaves.append(extensao)
+        for chave in chaves:
+            regex, indices = self._regex(chave, regras)
+            m = regex.match(alvo) if regex is not None else None
+            if m is not None:
+                vencedora = max(vencedora, indices[m.lastindex - 1])
+        return vencedora
+
+class _ConjuntoRegras:
+    """
+    Regras de um único .gitignore. As regras sem '/' são testadas só contra o nome; as
+    ancoradas, contra o caminho relativo à pasta base. Ver _GrupoRegras.
+    """
+    def __init__(self, base: str, linhas: list):
+        self.base = base
+        self.regras = [r for r in (_compilar_linha(l) for l in linhas) if r is not None]
+        # (so_diretorio, ancorado) -> grupo
+        self._grupos = {}
+        for indice, (padrao, _, so_diretorio, ancorado) in enumerate(self.regras):
+            grupo = self._grupos.get((so_diretorio, ancorado))
+            if grupo is None:
+                grupo = self._grupos[so_diretorio, ancorado] = _GrupoRegras()
+            grupo.adicionar(indice, padrao)
+
+    def avaliar(self, caminho: str, nome: str, eh_dir: bool) -> Optional[bool]:
+        """
+        True/False se alguma regra decide (a última que casa vence); None se nenhuma casa.
+        """
+        vencedora = -1
+        for so_diretorio in ((False, True) if eh_dir else (False,)):
+            for ancorado, alvo in ((False, nome), (True, caminho)):
+                grupo = self._grupos.get((so_diretorio, ancorado))
+                if grupo is not None:
+                    vencedora = max(vencedora, grupo.vencedora(alvo, self.regras))
+        if vencedora < 0:
+            return None
+        return not self.regras[vencedora][1]
+
 class RegrasIgnorar:
-    def __init__(self, regras: list[str]):
+    """
+    Matcher compilado com a semântica do .gitignore: negação '!', padrões ancorados '/foo',
+    '**', regras só de diretório 'foo/' e arquivos .gitignore aninhados (carregados sob demanda
+    quando caminho_raiz é informado). As decisões por diretório ficam em cache, então quem
+    percorre a árvore podando as pastas ignoradas nunca desce nelas.
+    """
+    def __init__(self, regras: list[str], caminho_raiz: Optional[str] = None):
         self.regras = regras
+        self.caminho_raiz = caminho_raiz
+        self._conjuntos = {'': [_ConjuntoRegras('', regras)]}
+        self._pastas_ignoradas = {'': False}
+
+    def _conjuntos_da_pasta(self, pasta: str) -> list:
+        conjuntos = self._conjuntos.get(pasta)
+        if conjuntos is None:
+            pai = pasta.rpartition('/')[0]
+            conjuntos = self._conjuntos_da_pasta(pai)
+            with fase('regras_ignorar'):
+                linhas = self._ler_gitignore(pasta) if self.caminho_raiz else None
+                if linhas:
+                    contar('gitignores_lidos')
+                    conjuntos = conjuntos + [_ConjuntoRegras(pasta, linhas)]
+            self._conjuntos[pasta] = conjuntos
+        return conjuntos
+
+    def _ler_gitignore(self, pasta: str) -> Optional[list]:
+        caminho = os.path.join(self.caminho_raiz, *pasta.split('/'), ARQUIVO_GITIGNORE)
+        try:
+            with open(caminho, 'r', encoding='utf-8') as f:
+                return f.readlines()
+        except (OSError, UnicodeDecodeError):
+            return None
+
+    def _avaliar(self, pasta: str, caminho_relativo: str, nome: str, eh_dir: bool) -> bool:
+        # .gitignore mais profundo tem precedência: vale a última decisão
+        ignorado = False
+        for conjunto in self._conjuntos_da_pasta(pasta):
+            sub = caminho_relativo[len(conjunto.base) + 1:] if conjunto.base else caminho_relativo
+            decisao = conjunto.avaliar(sub, nome, eh_dir)
+            if decisao is not None:
+                ignorado = decisao
+        return ignorado
+
+    def pasta_ignorada(self, pasta: str) -> bool:
+        ignorada = self._pastas_ignoradas.get(pasta)
+        if ignorada is None:
+            pai, _, nome = pasta.rpartition('/')
+            ignorada = (nome == '.rastro' or self.pasta_ignorada(pai)
+                        or self._avaliar(pai, pasta, nome, True))
+            self._pastas_ignoradas[pasta] = ignorada
+        return ignorada
+
+    def ignorar(self, caminho_relativo: str, eh_dir: bool) -> bool:
+        """
+        Decide para um caminho relativo à raiz, com separador '/'.
+        """
+        if not caminho_relativo or caminho_relativo == '.':
+            return False
+        if eh_dir:
+            return self.pasta_ignorada(caminho_relativo)
+        pasta, _, nome = caminho_relativo.rpartition('/')
+        if self.pasta_ignorada(pasta):
+            return True
+        return self._avaliar(pasta, caminho_relativo, nome, False)
 
     def deve_ignorar(self, caminho_absoluto: str, raiz_projeto: str) -> bool:
         """
@@ -13,48 +269,25 @@ class RegrasIgnorar:
         """
         if not caminho_absoluto.startswith(raiz_projeto):
             return False
-            
-        caminho_relativo = os.path.relpath(caminho_absoluto, raiz_projeto)
-        
-        # Normalizar separadores para / para facilitar fnmatch
-        caminho_relativo_posix = caminho_relativo.replace(os.path.sep, '/')
-        
-        # Verifica se o próprio nome do arquivo/dir bate com alguma regra
-        nome_arquivo = os.path.basename(caminho_relativo)
-        
-        for regra in self.regras:
-            # Regras podem ser globais (*.pyc) ou de caminho (dir/*)
-            if fnmatch.fnmatch(caminho_relativo_posix, regra):
-                return True
-            if fnmatch.fnmatch(nome_arquivo, regra):
-                return True
-            # Verifica partes do caminho para diretórios ignorados
-            parts = caminho_relativo_posix.split('/')
-            for part in parts:
-                if fnmatch.fnmatch(part, regra): # Ex: .rastro
-                    return True
-                    
-        return False
+
+        caminho_relativo = os.path.relpath(caminho_absoluto, raiz_projeto).replace(os.path.sep, '/')
+        return self.ignorar(caminho_relativo, os.path.isdir(caminho_absoluto))
 
 def carregar_regras(caminho_raiz: str) -> RegrasIgnorar:
     """
     Carrega regras do .gitignore (se existir) e adiciona as padrões.
+    Arquivos .gitignore em subpastas são lidos sob demanda durante a varredura.
     """
     regras = list(REGRAS_PADRAO_RASTRO)
-    
-    arquivo_gitignore = os.path.join(caminho_raiz, '.gitignore')
-    if os.path.isfile(arquivo_gitignore):
-        try:
-            with open(arquivo_gitignore, 'r', encoding='utf-8') as f:
-                for linha in f:
-                    linha = linha.strip()
-                    if not linha or linha.startswith('#'):
-                        continue
-                    # Ajustes básicos de .gitignore para fnmatch
-                    if linha.endswith('/'):
-                        linha = linha[:-1] 
-                    regras.append(linha)
-        except Exception:
-            pass # Falha silenciosa na leitura do gitignore
-            
-    return RegrasIgnorar(regras)
+
+    with fase('regras_ignorar'):
+        arquivo_gitignore = os.path.join(caminho_raiz, ARQUIVO_GITIGNORE)
+        if os.path.isfile(arquivo_gitignore):
+            try:
+                with open(arquivo_gitignore, 'r', encoding='utf-8') as f:
+                    regras.extend(f.readlines())
+                contar('gitignores_lidos')
+            except Exception:
+                pass # Falha silenciosa na leitura do gitignore
+
+        return RegrasIgnorar(regras, caminho_raiz)
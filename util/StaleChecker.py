@@ -1,103 +1,290 @@
 import os
 import json
+import stat
+import time
 import logging
-from .RegrasIgnorar import carregar_regras
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from .Varredura import ListagemArvore, EntradaArquivo, varrer_arvore
+from .RegrasIgnorar import ARQUIVO_GITIGNORE, carregar_regras
+from .Observador import consultar_observador
+from .IndiceArvore import IndiceArvore, IndiceInvalido, comparar_com_listagem, migrar_state_json
+from .CacheHashes import CacheHashes, ARQUIVO_CACHE_HASHES
+from .CachePastas import CachePastas, ARQUIVO_CACHE_PASTAS
+from .Utilitarios import calcular_hash_arquivo
+from .Instrumentacao import fase, contar, ativa
 
 CAMINHO_RASTRO = '.rastro'
 ARQUIVO_STATE = 'state.json'
+ARQUIVO_INDICE = 'index.bin'
 ARQUIVO_CONFIG = 'config.json'
+# Token do daemon de observação correspondente ao index.bin atual
+ARQUIVO_TOKEN_OBSERVADOR = 'watch.token'
+
+TRABALHADORES_HASH = min(32, (os.cpu_count() or 1) * 2)
+# Hashes de arquivos modificados há menos que isto não entram no cache: o file system pode
+# não registrar no mtime uma nova escrita feita dentro do mesmo intervalo
+JANELA_RACY_NS = 2_000_000_000
 
 class StaleChecker:
-    def __init__(self, caminho_raiz: str):
+    def __init__(self, caminho_raiz: str, listagem: Optional[ListagemArvore] = None,
+                 verificar_conteudo: bool = False):
         self.caminho_raiz = caminho_raiz
+        # Com verificação de conteúdo, arquivos que só mudaram de mtime são conferidos por hash
+        self.verificar_conteudo = verificar_conteudo
+        # state.json só é lido para migração; o estado fica no index.bin
         self.caminho_state = os.path.join(caminho_raiz, CAMINHO_RASTRO, ARQUIVO_STATE)
+        self.caminho_indice = os.path.join(caminho_raiz, CAMINHO_RASTRO, ARQUIVO_INDICE)
+        self.cache_hashes = CacheHashes(os.path.join(caminho_raiz, CAMINHO_RASTRO, ARQUIVO_CACHE_HASHES))
+        # Snapshot sobre o qual o índice foi gerado (preenchido por obter_delta_modificacao)
+        self.base_id = None
+        # Varredura única do file system, compartilhada por delta, arquivamento e índice
+        self.listagem = listagem
+        self.caminho_token = os.path.join(caminho_raiz, CAMINHO_RASTRO, ARQUIVO_TOKEN_OBSERVADOR)
+        # Token devolvido pelo daemon antes de olhar o file system; vai junto do próximo índice
+        self.token_observador = None
+        # Com o daemon: (caminhos alterados, listagem só desses caminhos)
+        self._parcial = None
+        # Pastas reaproveitadas do cache x listadas de novo na última varredura completa
+        self.estatisticas_varredura = None
+
+    def obter_listagem(self) -> ListagemArvore:
+        if self.listagem is None:
+            if self._parcial is not None:
+                self.listagem = self._listagem_do_indice()
+            else:
+                with fase('varredura'):
+                    cache = CachePastas(os.path.join(self.caminho_raiz, CAMINHO_RASTRO, ARQUIVO_CACHE_PASTAS))
+                    self.listagem = varrer_arvore(self.caminho_raiz, cache=cache)
+                    cache.salvar()
+                self.estatisticas_varredura = {
+                    'pastas_reaproveitadas': cache.reaproveitadas,
+                    'pastas_relistadas': cache.relistadas,
+                }
+                contar('pastas_reaproveitadas', cache.reaproveitadas)
+                contar('pastas_relistadas', cache.relistadas)
+                logging.debug(f"Varredura: {cache.reaproveitadas} pastas reaproveitadas, "
+                              f"{cache.relistadas} listadas.")
+        return self.listagem
 
-    def _gerar_estado_atual(self) -> dict:
+    def _entrada(self, caminho: str) -> EntradaArquivo:
+        if self.listagem is None and self._parcial is not None:
+            return self._parcial[1][caminho]
+        return self.obter_listagem()[caminho]
+
+    def salvar_indice(self, base_id: int, listagem: Optional[ListagemArvore] = None, hashes: Optional[dict] = None):
         """
-        Gera um dicionário representando o estado atual do file system.
-        Chave: caminho_relativo, Valor: {mod_time, size}
+        Salva no index.bin a listagem informada ou, por padrão, a mesma usada no delta.
+        hashes (caminho -> SHA-256) é o conteúdo de cada arquivo no snapshot base.
         """
-        estado = {}
-        regras = carregar_regras(self.caminho_raiz)
-        
-        for root, dirs, files in os.walk(self.caminho_raiz):
-            # Filtrar diretórios ignorados para não descer neles
-            dirs[:] = [d for d in dirs if not regras.deve_ignorar(os.path.join(root, d), self.caminho_raiz)]
-            
-            for file in files:
-                caminho_absoluto = os.path.join(root, file)
-                if regras.deve_ignorar(caminho_absoluto, self.caminho_raiz):
-                    continue
-                
-                try:
-                    stats = os.stat(caminho_absoluto)
-                    caminho_relativo = os.path.relpath(caminho_absoluto, self.caminho_raiz).replace(os.path.sep, '/')
-                    estado[caminho_relativo] = {
-                        'mod_time': stats.st_mtime,
-                        'size': stats.st_size
-                    }
-                except OSError:
-                    continue # Arquivo pode ter sido deletado durante a verificação
-                    
-        return estado
-
-    def _salvar_state_json(self, base_id: int):
-        """
-        Salva o estádo atual no arquivo state.json.
-        """
-        estado_atual = self._gerar_estado_atual()
-        dados = {
-            "base_id": base_id,
-            "arquivos": estado_atual
-        }
-        
+        if listagem is not None:
+            self.listagem = listagem
         try:
-            with open(self.caminho_state, 'w', encoding='utf-8') as f:
-                json.dump(dados, f, indent=2)
+            listagem = self.obter_listagem()
+            with fase('indice'):
+                IndiceArvore.escrever(self.caminho_indice, listagem, base_id, hashes=hashes)
         except Exception as e:
-            logging.error(f"Erro ao salvar state.json: {e}")
+            logging.error(f"Erro ao salvar index.bin: {e}")
+            return
+        self._salvar_token([])
+
+    def _identidade_indice(self) -> list:
+        st = os.stat(self.caminho_indice)
+        return [st.st_mtime_ns, st.st_size, st.st_ino]
+
+    def _salvar_token(self, pendentes: list):
+        """
+        pendentes são os caminhos que já diferiam do índice quando o token foi obtido;
+        a próxima consulta confere esses mais os que o daemon viu mudar.
+        """
+        if self.token_observador is None:
+            return
+        try:
+            temporario = f"{self.caminho_token}.tmp"
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump({"token": self.token_observador, "indice": self._identidade_indice(),
+                           "pendentes": pendentes}, f)
+            os.replace(temporario, self.caminho_token)
+        except OSError as e:
+            logging.warning(f"Erro ao salvar token do observador: {e}")
+
+    def _ler_token(self):
+        """
+        (token, pendentes) gravados com o index.bin atual. Se o índice foi regravado sem
+        o daemon, a identidade não bate e o token não vale.
+        """
+        try:
+            with open(self.caminho_token, 'r', encoding='utf-8') as f:
+                dados = json.load(f)
+            if dados.get("indice") == self._identidade_indice():
+                return dados.get("token"), dados.get("pendentes", [])
+        except (OSError, ValueError):
+            pass
+        return None, []
 
     def obter_delta_modificacao(self):
         """
-        Compara o estado salvo em state.json com o sistema de arquivos atual.
+        Compara o estado salvo no index.bin com o sistema de arquivos atual.
         Retorna (modificados, adicionados, removidos) -> listas de caminhos relativos.
         """
-        if not os.path.exists(self.caminho_state):
-            # Se não existe state, tudo é novo (ou nada, se vazio)
+        with fase('delta'):
+            return self._obter_delta_modificacao()
+
+    def _obter_delta_modificacao(self):
+        if not os.path.exists(self.caminho_indice) and os.path.exists(self.caminho_state):
+            migrar_state_json(self.caminho_state, self.caminho_indice)
+
+        # Consulta o daemon antes de olhar o file system: o que mudar daqui em diante
+        # aparece na próxima consulta com o token novo
+        resposta = None
+        pendentes = []
+        if self.listagem is None:
+            token, pendentes = self._ler_token()
+            with fase('consulta_observador'):
+                resposta = consultar_observador(self.caminho_raiz, {'comando': 'alteracoes', 'desde': token})
+            if resposta and 'token' in resposta:
+                self.token_observador = resposta['token']
+
+        if not os.path.exists(self.caminho_indice):
+            # Se não existe índice, tudo é novo (ou nada, se vazio)
             # Mas sem base de comparação, retornamos tudo como 'adicionado' se quisermos ser rigorosos,
             # ou vazio se assumirmos que é um projeto novo.
-            # Logicamente, se não tem state, assumimos que devemos gerar um na próxima.
+            # Logicamente, se não tem índice, assumimos que devemos gerar um na próxima.
             # Para fins de 'status', retornamos tudo que existe como adicionado.
-            atual = self._gerar_estado_atual()
-            return [], list(atual.keys()), []
-            
+            return [], self.obter_listagem().caminhos(), []
+
+        usar_observador = (resposta is not None and resposta.get('completo') is False
+                           and not any(c.rpartition('/')[2] == ARQUIVO_GITIGNORE for c in resposta['caminhos']))
+        if not usar_observador:
+            self.obter_listagem() # Fora da fase de comparação: a varredura tem a sua
+        try:
+            with fase('comparacao_indice'), IndiceArvore(self.caminho_indice).ler() as leitor:
+                self.base_id = leitor.base_id
+                if usar_observador:
+                    mods, adds, rems, suspeitos = self._comparar_alterados(leitor, resposta['caminhos'] + pendentes)
+                else:
+                    mods, adds, rems, suspeitos = comparar_com_listagem(leitor, self.obter_listagem(), self.verificar_conteudo)
+        except (OSError, IndiceInvalido) as e:
+            logging.error(f"Erro ao ler index.bin: {e}")
+            return [], [], [] # Erro de leitura, assume sem mudanças ou inconclusivo
+
+        if suspeitos:
+            mods = sorted(mods + self._confirmar_modificados(suspeitos))
+        # Próximas consultas partem daqui: só o que mudar depois precisa ser relido
+        self._salvar_token(sorted(mods + adds + rems))
+        return mods, adds, rems
+
+    def _comparar_alterados(self, leitor, caminhos: list):
+        """
+        Compara com o índice só os caminhos que o daemon viu mudar: cada um é buscado
+        no índice (e, se for pasta, tudo abaixo dele) e relido do disco.
+        """
+        regras = carregar_regras(self.caminho_raiz)
+        grupos = set()
+        for caminho in sorted(caminhos, key=len):
+            # Um caminho dentro de uma pasta alterada já é coberto pela pasta
+            if not self._sob_algum(caminho, grupos):
+                grupos.add(caminho)
+
+        registros = []
+        entradas = []
+        for grupo in sorted(grupos):
+            registros.extend(leitor.registros_sob(grupo))
+            entradas.extend(self._entradas_atuais(grupo, regras))
+        registros.sort()
+        parcial = ListagemArvore(entradas)
+        self._parcial = (grupos, parcial)
+        logging.debug(f"Observador: {len(grupos)} caminhos alterados conferidos.")
+        return comparar_com_listagem(leitor, parcial, self.verificar_conteudo, registros=registros)
+
+    @staticmethod
+    def _sob_algum(caminho: str, grupos: set) -> bool:
+        while caminho:
+            if caminho in grupos:
+                return True
+            caminho = caminho.rpartition('/')[0]
+        return False
+
+    def _entradas_atuais(self, caminho: str, regras) -> list:
+        caminho_absoluto = os.path.join(self.caminho_raiz, *caminho.split('/'))
         try:
-            with open(self.caminho_state, 'r', encoding='utf-8') as f:
-                dados_salvos = json.load(f)
-        except Exception:
-             return [], [], [] # Erro de leitura, assume sem mudanças ou inconclusivo
-
-        estado_antigo = dados_salvos.get("arquivos", {})
-        estado_atual = self._gerar_estado_atual()
-        
+            stats = os.stat(caminho_absoluto)
+        except OSError:
+            return [] # Removido
+        if stat.S_ISDIR(stats.st_mode):
+            if os.path.islink(caminho_absoluto):
+                return [] # A varredura não segue links para pastas
+            return list(varrer_arvore(self.caminho_raiz, regras, subpasta=caminho))
+        if stat.S_ISREG(stats.st_mode) and not regras.ignorar(caminho, False):
+            return [EntradaArquivo.de_stat(caminho, stats)]
+        return []
+
+    def _listagem_do_indice(self) -> ListagemArvore:
+        """
+        Listagem completa sem varrer a árvore: o índice, com os caminhos alterados
+        trocados pelo que foi relido do disco.
+        """
+        grupos, parcial = self._parcial
+        with IndiceArvore(self.caminho_indice).ler() as leitor:
+            entradas = [
+                EntradaArquivo(caminho, mtime_ns / 1e9, size, mtime_ns, modo, inode)
+                for caminho, mtime_ns, size, inode, modo, _ in leitor
+                if not self._sob_algum(caminho, grupos)
+            ]
+        entradas.extend(parcial)
+        return ListagemArvore(entradas)
+
+    def _confirmar_modificados(self, suspeitos: dict) -> list:
+        """
+        Compara o hash atual dos suspeitos com o hash conhecido.
+        """
         modificados = []
-        adicionados = []
-        removidos = []
-        
-        # Verificar modificados e removidos
-        for caminho, dados_antigos in estado_antigo.items():
-            if caminho not in estado_atual:
-                removidos.append(caminho)
+        conferir = []
+        for caminho, hash_conhecido in suspeitos.items():
+            if hash_conhecido is None:
+                # Sem hash de referência não há como provar que nada mudou
+                modificados.append(caminho)
+            else:
+                conferir.append(caminho)
+
+        for caminho, hash_atual in self.calcular_hashes(conferir).items():
+            if hash_atual != suspeitos[caminho]:
+                modificados.append(caminho)
+        return modificados
+
+    def calcular_hashes(self, caminhos: list) -> dict:
+        """
+        Hash atual (caminho -> SHA-256, ou None se ilegível) de arquivos da varredura.
+        Só lê do disco o que não estiver no cache de hashes; a leitura é feita em paralelo.
+        """
+        atuais = {}
+        a_calcular = []
+        for caminho in caminhos:
+            e = self._entrada(caminho)
+            hash_atual = self.cache_hashes.obter(e.inode, e.size, e.mtime_ns)
+            if hash_atual is None:
+                a_calcular.append(caminho)
             else:
-                dados_novos = estado_atual[caminho]
-                # Comparação simples por mod_time e size
-                if (abs(dados_novos['mod_time'] - dados_antigos['mod_time']) > 0.001 or 
-                    dados_novos['size'] != dados_antigos['size']):
-                    modificados.append(caminho)
-        
-        # Verificar adicionados
-        for caminho in estado_atual:
-            if caminho not in estado_antigo:
-                adicionados.append(caminho)
-                
-        return modificados, adicionados, removidos
+                atuais[caminho] = hash_atual
+
+        def calcular(caminho):
+            try:
+                return caminho, calcular_hash_arquivo(os.path.join(self.caminho_raiz, *caminho.split('/')))
+            except OSError:
+                return caminho, None
+
+        if a_calcular:
+            if ativa():
+                contar('arquivos_hash', len(a_calcular))
+                contar('bytes_hash', sum(self._entrada(c).size for c in a_calcular))
+            with fase('hash_arquivos'), ThreadPoolExecutor(max_workers=TRABALHADORES_HASH) as executor:
+                for caminho, hash_atual in executor.map(calcular, a_calcular):
+                    atuais[caminho] = hash_atual
+                    e = self._entrada(caminho)
+                    # Racy: um arquivo com mtime no tique atual ainda pode mudar sem mudar o stat
+                    if hash_atual is not None and e.mtime_ns < time.time_ns() - JANELA_RACY_NS:
+                        self.cache_hashes.registrar(e.inode, e.size, e.mtime_ns, hash_atual)
+            # Só dá para descartar entradas velhas do cache conhecendo a árvore inteira
+            listagem = self.listagem
+            self.cache_hashes.salvar(None if listagem is None else {(e.inode, e.size, e.mtime_ns) for e in listagem})
+        return atuais
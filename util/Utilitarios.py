@@ -1,4 +1,6 @@
 import os
+import hashlib
+from collections import deque
 
 # Constantes de diretórios críticos (segurança para não apagar o sistema)
 # Adaptado para Windows e outros sistemas
@@ -35,3 +37,71 @@ def eh_diretorio_critico(caminho: str) -> bool:
                 return True
 
     return False
+
+def formatar_tamanho(tamanho_bytes: int) -> str:
+    """
+    Formata um tamanho em bytes para exibição (KB ou MB).
+    """
+    if tamanho_bytes < 1024 * 1024:
+        return f"{tamanho_bytes / 1024:.1f} KB"
+    return f"{tamanho_bytes / (1024 * 1024):.1f} MB"
+
+def formatar_ids(ids: list) -> str:
+    """
+    Ids de snapshots em faixas, para exibição: [1, 2, 3, 5] -> "#1-3,5".
+    """
+    faixas = []
+    for id_rastro in sorted(ids):
+        if faixas and faixas[-1][1] == id_rastro - 1:
+            faixas[-1][1] = id_rastro
+        else:
+            faixas.append([id_rastro, id_rastro])
+    return '#' + ','.join(str(a) if a == b else f"{a}-{b}" for a, b in faixas)
+
+def executar_em_paralelo(executor, funcao, itens, janela: int):
+    """
+    Como executor.map, mas com no máximo `janela` tarefas pendentes por vez,
+    para que a memória não cresça com a quantidade de itens. Os resultados saem na ordem dos itens.
+    """
+    pendentes = deque()
+    for item in itens:
+        pendentes.append(executor.submit(funcao, item))
+        if len(pendentes) >= janela:
+            yield pendentes.popleft().result()
+    while pendentes:
+        yield pendentes.popleft().result()
+
+TAMANHO_BLOCO_HASH = 1024 * 1024
+
+def calcular_hash_arquivo(caminho_arquivo: str) -> str:
+    """
+    SHA-256 do conteúdo do arquivo, lido em blocos.
+    """
+    h = hashlib.sha256()
+    with open(caminho_arquivo, 'rb') as f:
+        while True:
+            bloco = f.read(TAMANHO_BLOCO_HASH)
+            if not bloco:
+                break
+            h.update(bloco)
+    return h.hexdigest()
+
+def calcular_hashes_tar(caminho_tar: str) -> dict:
+    """
+    SHA-256 do conteúdo de cada arquivo de um snapshot antigo (.tar.gz), lendo o stream uma vez.
+    """
+    import tarfile
+    hashes = {}
+    with tarfile.open(caminho_tar, 'r:*') as tar:
+        for membro in tar:
+            if not membro.isfile():
+                continue
+            h = hashlib.sha256()
+            origem = tar.extractfile(membro)
+            while True:
+                bloco = origem.read(TAMANHO_BLOCO_HASH)
+                if not bloco:
+                    break
+                h.update(bloco)
+            hashes[membro.name] = h.hexdigest()
+    return hashes
@@ -0,0 +1,137 @@
+import os
+import stat
+from typing import NamedTuple, Optional, Iterator
+from .RegrasIgnorar import RegrasIgnorar, carregar_regras
+from .CachePastas import CachePastas, TIPO_ARQUIVO, TIPO_PASTA, TIPO_OUTRO
+from .Instrumentacao import contar
+
+class EntradaArquivo(NamedTuple):
+    caminho: str        # relativo à raiz, separador '/'
+    mod_time: float
+    size: int
+    mtime_ns: int
+    modo: int
+    inode: int
+
+    @staticmethod
+    def de_stat(caminho: str, stats: os.stat_result) -> 'EntradaArquivo':
+        return EntradaArquivo(caminho, stats.st_mtime, stats.st_size, stats.st_mtime_ns,
+                              stats.st_mode, stats.st_ino)
+
+class ListagemArvore:
+    """
+    Listagem imutável da árvore de trabalho, com o stat de cada arquivo, ordenada por caminho.
+    Uma única varredura alimenta a detecção de mudanças, o arquivamento e o state.json,
+    então todos enxergam exatamente a mesma versão de cada arquivo.
+    """
+    __slots__ = ('_entradas', '_indice')
+
+    def __init__(self, entradas):
+        self._entradas = tuple(sorted(entradas))
+        self._indice = {e.caminho: e for e in self._entradas}
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+    def __iter__(self) -> Iterator[EntradaArquivo]:
+        return iter(self._entradas)
+
+    def __contains__(self, caminho: str) -> bool:
+        return caminho in self._indice
+
+    def __getitem__(self, caminho: str) -> EntradaArquivo:
+        return self._indice[caminho]
+
+    def get(self, caminho: str) -> Optional[EntradaArquivo]:
+        return self._indice.get(caminho)
+
+    def caminhos(self) -> list:
+        return [e.caminho for e in self._entradas]
+
+    def com_alteracoes(self, atualizados=(), removidos=()) -> 'ListagemArvore':
+        """
+        Nova listagem com entradas trocadas/acrescentadas e caminhos removidos,
+        sem varrer a árvore de novo (ex.: depois de uma restauração).
+        """
+        removidos = set(removidos)
+        novas = {e.caminho: e for e in self._entradas if e.caminho not in removidos}
+        for entrada in atualizados:
+            novas[entrada.caminho] = entrada
+        return ListagemArvore(novas.values())
+
+def varrer_arvore(caminho_raiz: str, regras: Optional[RegrasIgnorar] = None, subpasta: str = '',
+                  cache: Optional[CachePastas] = None) -> ListagemArvore:
+    """
+    Percorre a árvore com os.scandir, podando as pastas ignoradas, e devolve a listagem com stat.
+    Links para pastas não são seguidos; links para arquivos entram com o stat do alvo.
+    Com subpasta (relativa, separador '/'), só aquela parte da árvore é percorrida.
+    Com cache, pastas cujo mtime não mudou não são listadas de novo.
+    """
+    if regras is None:
+        regras = carregar_regras(caminho_raiz)
+
+    entradas = []
+    ignorados = 0
+    if subpasta:
+        if regras.ignorar(subpasta, True):
+            return ListagemArvore(entradas)
+        pendentes = [(subpasta, os.path.join(caminho_raiz, *subpasta.split('/')))]
+    else:
+        pendentes = [('', caminho_raiz)]
+
+    while pendentes:
+        pasta, caminho_pasta = pendentes.pop()
+        prefixo = pasta + '/' if pasta else ''
+
+        conhecidas = cache.obter(pasta, caminho_pasta) if cache is not None else None
+        if conhecidas is not None:
+            for nome, tipo in conhecidas:
+                caminho_relativo = prefixo + nome
+                if tipo == TIPO_PASTA:
+                    if not regras.ignorar(caminho_relativo, True):
+                        pendentes.append((caminho_relativo, os.path.join(caminho_pasta, nome)))
+                elif tipo == TIPO_ARQUIVO:
+                    if regras.ignorar(caminho_relativo, False):
+                        ignorados += 1
+                        continue
+                    try:
+                        stats = os.stat(os.path.join(caminho_pasta, nome))
+                    except OSError:
+                        continue
+                    if stat.S_ISREG(stats.st_mode):
+                        entradas.append(EntradaArquivo.de_stat(caminho_relativo, stats))
+            continue
+
+        try:
+            iterador = os.scandir(caminho_pasta)
+        except OSError:
+            continue # Pasta removida ou sem permissão durante a varredura
+
+        listadas = []
+        completa = True
+        with iterador:
+            for entrada in iterador:
+                caminho_relativo = prefixo + entrada.name
+                try:
+                    if entrada.is_dir():
+                        link = entrada.is_symlink()
+                        listadas.append((entrada.name, TIPO_OUTRO if link else TIPO_PASTA))
+                        if not link and not regras.ignorar(caminho_relativo, True):
+                            pendentes.append((caminho_relativo, entrada.path))
+                        continue
+                    listadas.append((entrada.name, TIPO_ARQUIVO))
+                    if regras.ignorar(caminho_relativo, False):
+                        ignorados += 1
+                        continue
+                    stats = entrada.stat()
+                except OSError:
+                    completa = False
+                    continue # Arquivo pode ter sido deletado durante a verificação
+                if stat.S_ISREG(stats.st_mode):
+                    entradas.append(EntradaArquivo.de_stat(caminho_relativo, stats))
+        if cache is not None and completa:
+            cache.registrar(pasta, listadas)
+
+    contar('arquivos_varridos', len(entradas))
+    contar('arquivos_ignorados', ignorados)
+    return ListagemArvore(entradas)